@@ -4,6 +4,9 @@ from pathlib import Path
 import yaml
 from flask import Flask, jsonify, request
 from flask_cors import CORS
+from phonon_web_tools.band_service import BandService
+from phonon_web_tools.store import PhononStore, array_keys
+from phonon_web_tools.utils import JsonEncoder
 
 app = Flask(__name__)
 
@@ -17,13 +20,44 @@ try:
         config = yaml.safe_load(config_file)
         data_path: str = config["data_folder"]
         data_folder = root / data_path
+        # Optional SQLite store of all the materials, see phonon_web_tools.store
+        store_file = root / config["store_file"] if "store_file" in config else None
 except IOError as exc:
     if exc.errno == 2:
         config = {}
         data_folder = None
+        store_file = None
     else:
         raise
 
+# Query parameters of /materials filtering on a range of a numeric column
+range_columns = ("natoms", "nq", "max_frequency", "min_frequency")
+
+# Interpolation of the bands along any path, from the force constants of the store
+band_service = None
+if store_file:
+    band_service = BandService(
+        store_file,
+        max_bytes=config.get("engine_cache_mb", 512) * 1024**2,
+        batch_window=config.get("batch_window"),
+    )
+
+
+def open_store():
+    if not store_file:
+        raise ValueError("store file not configured")
+    if not store_file.exists():
+        raise ValueError("store file not found")
+    return PhononStore(store_file)
+
+
+def json_response(data):
+    """Return the data as JSON, also if it contains numpy arrays."""
+    return app.response_class(
+        json.dumps(data, cls=JsonEncoder, separators=(",", ":")),
+        mimetype="application/json",
+    )
+
 
 # NOTE: Not used any more, examples loaded directly from public/data!
 @app.route("/process_example", methods=["POST"])
@@ -47,5 +81,104 @@ def process_example():
     return jsonify({"title": title, **data})
 
 
+@app.route("/materials", methods=["GET"])
+def list_materials():
+    """
+    Search the materials of the store, e.g.
+    /materials?formula=BaO3Ti or /materials?natoms_min=4&order_by=max_frequency&desc=1
+    """
+    args = request.args
+    try:
+        ranges = {
+            column: (
+                args.get(f"{column}_min", type=float),
+                args.get(f"{column}_max", type=float),
+            )
+            for column in range_columns
+        }
+        with open_store() as store:
+            materials, total = store.query(
+                name=args.get("name"),
+                formula=args.get("formula"),
+                ranges=ranges,
+                order_by=args.get("order_by", "name"),
+                descending=args.get("desc", "0") not in ("0", "false", ""),
+                limit=args.get("limit", 100, type=int),
+                offset=args.get("offset", 0, type=int),
+            )
+    except ValueError as exc:
+        return jsonify({"error": str(exc)}), 400
+    return jsonify({"total": total, "materials": materials})
+
+
+@app.route("/materials/<name>", methods=["GET"])
+def get_material(name):
+    """
+    Return the converted data of a material. With ?arrays=qpoints,eigenvalues only
+    these arrays are loaded (?arrays= for the metadata only).
+    """
+    keys = request.args.get("arrays")
+    if keys is not None:
+        keys = [key for key in keys.split(",") if key]
+    try:
+        with open_store() as store:
+            data = store.get(name, keys)
+    except KeyError as exc:
+        return jsonify({"error": str(exc.args[0])}), 404
+    except ValueError as exc:
+        return jsonify({"error": str(exc)}), 400
+    return json_response(data)
+
+
+@app.route("/materials/<name>/<key>", methods=["GET"])
+def get_material_array(name, key):
+    """
+    Return one array of a material, optionally only for the q-points in
+    [start, stop), e.g. /materials/BN/vectors?start=10&stop=11
+    """
+    if key not in array_keys:
+        return jsonify({"error": f"unknown array {key}"}), 404
+    try:
+        with open_store() as store:
+            array = store.get_array(
+                name,
+                key,
+                request.args.get("start", type=int),
+                request.args.get("stop", type=int),
+            )
+    except KeyError as exc:
+        return jsonify({"error": str(exc.args[0])}), 404
+    except ValueError as exc:
+        return jsonify({"error": str(exc)}), 400
+    return json_response({key: array})
+
+
+@app.route("/materials/<name>/bands", methods=["POST"])
+def get_material_bands(name):
+    """
+    Interpolate the bands of a material along a path, from its force constants, e.g.
+    {"vertices": [[0, 0, 0], [0.5, 0, 0]], "labels": ["G", "M"], "density": 50}
+    with the vertices in reduced coordinates and density in points per 1/angstrom.
+    Without vertices, the path goes through the high-symmetry points of the crystal.
+    """
+    payload = request.get_json(silent=True) or {}
+    try:
+        if band_service is None or not store_file.exists():
+            raise ValueError("store file not found")
+        if not isinstance(payload, dict):
+            raise ValueError("the payload must be a JSON object")
+        data = band_service.get_bands(
+            name,
+            payload.get("vertices"),
+            labels=payload.get("labels"),
+            density=payload.get("density"),
+        )
+    except KeyError as exc:
+        return jsonify({"error": str(exc.args[0])}), 404
+    except (TypeError, ValueError) as exc:
+        return jsonify({"error": str(exc)}), 400
+    return json_response(data)
+
+
 if __name__ == "__main__":
     app.run(debug=True)
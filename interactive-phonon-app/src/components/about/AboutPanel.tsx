@@ -136,6 +136,11 @@ vectors:          eigenvectors (Nq x Nphonons x Natoms x 3 x 2) They are, more r
                   For each q point (Nq), for each phonon (Nphonons), a normalized phonon displacement
                   is a vector containing, for each atom (Natoms), the x, y, and z displacements (x3)
                   which are complex numbers (x2).
+                  Missing in the bands-only data (phonon-web-tools --eigenvalues_only).
+vectors_delta:    optional, replaces vectors: the eigenvectors as integer deltas from the previous
+vectors_encoding: q-point, decoded as vectors[q] = vectors[q - 1] + step * vectors_delta[q], with
+                  vectors[q - 1] = 0 for q in segment_starts ({"type": "delta", "step": ...,
+                  "segment_starts": [...]})
   `.trim()}
           </code>
         </pre>
@@ -2,6 +2,7 @@ import { useCallback, useState } from "react";
 
 import axios from "axios";
 
+import { decodeVectors } from "./decodeVectors";
 import { VisualizerProps } from "./interfaces";
 import SelectPanel from "./select/SelectPanel";
 import VisualizerPanel from "./VisualizerPanel";
@@ -12,7 +13,7 @@ async function get_example_data(name: string) {
   // Load example JSON files from the public/data folder.
   try {
     const response = await axios.get(`/data/${name}.json`);
-    return response.data;
+    return decodeVectors(response.data);
   } catch (error) {
     console.error("Error fetching data:", error);
     return null;
@@ -79,6 +80,7 @@ const PhononsPanel = ({
         <VisualizerPanel
           callback={switchToSelectPanel}
           props={visualizerProps}
+          bandsOnly={visualizerProps !== null && !visualizerProps.vectors}
         />
       )}
     </>
@@ -1,4 +1,4 @@
-import { Button, Spinner } from "react-bootstrap";
+import { Alert, Button, Spinner } from "react-bootstrap";
 
 import { VisualizerProps } from "./interfaces";
 
@@ -9,9 +9,11 @@ import "./VisualizerPanel.scss";
 const VisualizerPanel = ({
   callback,
   props,
+  bandsOnly = false,
 }: {
   callback: () => void;
   props: VisualizerProps | null;
+  bandsOnly?: boolean;
 }) => {
   return (
     <>
@@ -27,6 +29,12 @@ const VisualizerPanel = ({
           </span>
         )}
       </h1>
+      {bandsOnly && (
+        <Alert variant="info">
+          This file has no eigenvectors (converted with eigenvalues only): the
+          modes cannot be animated, only the band structure is shown.
+        </Alert>
+      )}
       {props && <PhononVisualizer props={props} />}
     </>
   );
@@ -0,0 +1,53 @@
+type NestedNumbers = number | NestedNumbers[];
+
+interface VectorsEncoding {
+  type: string;
+  step: number;
+  segment_starts: number[];
+}
+
+// Add (scaled) b to a element-wise, returning a new nested array.
+function addScaled(
+  a: NestedNumbers,
+  b: NestedNumbers,
+  scale: number
+): NestedNumbers {
+  if (Array.isArray(a) && Array.isArray(b)) {
+    return a.map((value, i) => addScaled(value, b[i], scale));
+  }
+  return (a as number) + (b as number) * scale;
+}
+
+function scaleNested(a: NestedNumbers, scale: number): NestedNumbers {
+  if (Array.isArray(a)) {
+    return a.map((value) => scaleNested(value, scale));
+  }
+  return a * scale;
+}
+
+// Decode the eigenvectors written as quantized deltas along the q-path
+// (phonon-web-tools --vectors_precision) into the usual "vectors" array.
+// Data without encoded vectors is returned as is.
+export function decodeVectors<T extends Record<string, unknown>>(data: T): T {
+  if (!("vectors_delta" in data)) {
+    return data;
+  }
+  const encoding = data.vectors_encoding as VectorsEncoding;
+  if (encoding.type !== "delta") {
+    throw new Error(`Unknown encoding of the vectors ${encoding.type}`);
+  }
+  const deltas = data.vectors_delta as NestedNumbers[];
+  const starts = new Set(encoding.segment_starts);
+  const vectors: NestedNumbers[] = [];
+  deltas.forEach((delta, k) => {
+    vectors.push(
+      starts.has(k)
+        ? scaleNested(delta, encoding.step)
+        : addScaled(vectors[k - 1], delta, encoding.step)
+    );
+  });
+  const decoded: Record<string, unknown> = { ...data, vectors };
+  delete decoded.vectors_delta;
+  delete decoded.vectors_encoding;
+  return decoded as T;
+}
@@ -17,5 +17,6 @@ export interface VisualizerProps {
   eigenvalues: number[][];
   distances: number[];
   highsym_qpts: HighSymPoint[];
-  vectors: number[][][][][];
+  // missing for the data converted with eigenvalues only: no mode animation
+  vectors?: number[][][][][];
 }
@@ -55,6 +55,8 @@ const CellView = ({
 
   useEffect(() => {
     const [q, e] = mode;
+    // without eigenvectors there is no mode to animate
+    if (!props.vectors) return;
     // Initialize WEAS
     if (!weasRef.current) {
       const weasInstance = new WEAS({
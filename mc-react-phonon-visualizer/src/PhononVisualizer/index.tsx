@@ -19,6 +19,8 @@ const PhononVisualizer = ({ props }: { props: VisualizerProps }) => {
   const parameters = useParameters(props.repetitions);
   const [mode, setMode] = useState<number[]>([0, 0]);
   const { fastMode = true } = props;
+  // without eigenvectors, only the band structure is shown
+  const hasVectors = props.vectors !== undefined;
 
   const updateMode = useCallback(
     (event: PlotMouseEvent) => {
@@ -44,13 +46,17 @@ const PhononVisualizer = ({ props }: { props: VisualizerProps }) => {
     <ParametersContext.Provider value={parameters}>
       <Container fluid>
         <Row className="mb-xxl-4 g-2">
-          <Col lg="3" className="visualizer-panel">
-            <MemoizedControlsPanel />
-          </Col>
-          <Col lg="4" className="visualizer-panel">
-            <CellView props={props} mode={mode} />
-          </Col>
-          <Col lg="5" className="visualizer-panel">
+          {hasVectors && (
+            <>
+              <Col lg="3" className="visualizer-panel">
+                <MemoizedControlsPanel />
+              </Col>
+              <Col lg="4" className="visualizer-panel">
+                <CellView props={props} mode={mode} />
+              </Col>
+            </>
+          )}
+          <Col lg={hasVectors ? "5" : "12"} className="visualizer-panel">
             {fastMode ? (
               <MemoizedBandsViewFast {...bandsProps} /> // fastmode
             ) : (
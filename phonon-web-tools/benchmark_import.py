@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+"""
+Import-time benchmark of `phonon_web_tools`.
+
+Each measurement runs in a fresh interpreter. Fails (exit code 1) if importing the
+CLI takes longer than the budget, or if one of the heavy format backends is
+loaded by the import itself, or by a QE-only conversion that does not need it.
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+base_folder = Path(__file__).parent.parent / "./data"
+
+# Backends that must never be loaded just by importing the package
+lazy_modules = ["ase", "pymatgen", "qe_tools", "seekpath"]
+# Backends that a QE-only conversion must not load
+unused_by_qe_modules = ["ase", "pymatgen"]
+
+import_snippet = """
+import json, sys, time
+t = time.perf_counter()
+import phonon_web_tools.cli
+elapsed = time.perf_counter() - t
+print(json.dumps({"time": elapsed, "modules": list(sys.modules)}))
+"""
+
+convert_snippet = """
+import json, sys, tempfile
+from pathlib import Path
+from phonon_web_tools import convert_qe_phonon_folder
+with tempfile.TemporaryDirectory() as tmp:
+    convert_qe_phonon_folder(Path(sys.argv[1]), out_file=Path(tmp) / "out.json")
+print(json.dumps({"modules": list(sys.modules)}))
+"""
+
+
+def run_snippet(snippet, *args):
+    result = subprocess.run(
+        [sys.executable, "-c", snippet, *args],
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    # The last line is the JSON report, previous ones are the converter output
+    return json.loads(result.stdout.splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=5,
+        help="Number of fresh interpreters to time (default: 5).",
+    )
+    parser.add_argument(
+        "--budget",
+        type=float,
+        default=0.5,
+        help="Maximum median import time in seconds (default: 0.5).",
+    )
+    parser.add_argument(
+        "--folder",
+        default=str(base_folder / "graphene"),
+        help="QE folder used to check the modules loaded by a conversion.",
+    )
+    args = parser.parse_args()
+
+    errors = []
+
+    times = []
+    for _ in range(args.repeat):
+        report = run_snippet(import_snippet)
+        times.append(report["time"])
+        loaded = sorted(set(lazy_modules).intersection(report["modules"]))
+        if loaded:
+            errors.append(f"Importing the CLI loads {loaded}")
+    median = statistics.median(times)
+    print(
+        f"Import time of phonon_web_tools.cli: median {median:.3f} s, min {min(times):.3f} s"
+    )
+    if median > args.budget:
+        errors.append(
+            f"Import time {median:.3f} s exceeds the budget of {args.budget} s"
+        )
+
+    report = run_snippet(convert_snippet, args.folder)
+    loaded = sorted(set(unused_by_qe_modules).intersection(report["modules"]))
+    if loaded:
+        errors.append(f"A QE-only conversion loads {loaded}")
+
+    for error in sorted(set(errors)):
+        print(f"ERROR: {error}")
+    sys.exit(1 if errors else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+"""
+Import converted JSON files (by default `../data/*.json`) into a SQLite store
+(see `phonon_web_tools.store`), using the file name without extension as the name
+of each material.
+"""
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+from phonon_web_tools.store import PhononStore
+
+base_folder = Path(__file__).parent.parent / "./data"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("store", help="Path of the SQLite store (created if missing).")
+    parser.add_argument(
+        "json_files",
+        nargs="*",
+        help="Converted JSON files to import (default: ../data/*.json).",
+    )
+    args = parser.parse_args()
+
+    json_files = [Path(f) for f in args.json_files] or sorted(
+        base_folder.glob("*.json")
+    )
+
+    n_failed = 0
+    with PhononStore(args.store) as store:
+        for json_file in json_files:
+            try:
+                phonon_data = json.loads(json_file.read_text())
+                written = store.put(json_file.stem, phonon_data)
+            except (KeyError, ValueError) as exc:
+                print(f"ERROR: cannot import {json_file}: {exc}")
+                n_failed += 1
+                continue
+            print(f"{'Imported' if written else 'Unchanged'} {json_file.stem}")
+        print(f"{len(store)} materials in {args.store}")
+
+    sys.exit(1 if n_failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,61 @@
 #!/usr/bin/env python
 
+import argparse
 from pathlib import Path
 
 from phonon_web_tools import convert_qe_phonon_folder
+from phonon_web_tools.store import PhononStore
+from phonon_web_tools.utils import strip_compression_suffix
 
 base_folder = Path(__file__).parent.parent / "./data"
 
 required_files = {"scf.in", "scf.out", "matdyn.modes"}
 
+parser = argparse.ArgumentParser(description="Convert all the examples in ../data/.")
+parser.add_argument(
+    "--store",
+    help="Add the examples to this SQLite store instead of writing ../data/*.json.",
+)
+parser.add_argument(
+    "--group_velocities",
+    action="store_true",
+    help="Add the group velocities to the examples with force constants.",
+)
+parser.add_argument(
+    "--thermodynamics",
+    action="store_true",
+    help="Add the thermodynamic properties to the examples with force constants.",
+)
+parser.add_argument(
+    "--cache_dir",
+    default=Path(__file__).parent / ".thermodynamics_cache",
+    help="Cache of the thermodynamic properties (default: .thermodynamics_cache).",
+)
+parser.add_argument(
+    "--compress",
+    choices=["gz", "xz", "zst"],
+    help="Write compressed ../data/*.json.gz, .xz or .zst files.",
+)
+args = parser.parse_args()
+
+store = PhononStore(args.store) if args.store else None
+
 for folder in base_folder.iterdir():
     if folder.is_dir():
-        files = {f.name for f in folder.iterdir() if f.is_file()}
+        # the input files can be compressed (matdyn.modes.gz, ...)
+        files = {strip_compression_suffix(f) for f in folder.iterdir() if f.is_file()}
         if required_files.issubset(files):
             print("----")
             print(f"Converting {folder}")
             out_file = base_folder / f"{folder.name}.json"
-            convert_qe_phonon_folder(folder, out_file=out_file)
+            if args.compress:
+                out_file = base_folder / f"{folder.name}.json.{args.compress}"
+            kwargs = {}
+            if "real_space_force_constants.dat" in files:
+                kwargs["group_velocities"] = args.group_velocities
+                if args.thermodynamics:
+                    kwargs["thermodynamics"] = dict(cache_dir=args.cache_dir)
+            convert_qe_phonon_folder(folder, out_file=out_file, store=store, **kwargs)
+
+if store is not None:
+    store.close()
@@ -1,12 +1,35 @@
 import json
+import re
+from contextlib import ExitStack
 from pathlib import Path
 
+from .force_constants import read_matdyn_settings
 from .phonon_web import PhononWebConverter
 from .qe_phonon_tools import convert_qe_phonon_data
+from .utils import get_compressed_path, open_text, write_json_atomic
 
 __all__ = ["PhononWebConverter", "convert_qe_phonon_data"]
 
 
+def get_modes_paths(folder: Path, fname_modes):
+    """
+    Resolve fname_modes, either a file name, a list of file names, or a glob pattern
+    (sorted by name, with numbers in natural order), into the path(s) of the modes file(s).
+    """
+    if isinstance(fname_modes, (list, tuple)):
+        return [get_compressed_path(folder / fname) for fname in fname_modes]
+    if not any(char in str(fname_modes) for char in "*?["):
+        return get_compressed_path(folder / fname_modes)
+
+    def natural_key(path):
+        return [int(s) if s.isdigit() else s for s in re.split(r"(\d+)", path.name)]
+
+    paths = sorted(folder.glob(str(fname_modes)), key=natural_key)
+    if not paths:
+        raise FileNotFoundError(f"No modes files matching {fname_modes} in {folder}")
+    return paths
+
+
 def convert_qe_phonon_folder(
     folder: Path,
     fname_scf_in="scf.in",
@@ -14,10 +37,34 @@ def convert_qe_phonon_folder(
     fname_modes="matdyn.modes",
     fname_highsym_qpts="highsym_qpts.json",
     out_file: Path | None = None,
+    store=None,
+    group_velocities=False,
+    thermodynamics=None,
+    fname_force_constants="real_space_force_constants.dat",
+    fname_matdyn_in="matdyn.in",
+    compression=None,
+    qpath_density=None,
     **kwargs,
 ):
     """
     Load QE phonon data from a folder and convert to the JSON file
+
+    fname_modes can also be a list of file names or a glob pattern, to merge
+    the modes files of consecutive segments of the q-path (see `convert_qe_phonon_data`).
+    If store (a `PhononStore`) is given, the data is added to the store, with the
+    name of the folder, instead of being written to a JSON file, together with the
+    force constants (fname_force_constants) if present.
+    If group_velocities is True, the group velocities are computed from the force
+    constants (fname_force_constants), with the settings of fname_matdyn_in if present.
+    thermodynamics is None, or the parameters of the thermodynamic properties computed
+    from the force constants (see `convert_matdyn_data`).
+    The input files can be compressed (gzip, xz or zstd), also with the suffix .gz,
+    .xz or .zst added to their name. compression ("gz", "xz" or "zst") compresses
+    the default output file (phonon_vis.json.gz, ...), out_file is compressed
+    according to its suffix.
+    If qpath_density is given, the phonons are interpolated from the force constants
+    along the q-path generated with seekpath, instead of being read from fname_modes
+    (see `convert_qe_phonon_data`).
     """
 
     highsym_qpts = None
@@ -25,23 +72,60 @@ def convert_qe_phonon_folder(
     if highsym_qpts_file.exists():
         highsym_qpts = json.loads(highsym_qpts_file.read_text())
 
-    with (
-        open(folder / fname_scf_in) as f1,
-        open(folder / fname_scf_out) as f2,
-        open(folder / fname_modes) as f3,
-    ):
+    modes_paths = None
+    if qpath_density is None:
+        modes_paths = get_modes_paths(folder, fname_modes)
+
+    fc_file = get_compressed_path(folder / fname_force_constants)
+    matdyn_in_file = get_compressed_path(folder / fname_matdyn_in)
+
+    with ExitStack() as stack:
+        f1 = stack.enter_context(open_text(folder / fname_scf_in))
+        f2 = stack.enter_context(open_text(folder / fname_scf_out))
+        f3 = None
+        if isinstance(modes_paths, list):
+            f3 = [stack.enter_context(open_text(path)) for path in modes_paths]
+        elif modes_paths is not None:
+            f3 = stack.enter_context(open_text(modes_paths))
+        if group_velocities or thermodynamics is not None or qpath_density is not None:
+            kwargs["group_velocities"] = group_velocities
+            kwargs["thermodynamics"] = thermodynamics
+            kwargs["force_constants_file"] = stack.enter_context(open_text(fc_file))
+            if matdyn_in_file.exists():
+                kwargs["matdyn_in_file"] = stack.enter_context(
+                    open_text(matdyn_in_file)
+                )
         phonon_data = convert_qe_phonon_data(
             f1,
             f2,
             f3,
             highsym_qpts=highsym_qpts,
+            qpath_density=qpath_density,
             **kwargs,
         )
 
+    if store is not None:
+        if store.put(folder.name, phonon_data):
+            print(f"Saved {folder.name} to {store.path}")
+        else:
+            print(f"{folder.name} is unchanged in {store.path}")
+        # The force constants are kept to interpolate other q-points on demand
+        if fc_file.exists():
+            settings = {}
+            if matdyn_in_file.exists():
+                with open_text(matdyn_in_file) as f:
+                    settings = read_matdyn_settings(f)
+            with open_text(fc_file) as f:
+                text = f.read()
+            if store.put_force_constants(folder.name, text, settings):
+                print(f"Saved the force constants of {folder.name} to {store.path}")
+        return
+
     if not out_file:
         out_file = folder / "phonon_vis.json"
+        if compression:
+            out_file = out_file.with_name(f"{out_file.name}.{compression}")
 
-    with open(out_file, "w") as f:
-        json.dump(phonon_data, f, separators=(",", ":"))
+    write_json_atomic(phonon_data, out_file)
 
     print(f"Saved {out_file}")
@@ -0,0 +1,224 @@
+"""Interpolate the phonon bands of the materials of a store along any q-path, on demand"""
+
+import io
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from .force_constants import (
+    PhononInterpolator,
+    get_path_directions,
+    read_force_constants,
+)
+from .lattice import rec_lat
+from .phonon_web import PhononWebConverter
+from .qpath import get_path_qpoints, get_seekpath_qpath
+from .store import PhononStore
+from .utils import normalize_numbers
+
+# Upper bound of the memory used by the cached interpolators (in bytes)
+default_max_bytes = 512 * 1024**2
+# Time during which the requests for the same material are collected into one batch
+default_batch_window = 0.01
+
+
+class InterpolatorCache:
+    """
+    Least-recently-used cache of interpolators (parsed force constants and
+    precomputed long-range terms), bounded by their total memory.
+
+    The most recently used interpolator is always kept, even if it alone exceeds
+    the bound.
+    """
+
+    def __init__(self, max_bytes=None):
+        self.max_bytes = max_bytes or default_max_bytes
+        self.interpolators = OrderedDict()  # key: (interpolator, nbytes)
+        self.nbytes = 0
+        self.lock = threading.Lock()
+        self.building = {}  # key: lock held while the interpolator is built
+
+    def __len__(self):
+        return len(self.interpolators)
+
+    def get(self, key, factory):
+        """
+        Return the interpolator for key, built with factory() if it is not cached.
+        Concurrent calls for the same key build it only once.
+        """
+        with self.lock:
+            if key in self.interpolators:
+                self.interpolators.move_to_end(key)
+                return self.interpolators[key][0]
+            building = self.building.setdefault(key, threading.Lock())
+
+        with building:
+            with self.lock:
+                if key in self.interpolators:
+                    self.interpolators.move_to_end(key)
+                    return self.interpolators[key][0]
+            interpolator = factory()
+            with self.lock:
+                self.interpolators[key] = (interpolator, interpolator.nbytes)
+                self.nbytes += interpolator.nbytes
+                while self.nbytes > self.max_bytes and len(self.interpolators) > 1:
+                    _, (_, nbytes) = self.interpolators.popitem(last=False)
+                    self.nbytes -= nbytes
+                del self.building[key]
+        return interpolator
+
+
+class DiagonalizationBatcher:
+    """
+    Collect the q-points requested concurrently for the same interpolator into one
+    batch, so that the requests share the computation of the dynamical matrices
+    and their diagonalization.
+
+    The first request of a batch waits for the batch window, then computes the
+    batch for all the requests that joined it in the meantime.
+    """
+
+    def __init__(self, batch_window=None):
+        self.batch_window = (
+            default_batch_window if batch_window is None else batch_window
+        )
+        self.lock = threading.Lock()
+        self.pending = {}  # key: batch collecting requests
+
+    def diagonalize(self, key, interpolator, qpoints, directions=None):
+        """
+        Return the frequencies and displacements at the q-points (reduced
+        coordinates of the interpolator), see `PhononInterpolator.diagonalize`.
+
+        :param directions: cartesian directions of the non-analytic term at Gamma,
+            shape (nq, 3), or None
+        """
+        qpoints = np.atleast_2d(qpoints)
+        if directions is None:
+            directions = np.zeros((len(qpoints), 3))
+        with self.lock:
+            batch = self.pending.get(key)
+            leader = batch is None
+            if leader:
+                batch = {"qpoints": [], "directions": [], "done": threading.Event()}
+                self.pending[key] = batch
+            start = sum(len(q) for q in batch["qpoints"])
+            batch["qpoints"].append(qpoints)
+            batch["directions"].append(np.atleast_2d(directions))
+
+        if leader:
+            time.sleep(self.batch_window)
+            with self.lock:
+                del self.pending[key]
+            try:
+                batch["result"] = interpolator.diagonalize(
+                    np.concatenate(batch["qpoints"]),
+                    directions=np.concatenate(batch["directions"]),
+                )
+            except Exception as exc:
+                batch["error"] = exc
+                raise
+            finally:
+                batch["done"].set()
+        else:
+            batch["done"].wait()
+            if "error" in batch:
+                raise batch["error"]
+
+        frequencies, displacements = batch["result"]
+        chunk = slice(start, start + len(qpoints))
+        return frequencies[chunk], displacements[chunk]
+
+
+class BandService:
+    """
+    Compute the converted band data of the materials of a `PhononStore` along any
+    q-path, from their stored force constants.
+    """
+
+    def __init__(self, store_path, max_bytes=None, batch_window=None):
+        self.store_path = store_path
+        self.cache = InterpolatorCache(max_bytes)
+        self.batcher = DiagonalizationBatcher(batch_window)
+
+    def get_interpolator(self, store, name):
+        """
+        Return the interpolator of a material, from the cache if the force constants
+        did not change.
+
+        :return: (cache key, interpolator)
+        """
+        fc_hash = store.get_force_constants_hash(name)
+        if fc_hash is None:
+            raise KeyError(f"Material {name} has no force constants")
+
+        def factory():
+            text, settings = store.get_force_constants(name)
+            return PhononInterpolator(
+                read_force_constants(io.StringIO(text)), **settings
+            )
+
+        key = (name, fc_hash)
+        return key, self.cache.get(key, factory)
+
+    def get_bands(self, name, vertices=None, labels=None, density=None):
+        """
+        Interpolate the bands of a material along the path through the vertices.
+
+        :param vertices: reduced coordinates of the vertices (in the reciprocal
+            lattice of the converted data), or None for the path through the
+            high-symmetry points of seekpath (see `get_seekpath_qpath`)
+        :param labels, density: see `get_path_qpoints`
+
+        :return: the converted data, as `PhononWebConverter.get_dict`
+        """
+        with PhononStore(self.store_path) as store:
+            metadata = store.get_metadata(name)
+            key, interpolator = self.get_interpolator(store, name)
+        if interpolator.nat != metadata["natoms"]:
+            raise ValueError(
+                f"The force constants of {name} have {interpolator.nat} atoms "
+                f"instead of {metadata['natoms']}"
+            )
+
+        cell = np.array(metadata["lattice"], dtype=float)
+        pos = np.array(metadata["atom_pos_red"], dtype=float)
+        rec = rec_lat(cell) * 2 * np.pi
+        if vertices is None:
+            qpath = get_seekpath_qpath(
+                cell,
+                pos,
+                metadata["atom_numbers"],
+                density,
+                two_dimensional=interpolator.mesh[2] == 1,
+            )
+            qpoints, highsym_qpts = qpath["qpoints"], qpath["highsym_qpts"]
+            discont_indexes = qpath["discont_indexes"]
+        else:
+            qpoints, highsym_qpts = get_path_qpoints(vertices, rec, density, labels)
+            discont_indexes = ()
+        qpoints_cart = qpoints @ rec
+        # the direction of the path selects the non-analytic term at Gamma, as in matdyn.x
+        directions = get_path_directions(qpoints_cart, discont_indexes)
+        # From the reciprocal lattice of the data to the one of the force constants
+        fc_qpoints = qpoints_cart @ np.linalg.inv(interpolator.rec)
+        frequencies, displacements = self.batcher.diagonalize(
+            key, interpolator, fc_qpoints, directions
+        )
+
+        nq, nmodes = frequencies.shape
+        eigenvectors = np.ascontiguousarray(displacements).reshape(nq, nmodes, nmodes)
+        converter = PhononWebConverter(
+            cell=cell,
+            pos=pos,
+            atom_numbers=metadata["atom_numbers"],
+            eigenvalues=frequencies,
+            eigenvectors=eigenvectors.view(float).reshape(nq, nmodes, nmodes, 2),
+            qpoints=qpoints,
+            highsym_qpts=highsym_qpts,
+            name=metadata["name"],
+            starting_supercell=metadata["repetitions"],
+        )
+        return normalize_numbers(converter.get_dict())
@@ -2,6 +2,8 @@
 import argparse
 from pathlib import Path
 
+import numpy as np
+
 from phonon_web_tools import convert_qe_phonon_folder
 
 
@@ -12,7 +14,11 @@ def main():
 
     parser.add_argument(
         "folder",
-        help="Folder containing QE input/output files (scf.in, scf.out, matdyn.modes, etc.).",
+        nargs="+",
+        help=(
+            "Folder(s) containing QE input/output files (scf.in, scf.out, matdyn.modes, "
+            "etc.), possibly compressed with gzip, xz or zstd."
+        ),
     )
     parser.add_argument(
         "--fname_scf_in",
@@ -26,8 +32,12 @@ def main():
     )
     parser.add_argument(
         "--fname_modes",
-        default="matdyn.modes",
-        help="Name of the phonon modes file (default: matdyn.modes).",
+        nargs="+",
+        default=["matdyn.modes"],
+        help=(
+            "Name of the phonon modes file (default: matdyn.modes). Several names or a "
+            "glob pattern merge the files of consecutive segments of the q-path."
+        ),
     )
     parser.add_argument(
         "--fname_highsym_qpts",
@@ -36,19 +46,179 @@ def main():
     )
     parser.add_argument(
         "--out_file",
-        help="Name/Path of the output file (default: phonon_vis.json inside the folder).",
+        help=(
+            "Name/Path of the output file (default: phonon_vis.json inside the folder), "
+            "compressed if it ends with .gz, .xz or .zst."
+        ),
+    )
+    parser.add_argument(
+        "--compress",
+        choices=["gz", "xz", "zst"],
+        help=(
+            "Compress the default output files (phonon_vis.json.gz, ...), zst needs "
+            "the zstandard package."
+        ),
+    )
+    parser.add_argument(
+        "--store",
+        help=(
+            "Add the converted data of all the folders to this SQLite store (see "
+            "phonon_web_tools.store), instead of writing one JSON file per folder."
+        ),
+    )
+    parser.add_argument(
+        "--scf_in_format",
+        choices=["qeinp-qetools", "qeinp-fast"],
+        default="qeinp-qetools",
+        help=(
+            "Parser of the SCF input file: qe-tools, or the fast numpy parser that is "
+            "faster for large cells (default: qeinp-qetools)."
+        ),
+    )
+    parser.add_argument(
+        "--vectors_precision",
+        type=float,
+        help=(
+            "Write the eigenvectors as quantized deltas along the path, with this "
+            "maximum error on each component (e.g. 1e-4), for smaller files."
+        ),
+    )
+    parser.add_argument(
+        "--eigenvalues_only",
+        action="store_true",
+        help=(
+            "Skip the eigenvectors, for much faster conversions and smaller files "
+            "without animations (the bands are ordered by continuity of the frequencies)."
+        ),
+    )
+    parser.add_argument(
+        "--qpath_density",
+        type=float,
+        help=(
+            "Interpolate the phonons from the real-space force constants of q2r.x "
+            "along the q-path through the high-symmetry points (from seekpath), with "
+            "about this number of q-points per 1/angstrom, instead of reading "
+            "matdyn.modes (see also phonon-web-qpath to write the matdyn.in q-list)."
+        ),
+    )
+    parser.add_argument(
+        "--group_velocities",
+        action="store_true",
+        help=(
+            "Add the group velocities, computed from the real-space force constants "
+            "of q2r.x (real_space_force_constants.dat, with the settings of matdyn.in)."
+        ),
+    )
+    parser.add_argument(
+        "--thermodynamics",
+        action="store_true",
+        help=(
+            "Add the harmonic free energy, entropy and heat capacity, computed on a "
+            "q-point mesh from the real-space force constants of q2r.x."
+        ),
+    )
+    parser.add_argument(
+        "--mesh",
+        nargs=3,
+        type=int,
+        help="q-point mesh for --thermodynamics (default: about 10 points per 1/angstrom).",
+    )
+    parser.add_argument(
+        "--temperatures",
+        nargs=3,
+        type=float,
+        metavar=("TMIN", "TMAX", "TSTEP"),
+        help="Temperature range in K for --thermodynamics (default: 0 1000 10).",
+    )
+    parser.add_argument(
+        "--cache_dir",
+        help=(
+            "Folder where the thermodynamic properties are cached, by hash of the force "
+            "constants, mesh and temperatures."
+        ),
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of processes used to parse large or multiple modes files (default: 1).",
+    )
+
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help=(
+            "Keep running and convert the folder(s) again when their files change, "
+            "redoing only the affected stages."
+        ),
+    )
+    parser.add_argument(
+        "--interval",
+        type=float,
+        default=1.0,
+        help="Polling interval in seconds for --watch (default: 1.0).",
     )
 
     args = parser.parse_args()
 
-    convert_qe_phonon_folder(
-        Path(args.folder),
-        args.fname_scf_in,
-        args.fname_scf_out,
-        args.fname_modes,
-        args.fname_highsym_qpts,
-        args.out_file,
+    if args.out_file and len(args.folder) > 1:
+        parser.error("--out_file can only be used with a single folder")
+    if args.store and (args.out_file or args.watch or args.compress):
+        parser.error("--store cannot be used with --out_file, --watch or --compress")
+    if args.eigenvalues_only and args.vectors_precision is not None:
+        parser.error("--vectors_precision cannot be used with --eigenvalues_only")
+    if (
+        args.group_velocities or args.thermodynamics or args.qpath_density
+    ) and args.watch:
+        parser.error(
+            "--group_velocities, --thermodynamics and --qpath_density cannot be used "
+            "with --watch"
+        )
+
+    kwargs = dict(
+        fname_scf_in=args.fname_scf_in,
+        fname_scf_out=args.fname_scf_out,
+        fname_modes=(
+            args.fname_modes[0] if len(args.fname_modes) == 1 else args.fname_modes
+        ),
+        fname_highsym_qpts=args.fname_highsym_qpts,
+        out_file=args.out_file,
+        compression=args.compress,
+        n_workers=args.workers,
+        scf_in_format=args.scf_in_format,
     )
+    if args.vectors_precision is not None:
+        kwargs["vectors_precision"] = args.vectors_precision
+    if args.eigenvalues_only:
+        kwargs["eigenvalues_only"] = True
+    if args.qpath_density is not None:
+        kwargs["qpath_density"] = args.qpath_density
+    if args.group_velocities:
+        kwargs["group_velocities"] = True
+    if args.thermodynamics:
+        kwargs["thermodynamics"] = dict(mesh=args.mesh, cache_dir=args.cache_dir)
+        if args.temperatures:
+            tmin, tmax, tstep = args.temperatures
+            kwargs["thermodynamics"]["temperatures"] = np.arange(
+                tmin, tmax + tstep / 2, tstep
+            )
+
+    if args.watch:
+        from phonon_web_tools.watch import watch_folders
+
+        watch_folders([Path(folder) for folder in args.folder], args.interval, **kwargs)
+        return
+
+    if args.store:
+        from phonon_web_tools.store import PhononStore
+
+        with PhononStore(args.store) as store:
+            for folder in args.folder:
+                convert_qe_phonon_folder(Path(folder), store=store, **kwargs)
+        return
+
+    for folder in args.folder:
+        convert_qe_phonon_folder(Path(folder), **kwargs)
 
 
 if __name__ == "__main__":
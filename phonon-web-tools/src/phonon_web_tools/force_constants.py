@@ -0,0 +1,802 @@
+"""Phonons interpolated at any q-point from the real-space force constants of q2r.x"""
+
+import hashlib
+import re
+
+import numpy as np
+
+from .pw_input import (
+    bohr_in_angstrom,
+    get_cell_from_ibrav,
+    namelist_value_regex,
+    strip_comment,
+)
+from .utils import open_decompressed
+
+# Conversion from sqrt(Ry / (bohr^2 * mass in Ry units)) to cm^-1 (RY_TO_CMM1 of QE)
+ry_to_cm1 = 109737.31570111268
+# Speed of light in km/s, to convert cm^-1 * angstrom to km/s
+speed_of_light_km_s = 299792.458
+# Parameters of the Ewald sum of the long-range dipole-dipole term, in units of
+# (2 pi / alat)^2, and tolerance of the Wigner-Seitz weights (same as matdyn.x)
+ewald_alpha = 1.0
+ewald_gmax = 14.0
+ws_tolerance = 1e-6
+
+# Upper bound of the size of the arrays of a batch of q-points (in bytes)
+chunk_max_bytes = 64 * 1024**2
+
+
+def read_force_constants(file_obj):
+    """
+    Read the real-space force constants written by q2r.x (e.g.
+    real_space_force_constants.dat).
+
+    The file can be compressed (see `open_decompressed`). If the file has two
+    columns of force constants (short-range and long-range parts), only the
+    short-range part is kept, since the long-range part is added back analytically.
+
+    :return: a dictionary with "alat" (bohr), "at" (lattice vectors in units of
+        alat), "species" (name of the species of each atom), "masses" (mass of each
+        atom, in Ry units), "tau" (positions in units of alat), "epsilon" and "zeu"
+        (dielectric tensor and Born effective charges, or None), "mesh", "frc"
+        (force constants in Ry/bohr^2, with shape (nr1, nr2, nr3, 3, 3, nat, nat))
+        and "hash" (SHA-256 of the file content)
+    """
+    text = open_decompressed(file_obj).read()
+    if isinstance(text, bytes):
+        text = text.decode()
+    lines = text.splitlines()
+
+    header = lines[0].split()
+    ntyp, nat, ibrav = int(header[0]), int(header[1]), int(header[2])
+    celldm = [float(value) for value in header[3:9]]
+    index = 1
+    if ibrav == 0:
+        at = np.array([line.split() for line in lines[1:4]], dtype=float)
+        index = 4
+    else:
+        system = {f"celldm({i + 1})": str(value) for i, value in enumerate(celldm)}
+        at = get_cell_from_ibrav(ibrav, system, alat=1.0)
+
+    type_names = []
+    type_masses = []
+    for line in lines[index : index + ntyp]:
+        _, name, mass = line.split("'")
+        type_names.append(name.strip())
+        type_masses.append(float(mass))
+    index += ntyp
+    atom_lines = np.array(" ".join(lines[index : index + nat]).split(), dtype=float)
+    atom_lines = atom_lines.reshape(nat, 5)
+    atom_types = atom_lines[:, 1].astype(int) - 1
+    tau = atom_lines[:, 2:]
+    index += nat
+
+    epsilon = None
+    zeu = None
+    if lines[index].strip().upper().startswith("T"):
+        epsilon = np.array(
+            " ".join(lines[index + 1 : index + 4]).split(), dtype=float
+        ).reshape(3, 3)
+        index += 4
+        # For each atom, a line with its index and 3 lines with zeu(k, i)
+        zeu_lines = [
+            lines[index + 4 * na + 1 : index + 4 * na + 4] for na in range(nat)
+        ]
+        zeu = np.array(" ".join(sum(zeu_lines, [])).split(), dtype=float)
+        zeu = zeu.reshape(nat, 3, 3)
+        index += 4 * nat
+    else:
+        index += 1
+
+    mesh = [int(value) for value in lines[index].split()]
+    index += 1
+    n_cells = mesh[0] * mesh[1] * mesh[2]
+    n_blocks = 9 * nat * nat
+    block_lines = [line for line in lines[index:] if line.strip()]
+    if len(block_lines) != n_blocks * (n_cells + 1):
+        raise ValueError(
+            "Unexpected number of lines in the force constants file: "
+            f"{len(block_lines)} instead of {n_blocks * (n_cells + 1)}"
+        )
+    blocks = np.array(block_lines, dtype=object).reshape(n_blocks, n_cells + 1)
+    # Each block starts with "i j na nb", then one line per cell "m1 m2 m3 value(s)"
+    block_heads = np.array(" ".join(blocks[:, 0]).split(), dtype=int).reshape(-1, 4) - 1
+    values = np.array(" ".join(blocks[:, 1:].ravel()).split(), dtype=float)
+    values = values.reshape(n_blocks, n_cells, -1)
+    cells = values[0, :, :3].astype(int) - 1
+
+    frc = np.zeros((n_blocks, *mesh))
+    frc[:, cells[:, 0], cells[:, 1], cells[:, 2]] = values[:, :, 3]
+    frc_full = np.zeros(tuple(mesh) + (3, 3, nat, nat))
+    i, j, na, nb = block_heads.T
+    frc_full[:, :, :, i, j, na, nb] = frc.transpose(1, 2, 3, 0)
+
+    return {
+        "alat": celldm[0],
+        "at": at,
+        "species": [type_names[t] for t in atom_types],
+        "masses": np.array(type_masses)[atom_types],
+        "tau": tau,
+        "epsilon": epsilon,
+        "zeu": zeu,
+        "mesh": mesh,
+        "frc": frc_full,
+        "hash": hashlib.sha256(text.encode()).hexdigest(),
+    }
+
+
+def read_matdyn_settings(file_obj):
+    """
+    Read the settings of the &INPUT namelist of a matdyn.x input file that are
+    relevant for the interpolation.
+
+    :return: a dictionary with "asr" (string, "no" if not in the file, the default
+        of matdyn.x) and "loto_2d" (bool, only if in the file)
+    """
+    text = open_decompressed(file_obj).read()
+    text = "\n".join(strip_comment(line) for line in text.splitlines())
+    match = re.search(r"&input(.*?)^\s*/", text, re.IGNORECASE | re.DOTALL | re.M)
+    if not match:
+        raise ValueError("The &INPUT namelist was not found in the matdyn.x input")
+    values = {
+        m.group("key").lower(): m.group("value").strip("'\"")
+        for m in namelist_value_regex.finditer(match.group(1))
+    }
+    settings = {"asr": values.get("asr", "no").lower()}
+    if "loto_2d" in values:
+        settings["loto_2d"] = values["loto_2d"].lower().strip(".").startswith("t")
+    return settings
+
+
+def get_ws_vectors(at, mesh):
+    """
+    Return the vectors defining the Wigner-Seitz cell of the supercell of the mesh
+    (as in wsinit of QE), with shape (124, 3).
+    """
+    supercell = at * np.array(mesh)[:, None]
+    n = np.arange(-2, 3)
+    indices = np.stack(np.meshgrid(n, n, n, indexing="ij"), axis=-1).reshape(-1, 3)
+    indices = indices[np.any(indices != 0, axis=1)]
+    return indices @ supercell
+
+
+def get_ws_weights(vectors, ws_vectors):
+    """
+    Return the weight of each vector (shape (..., 3)) in the Wigner-Seitz cell: 0
+    outside, 1 / (number of equivalent images) inside or on the border.
+    """
+    projections = vectors @ ws_vectors.T - 0.5 * np.sum(ws_vectors**2, axis=1)
+    outside = np.any(projections > ws_tolerance, axis=-1)
+    n_equivalent = 1 + np.sum(np.abs(projections) < ws_tolerance, axis=-1)
+    return np.where(outside, 0.0, 1.0 / n_equivalent)
+
+
+def get_ws_images(at, mesh, tau):
+    """
+    Return the lattice vectors of all the images of the force constants of the mesh
+    with a non-zero Wigner-Seitz weight.
+
+    :return: (integer lattice vectors of shape (nimages, 3), weights of shape
+        (nimages, nat, nat)), the weight for the pair (a, b) being the one of the vector
+        R + tau_a - tau_b
+    """
+    ranges = [np.arange(-2 * n, 2 * n + 1) for n in mesh]
+    lattice_vectors = np.stack(np.meshgrid(*ranges, indexing="ij"), axis=-1)
+    lattice_vectors = lattice_vectors.reshape(-1, 3)
+    cartesian = lattice_vectors @ at
+    ws_vectors = get_ws_vectors(at, mesh)
+    weights = np.stack(
+        [
+            get_ws_weights(cartesian[:, None, :] + tau_a - tau, ws_vectors)
+            for tau_a in tau
+        ],
+        axis=1,
+    )
+    keep = np.any(weights > 0, axis=(1, 2))
+    return lattice_vectors[keep], weights[keep]
+
+
+def impose_asr_simple(frc):
+    """
+    Impose the acoustic sum rule by correcting the on-site force constants
+    (asr = 'simple' of matdyn.x).
+    """
+    frc = frc.copy()
+    correction = frc.sum(axis=(0, 1, 2, 6))  # (i, j, na)
+    nat = frc.shape[-1]
+    frc[0, 0, 0, :, :, np.arange(nat), np.arange(nat)] -= correction.transpose(2, 0, 1)
+    return frc
+
+
+def impose_asr_all(frc, at, mesh, tau, long_range=None, rotational=True, rcond=1e-12):
+    """
+    Impose the translational and rotational (Born-Huang) invariance and the
+    equilibrium (Huang) conditions, together with the symmetry of the force constants
+    under the exchange of the two atoms, with the smallest change of the force
+    constants (asr = 'all' of matdyn.x). This gives the quadratic dispersion of the
+    flexural modes of 2D materials. With rotational=False, only the translational
+    invariance and the symmetry are imposed (asr = 'crystal' of matdyn.x, which
+    applies it to the short-range part only: long_range is then None).
+
+    As in matdyn.x, the conditions apply to the total force constants: the
+    short-range part plus `long_range`, the long-range part on the same mesh (see
+    `PhononInterpolator.get_long_range_force_constants`). The result is the exact
+    orthogonal projection onto these linear constraints, found by solving the normal
+    equations of the constraints restricted to the symmetric force constants.
+
+    :return: the short-range part of the projected force constants
+    """
+    nat = len(tau)
+    n_cells = int(np.prod(mesh))
+    # First and second moments of the vectors from atom a to the images of atom b,
+    # summed with the Wigner-Seitz weights, for each cell of the mesh
+    lattice_vectors, weights = get_ws_images(at, mesh, tau)
+    vectors = -(lattice_vectors @ at)[:, None, None, :] - tau[:, None, :] + tau
+    cells = np.ravel_multi_index(np.mod(lattice_vectors, mesh).T, mesh)
+    moment1 = np.zeros((n_cells, nat, nat, 3))
+    np.add.at(moment1, cells, weights[..., None] * vectors)
+    moment2 = np.zeros((n_cells, nat, nat, 3, 3))
+    np.add.at(
+        moment2,
+        cells,
+        weights[..., None, None] * vectors[..., :, None] * vectors[..., None, :],
+    )
+
+    # Each constraint is a sparse row over the flattened force constants: the
+    # indexes and the values of its non-zero elements, so that the memory grows
+    # like the force constants and not like their square
+    index = np.arange(frc.size).reshape(n_cells, 3, 3, nat, nat)
+    rows = []
+    # Translational and rotational invariance, for each atom a
+    for a in range(nat):
+        for i in range(3):
+            for j in range(3):
+                rows.append((index[:, i, j, a, :], np.ones((n_cells, nat))))
+                if not rotational:
+                    continue
+                for k in range(j + 1, 3):
+                    rows.append(
+                        (
+                            [index[:, i, j, a, :], index[:, i, k, a, :]],
+                            [moment1[:, a, :, k], -moment1[:, a, :, j]],
+                        )
+                    )
+    # Huang conditions
+    pairs = [(i, j) for i in range(3) for j in range(3)] if rotational else []
+    for n, (i, j) in enumerate(pairs):
+        for k, l in pairs[n + 1 :]:
+            rows.append(
+                (
+                    [index[:, i, j], index[:, k, l]],
+                    [moment2[..., k, l], -moment2[..., i, j]],
+                )
+            )
+    columns = [np.ravel(indexes) for indexes, _ in rows]
+    values = np.concatenate([np.ravel(row_values) for _, row_values in rows])
+    row_ids = np.repeat(np.arange(len(rows)), [len(c) for c in columns])
+    columns = np.concatenate(columns)
+
+    # Index of the element (-R, j, i, b, a) of each element (R, i, j, a, b)
+    opposite = np.ix_(*[(-np.arange(n)) % n for n in mesh])
+    exchanged = np.arange(frc.size).reshape(frc.shape)
+    exchanged = exchanged.transpose(0, 1, 2, 4, 3, 6, 5)[opposite].ravel()
+
+    total = frc if long_range is None else frc + long_range
+    total = total.ravel()
+    total = 0.5 * (total + total[exchanged])
+    # Constraints restricted to the symmetric force constants (the exchange is an
+    # involution, so that column c of a row goes to column exchanged[c]), with
+    # the elements sorted by column and without duplicates
+    n_rows = len(rows)
+    keys, inverse = np.unique(
+        np.concatenate([columns, exchanged[columns]]) * n_rows + np.tile(row_ids, 2),
+        return_inverse=True,
+    )
+    values = np.bincount(inverse.ravel(), 0.5 * np.tile(values, 2))
+    columns, row_ids = np.divmod(keys, n_rows)
+
+    # Normal equations: the Gram matrix sums the products of the elements of the
+    # same column, the columns having few elements each
+    gram = np.zeros(n_rows * n_rows)
+    for offset in range(np.bincount(columns).max()):
+        first = np.flatnonzero(columns[offset:] == columns[: len(columns) - offset])
+        second = first + offset
+        products = values[first] * values[second]
+        gram += np.bincount(
+            row_ids[first] * n_rows + row_ids[second], products, gram.size
+        )
+        if offset:
+            gram += np.bincount(
+                row_ids[second] * n_rows + row_ids[first], products, gram.size
+            )
+    gram = gram.reshape(n_rows, n_rows)
+    rhs = np.bincount(row_ids, values * total[columns], n_rows)
+    multipliers = np.linalg.lstsq(gram, rhs, rcond=rcond)[0]
+    total -= np.bincount(columns, values * multipliers[row_ids], total.size)
+    total = total.reshape(frc.shape)
+    return total if long_range is None else total - long_range
+
+
+class PhononInterpolator:
+    """
+    Compute the phonon frequencies, eigenvectors and group velocities at any q-point
+    from the real-space force constants, in batches of q-points, as matdyn.x does.
+
+    The short-range part is Fourier interpolated with the Wigner-Seitz weights of
+    matdyn.x. If the force constants have Born effective charges, the long-range
+    dipole-dipole part is added with an Ewald sum, in 3D or with the 2D Coulomb
+    cutoff (loto_2d).
+
+    The q-points are given in reduced coordinates of the reciprocal lattice of the
+    force constants.
+    """
+
+    def __init__(self, fc_data, asr="simple", loto_2d=None):
+        """
+        :param fc_data: the force constants, as returned by `read_force_constants`
+        :param asr: acoustic sum rule, "no", "simple", "crystal" or "all" (see
+            `impose_asr_all`). Unlike matdyn.x, which imposes none unless its
+            input sets asr (see `load_interpolator`), "simple" by default
+        :param loto_2d: use the 2D long-range term; by default, True if the mesh has
+            a single point along the third direction
+        """
+        self.alat = fc_data["alat"]
+        self.at = np.asarray(fc_data["at"], dtype=float)
+        self.bg = np.linalg.inv(self.at).T
+        self.tau = np.asarray(fc_data["tau"], dtype=float)
+        self.species = fc_data["species"]
+        self.mesh = list(fc_data["mesh"])
+        self.hash = fc_data.get("hash")
+        self.asr = asr
+        self.nat = len(self.tau)
+        self.nmodes = 3 * self.nat
+        self.epsilon = fc_data["epsilon"]
+        self.zeu = fc_data["zeu"]
+        self.loto_2d = self.mesh[2] == 1 if loto_2d is None else loto_2d
+
+        if asr not in ("no", "simple", "crystal", "all"):
+            raise ValueError(
+                f"Unsupported asr '{asr}', use 'no', 'simple', 'crystal' or 'all'"
+            )
+        if self.zeu is not None:
+            if asr != "no":
+                # Charge neutrality of the Born effective charges
+                self.zeu = self.zeu - self.zeu.mean(axis=0)
+            self._init_long_range()
+
+        frc = fc_data["frc"]
+        if asr == "simple":
+            frc = impose_asr_simple(frc)
+        elif asr == "all":
+            long_range = None
+            if self.zeu is not None:
+                long_range = self.get_long_range_force_constants()
+            frc = impose_asr_all(frc, self.at, self.mesh, self.tau, long_range)
+        elif asr == "crystal":
+            frc = impose_asr_all(frc, self.at, self.mesh, self.tau, rotational=False)
+
+        # Short-range part: force constants of all the images, with their weights
+        lattice_vectors, weights = get_ws_images(self.at, self.mesh, self.tau)
+        cells = np.mod(lattice_vectors, self.mesh)
+        images = frc[cells[:, 0], cells[:, 1], cells[:, 2]]  # (nR, i, j, na, nb)
+        images = images * weights[:, None, None, :, :]
+        self.lattice_vectors = lattice_vectors @ self.at  # cartesian, alat
+        self.image_fc = images.transpose(0, 3, 1, 4, 2).reshape(
+            len(images), self.nmodes, self.nmodes
+        )
+
+        self.masses = np.asarray(fc_data["masses"], dtype=float)
+        self.inv_sqrt_mass = 1.0 / np.sqrt(np.repeat(self.masses, 3))
+        self.inv_sqrt_masses = np.outer(self.inv_sqrt_mass, self.inv_sqrt_mass)
+
+    @property
+    def cell(self):
+        "Lattice vectors in angstrom."
+        return self.at * self.alat * bohr_in_angstrom
+
+    @property
+    def positions(self):
+        "Reduced coordinates of the atoms."
+        return self.tau @ np.linalg.inv(self.at)
+
+    @property
+    def rec(self):
+        "Reciprocal lattice vectors in 1/angstrom (including the 2 pi factor)."
+        return self.bg * 2 * np.pi / (self.alat * bohr_in_angstrom)
+
+    @property
+    def nbytes(self):
+        "Approximate memory used by the precomputed arrays, in bytes."
+        arrays = [self.lattice_vectors, self.image_fc, self.inv_sqrt_masses]
+        if self.zeu is not None:
+            arrays += [self.gvectors, self.long_range_onsite]
+        return sum(array.nbytes for array in arrays)
+
+    def _init_long_range(self):
+        """
+        Precompute the G-vectors of the Ewald sum and the q-independent on-site term
+        of the long-range part (as in rgd_blk of QE).
+        """
+        geg = ewald_gmax * ewald_alpha * 4.0
+        nrx = [
+            (
+                0
+                if self.mesh[i] == 1
+                else int(np.sqrt(geg) / np.linalg.norm(self.bg[i])) + 1
+            )
+            for i in range(3)
+        ]
+        ranges = [np.arange(-n, n + 1) for n in nrx]
+        indices = np.stack(np.meshgrid(*ranges, indexing="ij"), axis=-1).reshape(-1, 3)
+        self.gvectors = indices @ self.bg
+
+        omega = abs(np.linalg.det(self.at)) * self.alat**3
+        e2 = 2.0
+        if self.loto_2d:
+            c_half = 0.5 * 2 * np.pi / self.bg[2, 2]
+            self.long_range_fac = e2 * 4 * np.pi / omega * c_half
+            self.reff = (self.epsilon[:2, :2] - np.eye(2)) * c_half
+        else:
+            self.long_range_fac = e2 * 4 * np.pi / omega
+
+        factor, _ = self._get_ewald_factor(self.gvectors[None])
+        factor = factor[0]
+        zg = np.einsum("gk,aki->gai", self.gvectors, self.zeu)  # (nG, nat, 3)
+        arg = 2 * np.pi * self.gvectors @ self.tau.T  # (nG, nat)
+        cos = np.cos(arg[:, :, None] - arg[:, None, :])  # (nG, na, nb)
+        fnat = np.einsum("gab,gbj->gaj", cos, zg)
+        onsite = -np.einsum("g,gai,gaj->aij", factor, zg, fnat)
+        self.long_range_onsite = np.zeros((self.nmodes, self.nmodes))
+        for a in range(self.nat):
+            self.long_range_onsite[3 * a : 3 * a + 3, 3 * a : 3 * a + 3] = onsite[a]
+
+    def _get_ewald_factor(self, kvectors, derivatives=False):
+        """
+        Return the prefactor of each term of the Ewald sum of the long-range part,
+        for vectors k = G + q of shape (..., 3), and the gradient of its logarithm
+        with respect to k.
+        """
+        kvectors = np.asarray(kvectors)
+        if self.loto_2d:
+            geg = np.sum(kvectors**2, axis=-1)
+            kp = kvectors[..., :2]
+            gp2 = np.sum(kp**2, axis=-1)
+            safe_gp2 = np.where(gp2 > 1e-8, gp2, 1.0)
+            r = np.where(
+                gp2 > 1e-8,
+                np.einsum("...i,ij,...j->...", kp, self.reff, kp) / safe_gp2,
+                0.0,
+            )
+        else:
+            eps_k = kvectors @ self.epsilon.T
+            geg = np.sum(kvectors * eps_k, axis=-1)
+        valid = (geg > 0) & (geg / ewald_alpha / 4.0 < ewald_gmax)
+        safe_geg = np.where(valid, geg, 1.0)
+        gaussian = np.exp(-safe_geg / ewald_alpha / 4.0)
+        if self.loto_2d:
+            g = np.sqrt(safe_geg)
+            factor = self.long_range_fac * gaussian / g / (1.0 + r * g)
+        else:
+            factor = self.long_range_fac * gaussian / safe_geg
+        factor = np.where(valid, factor, 0.0)
+        if not derivatives:
+            return factor, None
+
+        # Gradient of log(factor)
+        if self.loto_2d:
+            dr = np.zeros(kvectors.shape)
+            dr[..., :2] = np.where(
+                (gp2 > 1e-8)[..., None],
+                2
+                * (kp @ (0.5 * (self.reff + self.reff.T)) - r[..., None] * kp)
+                / safe_gp2[..., None],
+                0.0,
+            )
+            dlog = (
+                -2 * kvectors / ewald_alpha / 4.0
+                - kvectors / safe_geg[..., None]
+                - (g[..., None] * dr + (r / g)[..., None] * kvectors)
+                / (1.0 + r * g)[..., None]
+            )
+        else:
+            dgeg = kvectors @ (self.epsilon + self.epsilon.T).T
+            dlog = dgeg * (-1.0 / ewald_alpha / 4.0 - 1.0 / safe_geg)[..., None]
+        return factor, dlog
+
+    def _get_long_range(self, qcart, derivatives=False):
+        """
+        Long-range part of the dynamical matrices (not mass scaled) for a batch of
+        q-points in cartesian coordinates (2 pi / alat), and its derivatives with
+        respect to q.
+        """
+        kvectors = self.gvectors[None, :, :] + qcart[:, None, :]  # (nq, nG, 3)
+        factor, dlog = self._get_ewald_factor(kvectors, derivatives)
+        phase = np.exp(2j * np.pi * kvectors @ self.tau.T)  # (nq, nG, nat)
+        zk = (kvectors @ self.zeu.transpose(1, 0, 2).reshape(3, -1)).reshape(
+            *phase.shape, 3
+        )
+        x = (zk * phase[..., None]).reshape(*phase.shape[:2], self.nmodes)
+        # Sums over G as batched matrix products (BLAS)
+        fx = factor[..., None] * x
+        x_conj = x.conj()
+        dyn = fx.transpose(0, 2, 1) @ x_conj
+        if not derivatives:
+            return dyn + self.long_range_onsite, None
+
+        # With d x_(a,i) / d k_c = Z_a[c, i] phase_a + 2 pi i tau_a[c] x_(a,i), the
+        # derivative is C + C^H + 2 pi i (tau_a[c] - tau_b[c]) dyn, where
+        # C = sum_G (dfactor_c x / 2 + factor Z_a[c, i] phase_a) x^H
+        nq, ng = phase.shape[:2]
+        weighted = (0.5 * dlog[..., None] * fx[:, :, None, :]).reshape(nq, ng, -1)
+        c_matrix = (weighted.transpose(0, 2, 1) @ x_conj).reshape(
+            nq, 3, self.nmodes, self.nmodes
+        )
+        fphase_x = (factor[..., None] * phase).transpose(0, 2, 1) @ x_conj
+        c_matrix += (
+            self.zeu.transpose(1, 0, 2)[None, :, :, :, None]
+            * fphase_x[:, None, :, None, :]
+        ).reshape(c_matrix.shape)
+        tau = np.repeat(self.tau, 3, axis=0)  # of each mode
+        ddyn = c_matrix + c_matrix.conj().transpose(0, 1, 3, 2)
+        ddyn += 2j * np.pi * (tau.T[:, :, None] - tau.T[:, None, :]) * dyn[:, None]
+        return dyn + self.long_range_onsite, ddyn
+
+    def get_long_range_force_constants(self):
+        """
+        Long-range part of the force constants on the mesh of the short-range part:
+        the Fourier transform of the long-range dynamical matrices at the q-points of
+        the mesh (the part subtracted by q2r.x), with the shape of "frc".
+        """
+        ranges = [np.arange(n) for n in self.mesh]
+        cells = np.stack(np.meshgrid(*ranges, indexing="ij"), axis=-1).reshape(-1, 3)
+        qpoints = cells / np.array(self.mesh)
+        dyn, _ = self._get_long_range(qpoints @ self.bg)
+        phase = np.exp(2j * np.pi * qpoints @ cells.T) / len(qpoints)  # (nq, nR)
+        frc = np.einsum("qr,qij->rij", phase, dyn).real
+        frc = frc.reshape(len(cells), self.nat, 3, self.nat, 3)
+        return frc.transpose(0, 2, 4, 1, 3).reshape(
+            tuple(self.mesh) + (3, 3, self.nat, self.nat)
+        )
+
+    def _get_nonanalytic(self, direction):
+        """
+        Non-analytic term at q = 0 for 3D materials, for q going to 0 along direction
+        (cartesian).
+        """
+        qeq = direction @ self.epsilon @ direction
+        if qeq < 1e-8:
+            return 0.0
+        zq = np.einsum("k,aki->ai", direction, self.zeu).ravel()
+        omega = abs(np.linalg.det(self.at)) * self.alat**3
+        return 2.0 * 4 * np.pi / omega * np.outer(zq, zq) / qeq
+
+    def _get_chunk_size(self, derivatives):
+        size = max(len(self.lattice_vectors), self.nmodes**2)
+        if self.zeu is not None:
+            size = max(size, len(self.gvectors) * self.nmodes * 4)
+        if derivatives:
+            size *= 4
+        return max(1, int(chunk_max_bytes // (16 * size)))
+
+    def get_dynamical_matrices(self, qpoints, derivatives=False, directions=None):
+        """
+        Compute the mass-scaled dynamical matrices for a batch of q-points.
+
+        :param qpoints: reduced coordinates, shape (nq, 3)
+        :param derivatives: also compute the derivatives with respect to the
+            cartesian components of q (in 1/angstrom, including the 2 pi factor)
+        :param directions: cartesian directions used at q = 0 for the non-analytic
+            term (3D materials with Born effective charges), shape (nq, 3)
+
+        :return: (dynamical matrices of shape (nq, 3 nat, 3 nat), derivatives of
+            shape (nq, 3, 3 nat, 3 nat) or None), in Ry/bohr^2/(mass in Ry units)
+        """
+        qcart = np.atleast_2d(qpoints) @ self.bg  # 2 pi / alat
+        phase = np.exp(-2j * np.pi * qcart @ self.lattice_vectors.T)  # (nq, nR)
+        flat_fc = self.image_fc.reshape(len(self.image_fc), -1)
+        shape = (len(qcart), self.nmodes, self.nmodes)
+        dyn = (phase @ flat_fc).reshape(shape)
+        ddyn = None
+        if derivatives:
+            # the three components in one product, reusing the phase factors
+            dphase = -2j * np.pi * self.lattice_vectors.T * phase[:, None, :]
+            ddyn = (dphase @ flat_fc).reshape(len(qcart), 3, *shape[1:])
+        if self.zeu is not None:
+            long_range, dlong_range = self._get_long_range(qcart, derivatives)
+            dyn += long_range
+            if derivatives:
+                ddyn += dlong_range
+            if not self.loto_2d and directions is not None:
+                for iq in np.flatnonzero(np.linalg.norm(qcart, axis=1) < 1e-8):
+                    norm = np.linalg.norm(directions[iq])
+                    if norm > 0:
+                        dyn[iq] += self._get_nonanalytic(directions[iq] / norm)
+
+        dyn = 0.5 * (dyn + dyn.conj().transpose(0, 2, 1)) * self.inv_sqrt_masses
+        if derivatives:
+            # From 2 pi / alat units to 1/angstrom
+            ddyn = 0.5 * (ddyn + ddyn.conj().transpose(0, 1, 3, 2))
+            ddyn *= self.inv_sqrt_masses * self.alat * bohr_in_angstrom / (2 * np.pi)
+        return dyn, ddyn
+
+    def _iter_chunks(self, qpoints, directions, derivatives):
+        qpoints = np.atleast_2d(qpoints)
+        chunk_size = self._get_chunk_size(derivatives)
+        for start in range(0, len(qpoints), chunk_size):
+            chunk = slice(start, start + chunk_size)
+            yield chunk, self.get_dynamical_matrices(
+                qpoints[chunk],
+                derivatives,
+                None if directions is None else np.asarray(directions)[chunk],
+            )
+
+    def _get_displacements(self, vectors):
+        """
+        Convert the eigenvectors of the mass-scaled dynamical matrix to normalized
+        displacements (the convention of matdyn.modes), with shape (nq, nmodes, nat, 3).
+        """
+        displacements = vectors * self.inv_sqrt_mass[None, :, None]
+        displacements /= np.linalg.norm(displacements, axis=1, keepdims=True)
+        return displacements.transpose(0, 2, 1).reshape(
+            len(vectors), self.nmodes, self.nat, 3
+        )
+
+    def diagonalize(self, qpoints, directions=None, eigenvectors=True):
+        """
+        Compute the frequencies (and eigenvectors) for a batch of q-points.
+
+        :param qpoints: reduced coordinates, shape (nq, 3)
+        :param directions: see `get_dynamical_matrices`
+
+        :return: (frequencies in cm^-1 of shape (nq, 3 nat), negative for imaginary
+            frequencies, normalized displacements of shape (nq, 3 nat, nat, 3) or None)
+        """
+        qpoints = np.atleast_2d(qpoints)
+        frequencies = np.zeros((len(qpoints), self.nmodes))
+        displacements = None
+        if eigenvectors:
+            displacements = np.zeros((len(qpoints), self.nmodes, self.nat, 3), complex)
+        for chunk, (dyn, _) in self._iter_chunks(qpoints, directions, False):
+            if eigenvectors:
+                omega2, vectors = np.linalg.eigh(dyn)
+                displacements[chunk] = self._get_displacements(vectors)
+            else:
+                omega2 = np.linalg.eigvalsh(dyn)
+            frequencies[chunk] = np.sign(omega2) * np.sqrt(np.abs(omega2)) * ry_to_cm1
+        return frequencies, displacements
+
+    def get_group_velocities(
+        self, qpoints, directions=None, degeneracy_tol=1e-4, eigenvectors=False
+    ):
+        """
+        Compute the frequencies and group velocities for a batch of q-points, from
+        the analytic derivatives of the dynamical matrix (Hellmann-Feynman theorem).
+
+        Within a subspace of degenerate modes, the modes are first rotated to
+        diagonalize the derivative along the given direction (e.g. the direction of
+        the q-path, so that the velocities follow the branches along the path); without
+        direction each cartesian component is diagonalized in the subspace.
+
+        :param qpoints: reduced coordinates, shape (nq, 3)
+        :param directions: cartesian directions, shape (nq, 3)
+        :param degeneracy_tol: tolerance on the frequencies (cm^-1) of degenerate modes
+
+        :return: (frequencies in cm^-1 of shape (nq, 3 nat), group velocities in km/s
+            of shape (nq, 3 nat, 3), displacements or None)
+        """
+        qpoints = np.atleast_2d(qpoints)
+        nq = len(qpoints)
+        frequencies = np.zeros((nq, self.nmodes))
+        velocities = np.zeros((nq, self.nmodes, 3))
+        displacements = None
+        if eigenvectors:
+            displacements = np.zeros((nq, self.nmodes, self.nat, 3), complex)
+
+        for chunk, (dyn, ddyn) in self._iter_chunks(qpoints, directions, True):
+            omega2, vectors = np.linalg.eigh(dyn)
+            freqs = np.sign(omega2) * np.sqrt(np.abs(omega2)) * ry_to_cm1
+            # d omega^2 / dk: diagonal of V^H dD V, for all the q at once
+            ddyn_vectors = ddyn @ vectors[:, None]
+            domega2 = np.einsum("qai,qcai->qic", vectors.conj(), ddyn_vectors).real
+
+            chunk_directions = (
+                None if directions is None else np.asarray(directions)[chunk]
+            )
+            # Degenerate subspaces: few of them, treated one by one
+            for iq, imode in zip(*np.nonzero(np.diff(freqs, axis=1) < degeneracy_tol)):
+                if (
+                    imode > 0
+                    and freqs[iq, imode] - freqs[iq, imode - 1] < degeneracy_tol
+                ):
+                    continue  # not the first mode of the subspace
+                end = imode + 1
+                while (
+                    end < self.nmodes
+                    and freqs[iq, end] - freqs[iq, end - 1] < degeneracy_tol
+                ):
+                    end += 1
+                # full projection of the derivatives in the degenerate subspace
+                block = (
+                    vectors[iq, :, imode:end].conj().T
+                    @ ddyn_vectors[iq, :, :, imode:end]
+                )
+                direction = None
+                if chunk_directions is not None:
+                    direction = chunk_directions[iq]
+                    norm = np.linalg.norm(direction)
+                    direction = direction / norm if norm > 0 else None
+                if direction is not None:
+                    _, rotation = np.linalg.eigh(
+                        np.einsum("c,cij->ij", direction, block)
+                    )
+                    rotated = np.einsum(
+                        "ia,cij,jb->cab", rotation.conj(), block, rotation
+                    )
+                    domega2[iq, imode:end] = np.einsum("cii->ic", rotated).real
+                    vectors[iq, :, imode:end] = vectors[iq, :, imode:end] @ rotation
+                else:
+                    domega2[iq, imode:end] = np.linalg.eigvalsh(block).T
+
+            # d omega / dk = (d omega^2 / dk) / (2 omega), in cm^-1 * angstrom
+            abs_freqs = np.abs(freqs)[..., None]
+            safe_freqs = np.where(abs_freqs > degeneracy_tol, abs_freqs, 1.0)
+            dfreq = np.where(
+                abs_freqs > degeneracy_tol,
+                domega2 * ry_to_cm1**2 / (2 * safe_freqs),
+                0.0,
+            )
+            frequencies[chunk] = freqs
+            # v = d omega / dk, with omega = 2 pi c * frequency (cm^-1)
+            velocities[chunk] = 2 * np.pi * speed_of_light_km_s * 1e-10 * 1e2 * dfreq
+            if eigenvectors:
+                displacements[chunk] = self._get_displacements(vectors)
+        return frequencies, velocities, displacements
+
+
+def get_path_directions(qpoints_cart, discont_indexes=()):
+    """
+    Return the direction of the path at each q-point (cartesian), from the
+    neighbouring q-points of the same segment.
+
+    :param qpoints_cart: cartesian q-points of the path, shape (nq, 3)
+    :param discont_indexes: indexes of the last q-point before each discontinuity
+    """
+    qpoints_cart = np.asarray(qpoints_cart, dtype=float)
+    nq = len(qpoints_cart)
+    following = np.arange(nq) + 1
+    previous = np.arange(nq) - 1
+    following[-1] = nq - 1
+    previous[0] = 0
+    for index in discont_indexes:
+        following[index] = index
+        previous[index + 1] = index + 1
+    directions = qpoints_cart[following] - qpoints_cart[previous]
+    norms = np.linalg.norm(directions, axis=1, keepdims=True)
+    return np.divide(directions, norms, out=np.zeros_like(directions), where=norms > 0)
+
+
+def load_interpolator(fc_file, matdyn_in_file=None, **kwargs):
+    """
+    Build a `PhononInterpolator` from the force constants file of q2r.x, with the
+    asr and loto_2d settings of the matdyn.x input file if given (like matdyn.x,
+    no acoustic sum rule if the input does not set asr).
+
+    kwargs override the settings of the matdyn.x input.
+    """
+    settings = read_matdyn_settings(matdyn_in_file) if matdyn_in_file else {}
+    settings.update(kwargs)
+    return PhononInterpolator(read_force_constants(fc_file), **settings)
+
+
+def add_group_velocities(phonon_web_converter, interpolator):
+    """
+    Compute the group velocities at the q-points of a `PhononWebConverter` and add
+    them to its data. In degenerate subspaces, the velocities along the q-path are
+    used to separate the branches.
+    """
+    qpoints_car = phonon_web_converter.get_cartesian_qpoints()
+    directions = get_path_directions(qpoints_car, phonon_web_converter.discont_indexes)
+    qpoints = qpoints_car @ np.linalg.inv(interpolator.rec)
+    _, velocities, _ = interpolator.get_group_velocities(qpoints, directions)
+    phonon_web_converter.set_group_velocities(velocities)
@@ -3,10 +3,9 @@
 import json
 
 import numpy as np
-from ase.data import chemical_symbols
 
 from .lattice import rec_lat, red_car
-from .utils import JsonEncoder, get_chemical_formula
+from .utils import JsonEncoder, chemical_symbols, get_chemical_formula
 
 
 def estimate_band_connection(prev_eigvecs, eigvecs, prev_band_order):
@@ -14,6 +13,14 @@ def estimate_band_connection(prev_eigvecs, eigvecs, prev_band_order):
     A function to order the phonon eigenvectors taken from phonopy
     """
     metric = np.abs(np.dot(prev_eigvecs.conjugate().T, eigvecs))
+    return get_band_connection(metric, prev_band_order)
+
+
+def get_band_connection(metric, prev_band_order):
+    """
+    Order the bands from the absolute overlaps between the eigenvectors at the
+    previous q-point (rows) and at the current one (columns).
+    """
     connection_order = []
     indices = list(range(len(metric)))
     indices.reverse()
@@ -32,6 +39,25 @@ def estimate_band_connection(prev_eigvecs, eigvecs, prev_band_order):
     return band_order
 
 
+def estimate_frequency_connection(predicted, frequencies):
+    """
+    Order the bands from the continuity of the frequencies, when the eigenvectors
+    are not available: the predicted frequencies (e.g. extrapolated from the previous
+    q-points) are matched in ascending order to the frequencies, so that two bands
+    cross when their predicted frequencies cross.
+
+    :param predicted: predicted frequencies of the ordered bands
+    :param frequencies: frequencies at the current q-point
+
+    :return: band_order, the index in frequencies of each ordered band
+    """
+    band_order = np.empty(len(predicted), dtype=int)
+    band_order[np.argsort(predicted, kind="stable")] = np.argsort(
+        frequencies, kind="stable"
+    )
+    return band_order
+
+
 def get_corner_qpts(qpoints):
     """
     Check from the qpoints path, which points are corners (qpath changes direction).
@@ -149,6 +175,80 @@ def detect_kpath_discontinuities(highsym_qpts):
     return discont_indexes, merged_highsym_qpts
 
 
+def get_delta_step(precision):
+    """
+    Return the quantization step of the delta-encoded eigenvectors, for a maximum
+    error precision on each component.
+    """
+    return 2 * precision
+
+
+def encode_vectors(vectors, segment_starts, precision):
+    """
+    Quantize the eigenvectors as integer deltas from the previous q-point.
+
+    The deltas are taken from the reconstructed (quantized) vectors of the previous
+    q-point, so that the errors do not accumulate along the path: each component of
+    the decoded vectors differs by at most precision from the original one.
+
+    :param vectors: float array of shape (n_qpts, ...)
+    :param segment_starts: indexes of the q-points where the path restarts (the
+        deltas are taken from zero there, e.g. after a discontinuity)
+    :param precision: maximum absolute error of each component
+
+    :return: integer array with the same shape as vectors
+    """
+    step = get_delta_step(precision)
+    deltas = np.zeros(vectors.shape, dtype=np.int64)
+    previous = np.zeros(vectors.shape[1:])
+    for k, vector in enumerate(vectors):
+        if k in segment_starts:
+            previous[...] = 0.0
+        deltas[k] = np.rint((vector - previous) / step)
+        previous += deltas[k] * step
+    return deltas
+
+
+def decode_vectors(phonon_data):
+    """
+    Return the eigenvectors of the converted data as a float array of shape
+    (n_qpts, n_phonons, n_atoms, 3, 2), decoding them if they are delta-encoded
+    (see `PhononWebConverter`, vectors_precision).
+    """
+    if "vectors" in phonon_data:
+        return np.asarray(phonon_data["vectors"], dtype=float)
+    if "vectors_delta" not in phonon_data:
+        raise ValueError(
+            "The data has no eigenvectors (converted with eigenvalues only)"
+        )
+    encoding = phonon_data["vectors_encoding"]
+    if encoding["type"] != "delta":
+        raise ValueError(f"Unknown encoding of the vectors {encoding['type']}")
+    deltas = np.asarray(phonon_data["vectors_delta"], dtype=float)
+    starts = np.zeros(len(deltas), dtype=int)
+    starts[encoding["segment_starts"]] = 1
+    # Cumulative sums restarting at each segment start
+    cumulative = np.cumsum(deltas, axis=0)
+    start_index = np.maximum.accumulate(
+        np.where(starts.astype(bool), np.arange(len(deltas)), 0)
+    )
+    before = np.concatenate([np.zeros_like(cumulative[:1]), cumulative[:-1]])
+    return (cumulative - before[start_index]) * encoding["step"]
+
+
+def decode_phonon_data(phonon_data):
+    """
+    Return a copy of the converted data, with the delta-encoded eigenvectors decoded
+    into "vectors" (the data is returned as is if it is not encoded).
+    """
+    if "vectors_delta" not in phonon_data:
+        return phonon_data
+    phonon_data = dict(phonon_data)
+    phonon_data["vectors"] = decode_vectors(phonon_data)
+    del phonon_data["vectors_delta"], phonon_data["vectors_encoding"]
+    return phonon_data
+
+
 class PhononWebConverter:
     """
     Class to hold and manipulate generic phonon dispersions data
@@ -168,7 +268,20 @@ class PhononWebConverter:
         seekpath_symprec=1e-04,
         reorder_eigenvalues=True,
         starting_supercell=None,
+        fix_gauge=False,
+        vectors_precision=None,
     ):
+        """
+        :param eigenvectors: the eigenvectors, or None for the eigenvalues only (the
+            bands are then ordered by continuity of the frequencies, and the data
+            has no "vectors")
+        :param fix_gauge: fix the arbitrary phase of the eigenvectors continuously
+            along the path (see `_fix_gauge`)
+        :param vectors_precision: if given, write the eigenvectors as quantized
+            integer deltas from the previous q-point ("vectors_delta"), with this
+            maximum error on each component, instead of "vectors" (implies
+            fix_gauge). See `decode_vectors`.
+        """
         self.cell = cell
         self.pos = pos
         self.atom_numbers = atom_numbers
@@ -182,7 +295,9 @@ class PhononWebConverter:
         self.n_atoms = len(atom_numbers)
         self.n_phonons = len(eigenvalues[0])
 
-        self.eigenvectors = self._reshape_eigenvectors(eigenvectors)
+        self.eigenvectors = None
+        if eigenvectors is not None:
+            self.eigenvectors = self._reshape_eigenvectors(eigenvectors)
 
         if highsym_qpts is None:
             highsym_qpts = get_highsym_qpts_from_seekpath(
@@ -200,9 +315,24 @@ class PhononWebConverter:
 
         self.distances = self._get_qpt_distances()
 
-        if reorder_eigenvalues:
+        # band_order[k, n] is the index (in the input) of the n-th band at q-point k
+        self.band_order = np.tile(np.arange(self.n_phonons), (self.n_qpts, 1))
+        # band_overlaps[k, n] is the overlap of the n-th band at q-points k-1 and k
+        self.band_overlaps = None
+        self.group_velocities = None
+        if reorder_eigenvalues and self.eigenvectors is None:
+            self._reorder_eigenvalues_by_frequency()
+        elif reorder_eigenvalues:
             self._reorder_eigenvalues()
 
+        self.vectors_precision = vectors_precision
+        if fix_gauge or vectors_precision is not None:
+            if self.eigenvectors is None:
+                raise ValueError(
+                    "fix_gauge and vectors_precision need the eigenvectors"
+                )
+            self._fix_gauge()
+
         self.name = name
         if name is None:
             self.name = self.chemical_formula
@@ -254,6 +384,7 @@ class PhononWebConverter:
 
         eig = np.zeros([self.n_qpts, self.n_phonons])
         eiv = np.zeros([self.n_qpts, self.n_phonons, self.n_phonons], dtype=complex)
+        self.band_overlaps = np.zeros([self.n_qpts, self.n_phonons], dtype=complex)
         # set order at gamma
         order = list(range(self.n_phonons))
         eig[0] = self.eigenvalues[0]
@@ -261,15 +392,98 @@ class PhononWebConverter:
         for k in range(1, self.n_qpts):
             if (k - 1) not in self.discont_indexes:
                 # Doesn't seem to work well for discontinuous points, just keep the order in these cases
-                order = estimate_band_connection(vectors[k - 1].T, vectors[k].T, order)
+                overlaps = vectors[k - 1].conjugate() @ vectors[k].T
+                prev_order = order
+                order = get_band_connection(np.abs(overlaps), order)
+                self.band_overlaps[k] = overlaps[prev_order, order]
             for n, i in enumerate(order):
                 eig[k, n] = self.eigenvalues[k, i]
                 eiv[k, n] = vectors[k, i]
+            self.band_order[k] = order
 
         # update the eigenvalues with the ordered version
         self.eigenvalues = eig
         self.eigenvectors = self._reshape_eigenvectors(eiv)
 
+    def _reorder_eigenvalues_by_frequency(self):
+        """
+        Re-order the eigenvalues without the eigenvectors, to solve the band-crossings
+        from the continuity of the frequencies: the frequency of each band is
+        extrapolated linearly from the two previous q-points of the same segment.
+        """
+        eig = np.zeros([self.n_qpts, self.n_phonons])
+        order = list(range(self.n_phonons))
+        eig[0] = self.eigenvalues[0]
+        for k in range(1, self.n_qpts):
+            if (k - 1) not in self.discont_indexes:
+                predicted = eig[k - 1]
+                if k > 1 and (k - 2) not in self.discont_indexes:
+                    prev_step = self.distances[k - 1] - self.distances[k - 2]
+                    step = self.distances[k] - self.distances[k - 1]
+                    if prev_step > 0:
+                        predicted = (
+                            eig[k - 1] + (eig[k - 1] - eig[k - 2]) * step / prev_step
+                        )
+                order = estimate_frequency_connection(predicted, self.eigenvalues[k])
+            eig[k] = self.eigenvalues[k, order]
+            self.band_order[k] = order
+
+        self.eigenvalues = eig
+
+    def _fix_gauge(self, tol=1e-3):
+        """
+        Fix the arbitrary complex phase of each eigenvector, so that it changes
+        smoothly along the path: the overlap of each band with the same band at the
+        previous q-point (the overlaps used for the band connection) is made real and
+        positive. At the start of the path and of each segment after a discontinuity
+        (or if the overlap is too small, e.g. within degenerate subspaces), the
+        largest component is made real and positive instead.
+
+        Only the global phase of each mode changes, which only shifts the
+        oscillation in time.
+        """
+        dim = (self.n_qpts, self.n_phonons, self.n_phonons)
+        vectors = self.eigenvectors.view(complex).reshape(dim)
+        overlaps = self.band_overlaps
+        if overlaps is None:
+            overlaps = np.zeros([self.n_qpts, self.n_phonons], dtype=complex)
+            overlaps[1:] = np.einsum("knj,knj->kn", vectors[:-1].conj(), vectors[1:])
+            overlaps[np.array(self.discont_indexes, dtype=int) + 1] = 0
+
+        largest = np.take_along_axis(
+            vectors, np.abs(vectors).argmax(axis=2)[:, :, None], axis=2
+        )[:, :, 0]
+        phases = np.ones(self.n_phonons, dtype=complex)
+        for k in range(self.n_qpts):
+            # overlap with the already fixed vectors of the previous q-point
+            overlap = overlaps[k] * phases.conjugate()
+            reference = np.where(np.abs(overlap) > tol, overlap, largest[k])
+            phases = np.abs(reference) / np.where(reference != 0, reference, 1)
+            vectors[k] *= phases[:, None]
+        self.eigenvectors = self._reshape_eigenvectors(vectors)
+
+    def get_cartesian_qpoints(self):
+        "Return the q-points in cartesian coordinates (1/angstrom, including 2 pi)."
+        return red_car(self.qpoints, rec_lat(self.cell) * 2 * np.pi)
+
+    def set_group_velocities(self, group_velocities):
+        """
+        Add the group velocities to the data, in km/s.
+
+        :param group_velocities: array of shape (n_qpts, n_phonons, 3), with the bands
+            in the same order as the input eigenvalues (they are reordered as the
+            eigenvalues)
+        """
+        group_velocities = np.asarray(group_velocities, dtype=float)
+        if group_velocities.shape != (self.n_qpts, self.n_phonons, 3):
+            raise ValueError(
+                f"Wrong shape of the group velocities {group_velocities.shape}, "
+                f"expected {(self.n_qpts, self.n_phonons, 3)}"
+            )
+        self.group_velocities = np.take_along_axis(
+            group_velocities, self.band_order[:, :, None], axis=1
+        )
+
     def _get_starting_supercell(self, starting_supercell):
         if starting_supercell is not None:
             return starting_supercell
@@ -309,6 +523,25 @@ class PhononWebConverter:
             "eigenvalues": self.eigenvalues,  # eigenvalues (in units of cm-1)
             "vectors": self.eigenvectors,  # eigenvectors
         }
+        if self.eigenvectors is None:
+            # eigenvalues only
+            del data["vectors"]
+        elif self.vectors_precision is not None:
+            # quantized deltas of the eigenvectors from the previous q-point
+            del data["vectors"]
+            data["vectors_encoding"] = {
+                "type": "delta",
+                "step": get_delta_step(self.vectors_precision),
+                "segment_starts": [0] + [i + 1 for i in self.discont_indexes],
+            }
+            data["vectors_delta"] = encode_vectors(
+                self.eigenvectors,
+                data["vectors_encoding"]["segment_starts"],
+                self.vectors_precision,
+            )
+        if self.group_velocities is not None:
+            # group velocities (km/s), shape (nqpoints, nphonons, 3)
+            data["group_velocities"] = self.group_velocities
 
         return json.dumps(data, cls=JsonEncoder, indent=2)
 
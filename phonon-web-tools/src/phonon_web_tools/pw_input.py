@@ -0,0 +1,295 @@
+"""Fast parser of the crystal structure in a Quantum ESPRESSO pw.x input file"""
+
+import re
+
+import numpy as np
+
+# Value from qe_tools
+bohr_in_angstrom = 0.52917720859
+
+card_names = (
+    "ATOMIC_SPECIES",
+    "ATOMIC_POSITIONS",
+    "K_POINTS",
+    "CELL_PARAMETERS",
+    "OCCUPATIONS",
+    "CONSTRAINTS",
+    "ATOMIC_VELOCITIES",
+    "ATOMIC_FORCES",
+    "ADDITIONAL_K_POINTS",
+    "SOLVENTS",
+    "HUBBARD",
+)
+
+namelist_value_regex = re.compile(
+    r"""(?P<key>[a-z_][a-z0-9_]*(?:\(\s*\d+\s*\))?)\s*=\s*
+    (?P<value>'[^']*'|"[^"]*"|[^\s,/]+)""",
+    re.IGNORECASE | re.VERBOSE,
+)
+
+
+def fortran_float(value):
+    """
+    Convert a Fortran number (possibly with a d/D exponent) to float.
+    """
+    return float(value.replace("d", "e").replace("D", "E"))
+
+
+def strip_comment(line):
+    """
+    Remove the comment (starting with ! or #) from a line.
+    """
+    for char in "!#":
+        line = line.partition(char)[0]
+    return line
+
+
+def parse_system_namelist(lines):
+    """
+    Parse the &SYSTEM namelist, returning a dictionary with lower-case keys
+    (without spaces, e.g. "celldm(1)") and the values as strings.
+    """
+    system = {}
+    in_system = False
+    for line in lines:
+        stripped = line.strip()
+        if stripped.lower().startswith("&system"):
+            in_system = True
+            stripped = stripped[len("&system") :]
+        elif not in_system:
+            continue
+        if stripped.startswith("/"):
+            break
+        for match in namelist_value_regex.finditer(stripped):
+            key = re.sub(r"\s+", "", match.group("key")).lower()
+            system[key] = match.group("value").strip("'\"")
+    if not system:
+        raise ValueError("The &SYSTEM namelist was not found in the pw.x input file")
+    return system
+
+
+def find_card(lines, card_name):
+    """
+    Find a card in the input file.
+
+    :return: (index of the first line after the card header, units in lower case or
+        None), or (None, None) if the card is not present.
+    """
+    regex = re.compile(
+        r"^\s*" + card_name + r"\s*[{(]?\s*(?P<units>[a-z_]*)\s*[)}]?\s*$",
+        re.IGNORECASE,
+    )
+    for index, line in enumerate(lines):
+        match = regex.match(strip_comment(line))
+        if match:
+            return index + 1, match.group("units").lower() or None
+    return None, None
+
+
+def get_card_lines(lines, start, count=None):
+    """
+    Return the non-empty, non-comment lines of a card, starting from line `start`.
+
+    If count is None, stop at the first empty line or at the next card,
+    otherwise return exactly `count` lines.
+    """
+    card_lines = []
+    for line in lines[start:]:
+        stripped = strip_comment(line).strip()
+        if not stripped:
+            if count is None and card_lines:
+                break
+            continue
+        if stripped.split()[0].upper() in card_names or stripped.startswith("&"):
+            break
+        card_lines.append(stripped)
+        if count is not None and len(card_lines) == count:
+            break
+    if count is not None and len(card_lines) != count:
+        raise ValueError(
+            "Expected {} lines in a card of the pw.x input file, found {}".format(
+                count, len(card_lines)
+            )
+        )
+    return card_lines
+
+
+def parse_columns(card_lines, first_column, n_columns=3):
+    """
+    Parse n_columns numbers starting from first_column, for all the lines at once.
+
+    :return: numpy array of shape (len(card_lines), n_columns)
+    """
+    values = " ".join(
+        " ".join(line.split()[first_column : first_column + n_columns])
+        for line in card_lines
+    )
+    values = values.replace("d", "e").replace("D", "E").split()
+    if len(values) != n_columns * len(card_lines):
+        raise ValueError("Unable to parse a card of the pw.x input file")
+    return np.array(values, dtype=float).reshape(len(card_lines), n_columns)
+
+
+def get_alat(system):
+    """
+    Return alat in angstrom (from celldm(1) or A), or None if not specified.
+    """
+    if "a" in system and "celldm(1)" in system:
+        raise ValueError("Both a and celldm(1) specified in the pw.x input file")
+    if "celldm(1)" in system:
+        return fortran_float(system["celldm(1)"]) * bohr_in_angstrom
+    if "a" in system:
+        return fortran_float(system["a"])
+    return None
+
+
+def get_cell_from_ibrav(ibrav, system, alat):
+    """
+    Return the cell (in angstrom) for the most common Bravais lattices (ibrav != 0),
+    with the same conventions as pw.x.
+    """
+    if alat is None:
+        raise ValueError("You have to define celldm(1) or A when ibrav != 0")
+    using_celldm = "celldm(1)" in system
+
+    def get_param(celldm_index, key, is_length):
+        try:
+            if using_celldm:
+                value = fortran_float(system["celldm({})".format(celldm_index)])
+                return alat * value if is_length else value
+            return fortran_float(system[key])
+        except KeyError as exc:
+            raise ValueError(
+                "Missing {} in the pw.x input file, needed for ibrav = {}".format(
+                    exc, ibrav
+                )
+            )
+
+    a = alat
+    if ibrav == 1:
+        return np.diag([a, a, a])
+    if ibrav == 2:
+        return 0.5 * a * np.array([[-1.0, 0.0, 1.0], [0.0, 1.0, 1.0], [-1.0, 1.0, 0.0]])
+    if ibrav == 3:
+        return (
+            0.5 * a * np.array([[1.0, 1.0, 1.0], [-1.0, 1.0, 1.0], [-1.0, -1.0, 1.0]])
+        )
+    if ibrav == -3:
+        return (
+            0.5 * a * np.array([[-1.0, 1.0, 1.0], [1.0, -1.0, 1.0], [1.0, 1.0, -1.0]])
+        )
+    if ibrav in (5, -5):
+        cosa = get_param(4, "cosab", is_length=False)
+        tx = np.sqrt((1.0 - cosa) / 2.0)
+        ty = np.sqrt((1.0 - cosa) / 6.0)
+        tz = np.sqrt((1.0 + 2.0 * cosa) / 3.0)
+        if ibrav == 5:
+            return a * np.array([[tx, -ty, tz], [0.0, 2 * ty, tz], [-tx, -ty, tz]])
+        u = tz - 2.0 * np.sqrt(2.0) * ty
+        v = tz + np.sqrt(2.0) * ty
+        return a / np.sqrt(3.0) * np.array([[u, v, v], [v, u, v], [v, v, u]])
+
+    c = get_param(3, "c", is_length=True)
+    if ibrav == 4:
+        return np.array(
+            [[a, 0.0, 0.0], [-0.5 * a, 0.5 * np.sqrt(3.0) * a, 0.0], [0.0, 0.0, c]]
+        )
+    if ibrav == 6:
+        return np.diag([a, a, c])
+    if ibrav == 7:
+        return 0.5 * np.array([[a, -a, c], [a, a, c], [-a, -a, c]])
+
+    b = get_param(2, "b", is_length=True)
+    if ibrav == 8:
+        return np.diag([a, b, c])
+    if ibrav == 9:
+        return np.array([[0.5 * a, 0.5 * b, 0.0], [-0.5 * a, 0.5 * b, 0.0], [0, 0, c]])
+    if ibrav == -9:
+        return np.array([[0.5 * a, -0.5 * b, 0.0], [0.5 * a, 0.5 * b, 0.0], [0, 0, c]])
+    if ibrav == 10:
+        return 0.5 * np.array([[a, 0.0, c], [a, b, 0.0], [0.0, b, c]])
+    if ibrav == 11:
+        return 0.5 * np.array([[a, b, c], [-a, b, c], [-a, -b, c]])
+
+    raise ValueError(
+        "ibrav = {} is not supported by the fast pw.x parser, "
+        "please use the qe-tools parser".format(ibrav)
+    )
+
+
+def get_cell(lines, system, alat):
+    """
+    Return the cell in angstrom, from CELL_PARAMETERS (ibrav = 0) or from ibrav.
+    """
+    ibrav = int(system.get("ibrav", "0").rstrip("."))
+    if ibrav != 0:
+        return get_cell_from_ibrav(ibrav, system, alat)
+
+    start, units = find_card(lines, "CELL_PARAMETERS")
+    if start is None:
+        raise ValueError("CELL_PARAMETERS card not found in the pw.x input (ibrav = 0)")
+    cell = parse_columns(get_card_lines(lines, start, count=3), 0)
+    if units == "angstrom":
+        return cell
+    if units == "bohr" or (units is None and alat is None):
+        return cell * bohr_in_angstrom
+    if units in ("alat", None):
+        if alat is None:
+            raise ValueError("CELL_PARAMETERS in units of alat, but alat not given")
+        return cell * alat
+    raise ValueError("Unknown units for CELL_PARAMETERS: {}".format(units))
+
+
+def parse_pw_input(text):
+    """
+    Parse the crystal structure from the text of a pw.x input file.
+
+    The positions are parsed in bulk into numpy arrays, so this is much faster than
+    qe-tools for large cells. Only the &SYSTEM namelist and the CELL_PARAMETERS,
+    ATOMIC_SPECIES and ATOMIC_POSITIONS cards are parsed.
+
+    :return: a dictionary with "cell" (3x3 array in angstrom), "positions"
+        (cartesian, in angstrom), "atom_names" (name of the species of each atom) and
+        "species" (dictionary with the "names" and "pseudo_file_names" of the species)
+    """
+    lines = text.splitlines()
+    system = parse_system_namelist(lines)
+    alat = get_alat(system)
+    cell = get_cell(lines, system, alat)
+
+    start, _ = find_card(lines, "ATOMIC_SPECIES")
+    if start is None:
+        raise ValueError("ATOMIC_SPECIES card not found in the pw.x input file")
+    species_lines = [line.split() for line in get_card_lines(lines, start)]
+    species = {
+        "names": [tokens[0] for tokens in species_lines],
+        "pseudo_file_names": [tokens[2] for tokens in species_lines],
+    }
+
+    start, units = find_card(lines, "ATOMIC_POSITIONS")
+    if start is None:
+        raise ValueError("ATOMIC_POSITIONS card not found in the pw.x input file")
+    nat = int(system["nat"]) if "nat" in system else None
+    position_lines = get_card_lines(lines, start, count=nat)
+    atom_names = [line.split(None, 1)[0] for line in position_lines]
+    positions = parse_columns(position_lines, 1)
+
+    if units == "angstrom":
+        pass
+    elif units == "bohr":
+        positions = positions * bohr_in_angstrom
+    elif units == "crystal":
+        positions = positions @ cell
+    elif units == "alat":
+        positions = positions * (np.linalg.norm(cell[0]) if alat is None else alat)
+    elif units is None:
+        raise ValueError("No units specified for ATOMIC_POSITIONS")
+    else:
+        raise ValueError("Unsupported units for ATOMIC_POSITIONS: {}".format(units))
+
+    return {
+        "cell": cell,
+        "positions": positions,
+        "atom_names": atom_names,
+        "species": species,
+    }
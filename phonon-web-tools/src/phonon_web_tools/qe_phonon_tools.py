@@ -3,16 +3,34 @@
 
 """Read phonon dispersion from quantum espresso"""
 
+import json
+import mmap
+import os
 import re
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
 
-import ase.io
 import numpy as np
-import qe_tools
-from pymatgen.io.cif import CifParser as PMGCifParser
 
+from .force_constants import (
+    add_group_velocities,
+    get_path_directions,
+    load_interpolator,
+)
 from .lattice import car_red, rec_lat
 from .phonon_web import PhononWebConverter
-from .utils import chem_symbol_to_number, normalize_numbers
+from .pw_input import parse_pw_input
+from .qpath import default_symprec, get_seekpath_qpath
+from .thermodynamics import get_mesh_thermodynamics
+from .utils import (
+    DecompressedTextIO,
+    JsonEncoder,
+    chem_symbol_to_number,
+    normalize_numbers,
+    open_decompressed,
+    open_text,
+)
 
 # Value from qe_tools
 bohr_in_angstrom = 0.52917720859
@@ -73,109 +91,388 @@ def tuple_from_pymatgen(pmgstructure):
     return structure_tuple
 
 
-def get_structure_tuple(  # pylint: disable=too-many-locals
-    fileobject, fileformat, extra_data=None
-):
+# Registry of the structure readers, mapping each `fileformat` string accepted
+# by `get_structure_tuple` to a function `reader(fileobject, fileformat, extra_data)`.
+# The heavy backends (ASE, pymatgen, qe-tools) are imported inside the readers,
+# so that they are only loaded the first time a format that needs them is used.
+structure_readers = {}
+
+
+def register_structure_reader(*fileformats):
+    """
+    Decorator to register a function as the structure reader for the given formats.
+    """
+
+    def decorator(reader):
+        for fileformat in fileformats:
+            structure_readers[fileformat] = reader
+        return reader
+
+    return decorator
+
+
+ase_fileformats = {
+    "vasp-ase": "vasp",
+    "xsf-ase": "xsf",
+    "castep-ase": "castep-cell",
+    "pdb-ase": "proteindatabank",
+    "xyz-ase": "xyz",
+    "cif-ase": "cif",  # currently broken in ASE: https://gitlab.com/ase/ase/issues/15
+}
+
+
+@register_structure_reader(*ase_fileformats)
+def read_structure_ase(fileobject, fileformat, extra_data=None):
+    """
+    Read a structure with ASE, see `get_structure_tuple`.
+    """
+    import ase.io
+
+    asestructure = ase.io.read(fileobject, format=ase_fileformats[fileformat])
+
+    if fileformat == "xyz-ase":
+        # XYZ does not contain cell information, add them back from the
+        # additional form data (note that at the moment we are not using the
+        # extended XYZ format)
+        if extra_data is None:
+            raise ValueError(
+                "Please pass also the extra_data with the cell information if you want to use the xyz format"
+            )
+        # avoid generator expressions by explicitly requesting tuple/list
+        cell = list(
+            tuple(float(extra_data["xyzCellVec" + v + a]) for a in "xyz") for v in "ABC"
+        )
+
+        asestructure.set_cell(cell)
+
+    return tuple_from_ase(asestructure)
+
+
+@register_structure_reader("cif-pymatgen")
+def read_structure_pymatgen(fileobject, fileformat, extra_data=None):
+    """
+    Read a structure with pymatgen, see `get_structure_tuple`.
+    """
+    from pymatgen.io.cif import CifParser as PMGCifParser
+
+    # Only get the first structure, if more than one
+    pmgstructure = PMGCifParser(fileobject).get_structures()[0]
+    return tuple_from_pymatgen(pmgstructure)
+
+
+def get_atomic_number_from_species(name, pseudo_name):
+    """
+    Heuristics to get the atomic number of a species of a pw.x input file, from its
+    name (e.g. "Si1") and from the name of its pseudopotential file.
+    """
+    # Take only characters, take only up to two characters
+    chemical_name = "".join(char for char in name if char.isalpha())[:2].capitalize()
+    number_from_name = chem_symbol_to_number.get(chemical_name, None)
+    # Infer chemical element from element
+    name_from_pseudo = pseudo_name
+    for sep in ["-", ".", "_"]:
+        name_from_pseudo = name_from_pseudo.partition(sep)[0]
+    name_from_pseudo = name_from_pseudo.capitalize()
+    number_from_pseudo = chem_symbol_to_number.get(name_from_pseudo, None)
+
+    if number_from_name is None and number_from_pseudo is None:
+        raise KeyError(
+            "Unable to parse the chemical element either from the atom name or for the pseudo name"
+        )
+    # I make number_from_pseudo prioritary if both are parsed,
+    # even if they are different
+    if number_from_pseudo is not None:
+        return number_from_pseudo
+
+    # If we are here, number_from_pseudo is None and number_from_name is not
+    return number_from_name
+
+
+def get_species_numbers(species):
+    """
+    Return a dictionary with the atomic number of each species name.
+
+    :param species: dictionary with the "names" and "pseudo_file_names" of the species
+    """
+    return {
+        name: get_atomic_number_from_species(name, pseudo_name)
+        for name, pseudo_name in zip(species["names"], species["pseudo_file_names"])
+    }
+
+
+@register_structure_reader("qeinp-qetools")
+def read_structure_qetools(fileobject, fileformat, extra_data=None):
+    """
+    Read a pw.x input file with qe-tools, see `get_structure_tuple`.
+    """
+    import qe_tools
+
+    if fileobject.seekable():
+        fileobject.seek(0)
+    pwfile = qe_tools.parsers.PwInputFile(
+        fileobject.read(), validate_species_names=True
+    )
+    pwparsed = pwfile.structure
+
+    cell = pwparsed["cell"]
+    rel_position = np.dot(pwparsed["positions"], np.linalg.inv(cell)).tolist()
+
+    # The chemical element is resolved once per species. Note that the old conversion
+    # (directly from the atom names) did not work for multiple species
+    # for the same chemical element, e.g. Si1 and Si2
+    species_numbers = get_species_numbers(pwparsed["species"])
+    numbers = [species_numbers[name] for name in pwparsed["atom_names"]]
+
+    structure_tuple = (cell, rel_position, numbers)
+    return structure_tuple
+
+
+@register_structure_reader("qeinp-fast")
+def read_structure_pw_fast(fileobject, fileformat, extra_data=None):
+    """
+    Read a pw.x input file with the fast numpy parser of `pw_input`, see
+    `get_structure_tuple`. Gives the same results as "qeinp-qetools" (for the
+    supported ibrav values), but is much faster for large cells.
+    """
+    if fileobject.seekable():
+        fileobject.seek(0)
+    pwparsed = parse_pw_input(fileobject.read())
+
+    cell = pwparsed["cell"]
+    rel_position = np.dot(pwparsed["positions"], np.linalg.inv(cell))
+
+    species_numbers = get_species_numbers(pwparsed["species"])
+    names, species_index = np.unique(pwparsed["atom_names"], return_inverse=True)
+    try:
+        numbers = np.array([species_numbers[name] for name in names])[species_index]
+    except KeyError as exc:
+        raise ValueError(
+            "Atom with species {} not defined in ATOMIC_SPECIES".format(exc)
+        )
+
+    structure_tuple = (cell.tolist(), rel_position.tolist(), numbers.tolist())
+    return structure_tuple
+
+
+def get_structure_tuple(fileobject, fileformat, extra_data=None):
     """
     Given a file-like object (using StringIO or open()), and a string
     identifying the file format, return a structure tuple as accepted
     by seekpath.
 
-    :param fileobject: a file-like object containing the file content
-    :param fileformat: a string with the format to use to parse the data
+    :param fileobject: a file-like object containing the file content (possibly
+        compressed, see `open_decompressed`)
+    :param fileformat: a string with the format to use to parse the data,
+        one of the keys of `structure_readers`
 
     :return: a structure tuple (cell, positions, numbers) as accepted
         by seekpath.
     """
-    ase_fileformats = {
-        "vasp-ase": "vasp",
-        "xsf-ase": "xsf",
-        "castep-ase": "castep-cell",
-        "pdb-ase": "proteindatabank",
-        "xyz-ase": "xyz",
-        "cif-ase": "cif",  # currently broken in ASE: https://gitlab.com/ase/ase/issues/15
-    }
-    if fileformat in ase_fileformats.keys():
-        asestructure = ase.io.read(fileobject, format=ase_fileformats[fileformat])
-
-        if fileformat == "xyz-ase":
-            # XYZ does not contain cell information, add them back from the
-            # additional form data (note that at the moment we are not using the
-            # extended XYZ format)
-            if extra_data is None:
-                raise ValueError(
-                    "Please pass also the extra_data with the cell information if you want to use the xyz format"
-                )
-            # avoid generator expressions by explicitly requesting tuple/list
-            cell = list(
-                tuple(float(extra_data["xyzCellVec" + v + a]) for a in "xyz")
-                for v in "ABC"
-            )
+    if fileformat not in structure_readers:
+        raise UnknownFormatError(fileformat)
+    fileobject = open_decompressed(fileobject)
+    return structure_readers[fileformat](fileobject, fileformat, extra_data)
 
-            asestructure.set_cell(cell)
 
-        return tuple_from_ase(asestructure)
-    if fileformat == "cif-pymatgen":
-        # Only get the first structure, if more than one
-        pmgstructure = PMGCifParser(fileobject).get_structures()[0]
-        return tuple_from_pymatgen(pmgstructure)
-    if fileformat == "qeinp-qetools":
-        fileobject.seek(0)
-        pwfile = qe_tools.parsers.PwInputFile(
-            fileobject.read(), validate_species_names=True
-        )
-        pwparsed = pwfile.structure
+# A (possibly signed, possibly exponential) floating-point number
+float_regex = r"[+-]?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?"
+freq_regex = re.compile(r"=\s+(" + float_regex + ")")
 
-        cell = pwparsed["cell"]
-        rel_position = np.dot(pwparsed["positions"], np.linalg.inv(cell)).tolist()
+# Below this number of lines per worker, the process pool costs more than it saves
+# and matdyn.modes is parsed serially
+matdyn_parallel_min_lines = 50000
+# Number of lines parsed at once when streaming a compressed matdyn.modes file
+matdyn_stream_chunk_lines = 100000
 
-        species_dict = dict(
-            zip(pwparsed["species"]["names"], pwparsed["species"]["pseudo_file_names"])
+
+def get_matdyn_block_length(natoms):
+    """
+    Number of lines of the block of each q-point in a matdyn.modes file.
+
+    Each block has the line with the q-point, a separator, then for each mode one line with
+    the frequency and one line per atom with the eigenvector, then a separator and two more
+    lines that precede the next q-point.
+    """
+    nphons = 3 * natoms
+    return (natoms + 1) * nphons + 5
+
+
+def parse_matdyn_blocks(lines, natoms, eig, vec, qpt):
+    """
+    Parse consecutive q-point blocks of a matdyn.modes file into preallocated arrays.
+
+    :param lines: list of lines, starting with the "q = " line of the first block
+    :param natoms: number of atoms
+    :param eig: array of shape (nq, nphons) filled with the frequencies
+    :param vec: complex array of shape (nq, nphons, natoms, 3) filled with the
+        eigenvectors, or None to skip the eigenvector lines
+    :param qpt: array of shape (nq, 3) filled with the q-points (as in the file)
+    """
+    nphons = 3 * natoms
+    nqpoints = len(qpt)
+    q_idx = np.arange(nqpoints) * get_matdyn_block_length(natoms)
+    eig_idx = q_idx[:, None] + 2 + np.arange(nphons) * (natoms + 1)
+    vec_idx = eig_idx[:, :, None] + 1 + np.arange(natoms)
+
+    qpt[:] = [list(map(float, lines[i].split()[2:])) for i in q_idx]
+    eig[:] = np.reshape(
+        [float(freq_regex.findall(lines[i])[1]) for i in eig_idx.flat], eig.shape
+    )
+    if vec is None:
+        return
+    # Parse all the eigenvector lines at once, each line has 6 numbers
+    # (real and imaginary part of the x, y, z components)
+    values = re.findall(float_regex, "".join(lines[i] for i in vec_idx.flat))
+    if len(values) != 6 * vec_idx.size:
+        raise ValueError(
+            "Unexpected format of the eigenvectors in the matdyn.modes file"
         )
+    vec[:] = np.array(list(map(float, values))).view(complex).reshape(vec.shape)
 
-        numbers = []
-        # Heuristics to get the chemical element
-        for name in pwparsed["atom_names"]:
-            # Take only characters, take only up to two characters
-            chemical_name = "".join(char for char in name if char.isalpha())[
-                :2
-            ].capitalize()
-            number_from_name = chem_symbol_to_number.get(chemical_name, None)
-            # Infer chemical element from element
-            pseudo_name = species_dict[name]
-            name_from_pseudo = pseudo_name
-            for sep in ["-", ".", "_"]:
-                name_from_pseudo = name_from_pseudo.partition(sep)[0]
-            name_from_pseudo = name_from_pseudo.capitalize()
-            number_from_pseudo = chem_symbol_to_number.get(name_from_pseudo, None)
-
-            if number_from_name is None and number_from_pseudo is None:
-                raise KeyError(
-                    "Unable to parse the chemical element either from the atom name or for the pseudo name"
-                )
-            # I make number_from_pseudo prioritary if both are parsed,
-            # even if they are different
-            if number_from_pseudo is not None:
-                numbers.append(number_from_pseudo)
-                continue
 
-            # If we are here, number_from_pseudo is None and number_from_name is not
-            numbers.append(number_from_name)
-            continue
+def parse_matdyn_chunk(path, byte_start, byte_end, natoms, k_start, k_end, out_files):
+    """
+    Worker function of `read_matdyn_parallel`: parse the q-points k_start:k_end, stored
+    in the given byte range of the file, into the shared output arrays.
+    """
+    with open(path, "rb") as f:
+        f.seek(byte_start)
+        lines = f.read(byte_end - byte_start).decode().split("\n")
+    eig, vec, qpt = (
+        None if fname is None else np.memmap(fname, dtype=dtype, mode="r+", shape=shape)
+        for fname, dtype, shape in out_files
+    )
+    parse_matdyn_blocks(
+        lines,
+        natoms,
+        eig[k_start:k_end],
+        None if vec is None else vec[k_start:k_end],
+        qpt[k_start:k_end],
+    )
+    for arr in (eig, vec, qpt):
+        if arr is not None:
+            arr.flush()
 
-        # Old conversion. This does not work for multiple species
-        # for the same chemical element, e.g. Si1 and Si2
-        # numbers = [atoms_num_dict[sym] for sym in pwparsed['atom_names']]
 
-        structure_tuple = (cell, rel_position, numbers)
-        return structure_tuple
+def create_shared_array(shape, dtype):
+    """
+    Create an array backed by a temporary file in shared memory (/dev/shm if available),
+    so that worker processes can fill it in place.
 
-    raise UnknownFormatError(fileformat)
+    :return: the file name and the array
+    """
+    shm_dir = "/dev/shm" if os.path.isdir("/dev/shm") else None
+    fd, fname = tempfile.mkstemp(prefix="phonon_web_tools_", dir=shm_dir)
+    os.close(fd)
+    return fname, np.memmap(fname, dtype=dtype, mode="w+", shape=shape)
 
 
-def read_and_process_matdyn(file_obj, natoms, alat, rec):
+def read_matdyn_parallel(file_obj, natoms, n_workers, eigenvectors=True):
     """
-    Function to read the eigenvalues and eigenvectors from Quantum ESPRESSO
+    Read the eigenvalues and eigenvectors from a matdyn.modes file with a pool of processes.
+
+    The blocks of the q-points have a fixed number of lines, so after indexing the
+    line offsets (a single scan of the memory-mapped file) the file is split into byte
+    ranges of whole q-points, parsed by the workers directly into shared-memory arrays.
+
+    :return: (eig, vec, qpt) as in `read_matdyn_serial`, or None if the file cannot be
+        parsed in parallel (not a file on disk, too small, or unexpected layout) and the
+        serial path should be used instead.
+    """
+    path = getattr(file_obj, "name", None)
+    if not isinstance(path, (str, os.PathLike)) or not os.path.isfile(path):
+        return None
+    if os.path.getsize(path) == 0:
+        return None
+
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        buffer = np.frombuffer(mm, dtype=np.uint8)
+        line_starts = np.concatenate(([0], np.flatnonzero(buffer == ord("\n")) + 1))
+        del buffer  # release the export, otherwise the mmap cannot be closed
+        file_size = len(mm)
+        if line_starts[-1] == file_size:
+            line_starts = line_starts[:-1]
+        nlines = len(line_starts)
+
+        def get_line(i):
+            if i >= nlines:
+                return b""
+            end = line_starts[i + 1] if i + 1 < nlines else file_size
+            return mm[line_starts[i] : end].strip()
+
+        nphons = 3 * natoms
+        stride = get_matdyn_block_length(natoms)
+        nqpoints = nlines // stride
+        # Check the layout, otherwise let the serial path report the error
+        if (
+            nqpoints == 0
+            or not get_line(2 + (nqpoints - 1) * stride).startswith(b"q =")
+            or get_line(2 + nqpoints * stride).startswith(b"q =")
+            or not get_line(2 + stride - 3).startswith(b"*")
+        ):
+            return None
+
+    n_workers = min(n_workers, nqpoints, nlines // matdyn_parallel_min_lines)
+    if n_workers <= 1:
+        return None
+
+    shapes = [
+        ((nqpoints, nphons), float),
+        ((nqpoints, nphons, natoms, 3), complex),
+        ((nqpoints, 3), float),
+    ]
+    out_files = []
+    arrays = []
+    try:
+        for shape, dtype in shapes:
+            if dtype is complex and not eigenvectors:
+                out_files.append((None, dtype, shape))
+                arrays.append(None)
+                continue
+            fname, arr = create_shared_array(shape, dtype)
+            out_files.append((fname, dtype, shape))
+            arrays.append(arr)
+
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            futures = []
+            for k_range in np.array_split(np.arange(nqpoints), n_workers):
+                k_start, k_end = int(k_range[0]), int(k_range[-1]) + 1
+                byte_start = int(line_starts[2 + k_start * stride])
+                end_line = 2 + k_end * stride
+                byte_end = (
+                    int(line_starts[end_line]) if end_line < nlines else file_size
+                )
+                futures.append(
+                    executor.submit(
+                        parse_matdyn_chunk,
+                        path,
+                        byte_start,
+                        byte_end,
+                        natoms,
+                        k_start,
+                        k_end,
+                        out_files,
+                    )
+                )
+            for future in futures:
+                future.result()
+    finally:
+        # The arrays stay valid after removing the files, they are freed with the arrays
+        for fname, _, _ in out_files:
+            if fname is not None:
+                os.unlink(fname)
+
+    return tuple(arrays)
+
+
+def read_matdyn_serial(file_obj, natoms, eigenvectors=True):
+    """
+    Read the eigenvalues and eigenvectors from a matdyn.modes file.
+
+    :param eigenvectors: if False, the eigenvector lines are skipped and vec is None
+
+    :return: (eig, vec, qpt), the frequencies with shape (nq, nphons), the complex
+        eigenvectors with shape (nq, nphons, natoms, 3) and the q-points (in units of 2pi/alat)
     """
     file_list = file_obj.readlines()
     file_str = "".join(file_list)
@@ -201,33 +498,152 @@ def read_and_process_matdyn(file_obj, natoms, alat, rec):
     nqpoints = len(re.findall("q = ", file_str))
 
     eig = np.zeros([nqpoints, nphons])
-    vec = np.zeros([nqpoints, nphons, atoms, 3], dtype=complex)
+    vec = None
+    if eigenvectors:
+        vec = np.zeros([nqpoints, nphons, atoms, 3], dtype=complex)
     qpt = np.zeros([nqpoints, 3])
-    for k in range(nqpoints):
-        # iterate over qpoints
-        k_idx = 2 + k * ((atoms + 1) * nphons + 5)
-        # read qpoint
-        qpt[k] = list(map(float, file_list[k_idx].split()[2:]))
-        for n in range(nphons):
-            # read eigenvalues
-            eig_idx = k_idx + 2 + n * (atoms + 1)
-            reig = re.findall(
-                r"=\s+([+-]?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?)", file_list[eig_idx]
-            )[1]
-            eig[k][n] = float(reig)
-            for i in range(atoms):
-                # read eigenvectors
-                svec = re.findall(
-                    r"([+-]?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?)",
-                    file_list[eig_idx + 1 + i],
+    parse_matdyn_blocks(file_list[2:], atoms, eig, vec, qpt)
+    return eig, vec, qpt
+
+
+def read_matdyn_stream(file_obj, natoms, eigenvectors=True):
+    """
+    Read a matdyn.modes file incrementally, a chunk of q-points at a time, so that
+    only one chunk of lines is in memory besides the parsed arrays (used for the
+    compressed files, decompressed while they are read).
+
+    :return: (eig, vec, qpt) as in `read_matdyn_serial`
+    """
+    nphons = 3 * natoms
+    stride = get_matdyn_block_length(natoms)
+    chunk_qpoints = max(1, matdyn_stream_chunk_lines // stride)
+    lines = iter(file_obj)
+    list(islice(lines, 2))  # header
+
+    chunks = []
+    while True:
+        chunk = list(islice(lines, chunk_qpoints * stride))
+        # the last block has no lines after its final separator
+        nqpoints = (len(chunk) + 2) // stride
+        for start in range(0, nqpoints * stride, stride):
+            qline, separator = chunk[start].strip(), chunk[start + stride - 3].strip()
+            if not qline.startswith("q =") or not separator.startswith("*"):
+                raise ValueError(
+                    "Unexpected format of the matdyn.modes file, or the number of "
+                    f"atoms in the SCF input file ({natoms}) is not the same as in "
+                    "the matdyn.modes file"
                 )
-                z = list(map(float, svec))
-                cvec = [
-                    complex(z[0], z[1]),
-                    complex(z[2], z[3]),
-                    complex(z[4], z[5]),
-                ]
-                vec[k][n][i] = np.array(cvec, dtype=complex)
+        if nqpoints:
+            eig = np.zeros([nqpoints, nphons])
+            vec = None
+            if eigenvectors:
+                vec = np.zeros([nqpoints, nphons, natoms, 3], dtype=complex)
+            qpt = np.zeros([nqpoints, 3])
+            parse_matdyn_blocks(chunk, natoms, eig, vec, qpt)
+            chunks.append((eig, vec, qpt))
+        if len(chunk) < chunk_qpoints * stride:
+            break
+
+    if not chunks:
+        raise ValueError(
+            "Unable to find the lines with the frequencies in the matdyn.modes file. "
+            "Please check that you uploaded the correct file!"
+        )
+    return tuple(
+        None if chunks[0][i] is None else np.concatenate([c[i] for c in chunks])
+        for i in range(3)
+    )
+
+
+def read_matdyn(file_obj, natoms, n_workers=1, eigenvectors=True):
+    """
+    Read the eigenvalues, eigenvectors and q-points (in units of 2pi/alat) from a
+    matdyn.modes file, in parallel if n_workers > 1 and the file is large enough.
+    Compressed files are decompressed and parsed incrementally.
+
+    :param eigenvectors: if False, only the eigenvalues and q-points are parsed, and
+        the returned eigenvectors are None
+    """
+    file_obj = open_decompressed(file_obj)
+    if isinstance(file_obj, DecompressedTextIO):
+        return read_matdyn_stream(file_obj, natoms, eigenvectors)
+    data = None
+    if n_workers > 1:
+        data = read_matdyn_parallel(file_obj, natoms, n_workers, eigenvectors)
+    if data is None:
+        data = read_matdyn_serial(file_obj, natoms, eigenvectors)
+    return data
+
+
+def read_matdyn_path(path, natoms, eigenvectors=True):
+    """
+    Worker function of `read_and_process_matdyn_segments`: read a matdyn.modes file
+    given its path.
+    """
+    with open_text(path) as f:
+        return read_matdyn(f, natoms, eigenvectors=eigenvectors)
+
+
+def merge_matdyn_segments(segments, highsym_qpts=None, tol=1e-5):
+    """
+    Stitch the data of consecutive segments of a q-path along the q axis.
+
+    When a segment starts at the q-point where the previous one ends, the shared
+    endpoint is kept only once (the copy of the previous segment), so that the band
+    connection continues across the boundary. Otherwise the boundary is a
+    discontinuity of the path.
+
+    :param segments: list of (eig, vec, qpt) tuples, as returned by `read_matdyn`
+    :param highsym_qpts: None, or a list with, for each segment, None or the list of
+        (index, label) with the indexes relative to that segment
+    :param tol: tolerance to detect the shared endpoints (in units of 2pi/alat)
+
+    :return: the merged (eig, vec, qpt) and the high-symmetry q-points with the indexes
+        relative to the merged path (None if highsym_qpts is None)
+    """
+    if highsym_qpts is not None and len(highsym_qpts) != len(segments):
+        raise ValueError(
+            "Got {} lists of high-symmetry q-points for {} matdyn segments".format(
+                len(highsym_qpts), len(segments)
+            )
+        )
+
+    keep = []
+    merged_highsym_qpts = []
+    labelled = set()
+    offset = 0
+    for i_seg, (eig, vec, qpt) in enumerate(segments):
+        start = 0
+        if i_seg > 0 and np.allclose(qpt[0], segments[i_seg - 1][2][-1], atol=tol):
+            start = 1
+        keep.append(slice(start, None))
+        if highsym_qpts is not None and highsym_qpts[i_seg] is not None:
+            for index, label in highsym_qpts[i_seg]:
+                merged_index = offset + index - start
+                # The shared endpoint is labelled by the previous segment already
+                if merged_index not in labelled:
+                    labelled.add(merged_index)
+                    merged_highsym_qpts.append((merged_index, label))
+        offset += len(qpt) - start
+
+    merged = tuple(
+        (
+            None
+            if any(segment[i] is None for segment in segments)
+            else np.concatenate([segment[i][sl] for segment, sl in zip(segments, keep)])
+        )
+        for i in range(3)
+    )
+    if highsym_qpts is None:
+        return merged, None
+    return merged, sorted(merged_highsym_qpts)
+
+
+def process_matdyn_data(eig, vec, qpt, alat, rec):
+    """
+    Convert the data parsed from matdyn.modes to the format of `PhononWebConverter`.
+    """
+    nphons = eig.shape[1]
 
     # the quantum espresso eigenvectors are already scaled with the atomic masses
     # Note that if the file comes from dynmat.eig they are not scaled with the atomic masses
@@ -240,7 +656,9 @@ def read_and_process_matdyn(file_obj, natoms, alat, rec):
 
     nqpoints = len(qpt)
     eigenvalues = eig  # *eV/hartree_cm1
-    eigenvectors = vec.view(dtype=float).reshape([nqpoints, nphons, nphons, 2])
+    eigenvectors = None  # eigenvalues only
+    if vec is not None:
+        eigenvectors = vec.view(dtype=float).reshape([nqpoints, nphons, nphons, 2])
     qpoints = qpt
 
     # convert from cartesian coordinates (units of 2pi/alat, alat is the alat of the code)
@@ -260,11 +678,81 @@ def read_and_process_matdyn(file_obj, natoms, alat, rec):
     }
 
 
-def read_and_process_scf_in(file_obj):
+def read_and_process_matdyn(
+    file_obj, natoms, alat, rec, n_workers=1, eigenvectors=True
+):
+    """
+    Function to read the eigenvalues and eigenvectors from Quantum ESPRESSO
+
+    :param n_workers: number of processes used to parse the file. Small files
+        (or file-like objects not on disk) are always parsed serially.
+    :param eigenvectors: if False, the eigenvectors are not parsed (they are None)
+    """
+    eig, vec, qpt = read_matdyn(
+        file_obj, natoms, n_workers=n_workers, eigenvectors=eigenvectors
+    )
+    return process_matdyn_data(eig, vec, qpt, alat, rec)
+
+
+def read_matdyn_segments(file_objs, natoms, n_workers=1, eigenvectors=True):
+    """
+    Read several matdyn.modes files, each computed for a consecutive segment of the
+    q-path.
+
+    :param n_workers: number of processes used to parse the files concurrently
+        (only for files on disk, file-like objects are parsed serially).
+    :param eigenvectors: if False, the eigenvectors are not parsed (vec is None)
+
+    :return: the list of (eig, vec, qpt) of each file, as returned by `read_matdyn`
+    """
+    paths = [getattr(f, "name", None) for f in file_objs]
+    on_disk = all(
+        isinstance(path, (str, os.PathLike)) and os.path.isfile(path) for path in paths
+    )
+    n_workers = min(n_workers, len(file_objs))
+    if n_workers > 1 and on_disk:
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            return list(
+                executor.map(
+                    read_matdyn_path,
+                    paths,
+                    [natoms] * len(paths),
+                    [eigenvectors] * len(paths),
+                )
+            )
+    return [read_matdyn(f, natoms, eigenvectors=eigenvectors) for f in file_objs]
+
+
+def read_and_process_matdyn_segments(
+    file_objs, natoms, alat, rec, highsym_qpts=None, n_workers=1, eigenvectors=True
+):
+    """
+    Read the eigenvalues and eigenvectors from several matdyn.modes files, each
+    computed for a consecutive segment of the q-path, and merge them into a single path
+    (see `merge_matdyn_segments`).
+
+    :param n_workers: number of processes used to parse the files concurrently
+        (only for files on disk, file-like objects are parsed serially).
+    :param eigenvectors: if False, the eigenvectors are not parsed (they are None)
+
+    :return: the same dictionary as `read_and_process_matdyn`, with in addition
+        the merged "highsym_qpts".
+    """
+    segments = read_matdyn_segments(
+        file_objs, natoms, n_workers=n_workers, eigenvectors=eigenvectors
+    )
+    (eig, vec, qpt), merged_highsym_qpts = merge_matdyn_segments(segments, highsym_qpts)
+    data = process_matdyn_data(eig, vec, qpt, alat, rec)
+    data["highsym_qpts"] = merged_highsym_qpts
+    return data
+
+
+def read_and_process_scf_in(file_obj, fileformat="qeinp-qetools"):
     """
     Read the data from a quantum espresso input file
+
+    :param fileformat: the reader to use, "qeinp-qetools" or "qeinp-fast"
     """
-    fileformat = "qeinp-qetools"
     (cell, rel_positions, numbers) = get_structure_tuple(file_obj, fileformat)
 
     pos = rel_positions  # reduced coords
@@ -291,7 +779,7 @@ def read_and_process_scf_out(file_obj, scf_in_data):
     Moreover, it will perform some simple checks (number of atoms, etc.).
     Call this *after* read_atoms().
     """
-    lines = file_obj.readlines()
+    lines = open_decompressed(file_obj).readlines()
     # Get alat
     matching_lines = [
         l for l in lines if "lattice parameter (alat)" in l and "a.u." in l
@@ -365,21 +853,71 @@ def read_and_process_scf_out(file_obj, scf_in_data):
     return {"alat": alat}
 
 
-def convert_qe_phonon_data(
-    scf_in_file, scf_out_file, matdyn_file, highsym_qpts=None, **kwargs
+def interpolate_matdyn_data(
+    interpolator, scf_in_data, scf_out_data, qpath, eigenvectors=True
 ):
     """
-    Load and process all data from QE phonon calculation files
+    Compute the phonons along a q-path from the force constants, in the format of
+    the data read from matdyn.modes.
 
-    kwargs are passed to PhononWebConverter, and allow to set the name, symprec, etc...
+    :param interpolator: a `PhononInterpolator` of the material
+    :param scf_in_data: as returned by `read_and_process_scf_in`
+    :param scf_out_data: as returned by `read_and_process_scf_out`
+    :param qpath: as returned by `get_seekpath_qpath`, for the cell of scf_in_data
+    :param eigenvectors: if False, only the frequencies are computed (vec is None)
+
+    :return: (eig, vec, qpt) as returned by `read_matdyn`
     """
-    scf_in_data = read_and_process_scf_in(scf_in_file)
-    scf_out_data = read_and_process_scf_out(scf_out_file, scf_in_data)
-    matdyn_data = read_and_process_matdyn(
-        matdyn_file,
-        natoms=len(scf_in_data["atom_numbers"]),
-        alat=scf_out_data["alat"],
-        rec=scf_in_data["rec"],
+    qpoints_car = qpath["qpoints"] @ scf_in_data["rec"]
+    # the direction of the path selects the non-analytic term at Gamma, as in matdyn.x
+    directions = get_path_directions(qpoints_car, qpath["discont_indexes"])
+    eig, vec = interpolator.diagonalize(
+        qpoints_car @ np.linalg.inv(interpolator.rec), directions, eigenvectors
+    )
+    # from 1/angstrom to units of 2pi/alat
+    return eig, vec, qpoints_car * scf_out_data["alat"] / (2 * np.pi)
+
+
+def convert_matdyn_data(
+    scf_in_data,
+    scf_out_data,
+    matdyn_raw,
+    highsym_qpts=None,
+    interpolator=None,
+    group_velocities=True,
+    thermodynamics=None,
+    **kwargs,
+):
+    """
+    Process the data read from the matdyn file(s) and convert it with PhononWebConverter.
+
+    :param scf_in_data: as returned by `read_and_process_scf_in`
+    :param scf_out_data: as returned by `read_and_process_scf_out`
+    :param matdyn_raw: (eig, vec, qpt) as returned by `read_matdyn`, or a list of
+        them for the consecutive segments of the q-path (vec is None for the
+        eigenvalues only)
+    :param highsym_qpts: see `convert_qe_phonon_data`
+    :param interpolator: a `PhononInterpolator` of the same material, used to add
+        the group velocities (if group_velocities is True) and the thermodynamic
+        properties to the data
+    :param thermodynamics: None, or a dictionary of parameters of
+        `get_mesh_thermodynamics` (e.g. {} for the defaults) to add the
+        thermodynamic properties computed on a q-point mesh
+
+    :return: the dictionary of the web-friendly data
+    """
+    if isinstance(matdyn_raw, list):
+        # highsym_qpts is either given per segment, or for the merged path
+        per_segment = highsym_qpts is not None and all(
+            not entry or isinstance(entry[0], (list, tuple)) for entry in highsym_qpts
+        )
+        matdyn_raw, merged_highsym_qpts = merge_matdyn_segments(
+            matdyn_raw, highsym_qpts if per_segment else None
+        )
+        if per_segment:
+            highsym_qpts = merged_highsym_qpts
+    matdyn_data = process_matdyn_data(
+        *matdyn_raw, alat=scf_out_data["alat"], rec=scf_in_data["rec"]
     )
 
     phonon_web_converter = PhononWebConverter(
@@ -392,5 +930,103 @@ def convert_qe_phonon_data(
         highsym_qpts=highsym_qpts,
         **kwargs,
     )
+    if interpolator is not None and group_velocities:
+        add_group_velocities(phonon_web_converter, interpolator)
+
+    phonon_data = phonon_web_converter.get_dict()
+    if thermodynamics is not None:
+        if interpolator is None:
+            raise ValueError("The force constants are needed for the thermodynamics")
+        properties = get_mesh_thermodynamics(interpolator, **thermodynamics)
+        phonon_data["thermodynamics"] = json.loads(
+            json.dumps(properties, cls=JsonEncoder)
+        )
+
+    return normalize_numbers(phonon_data)
+
+
+def convert_qe_phonon_data(
+    scf_in_file,
+    scf_out_file,
+    matdyn_file,
+    highsym_qpts=None,
+    n_workers=1,
+    scf_in_format="qeinp-qetools",
+    force_constants_file=None,
+    matdyn_in_file=None,
+    eigenvalues_only=False,
+    qpath_density=None,
+    **kwargs,
+):
+    """
+    Load and process all data from QE phonon calculation files
 
-    return normalize_numbers(phonon_web_converter.get_dict())
+    matdyn_file can also be a list of files, one per consecutive segment of the q-path
+    (e.g. from matdyn runs in parallel), that are merged into a single path. In this case
+    highsym_qpts can be given either for the merged path, or as a list with the
+    high-symmetry q-points of each segment (indexes relative to the segment).
+
+    n_workers is the number of processes used to parse the matdyn file(s).
+    scf_in_format is the reader of the SCF input file ("qeinp-fast" avoids qe-tools).
+    If force_constants_file (the real-space force constants of q2r.x) is given, the
+    group velocities are computed from the force constants and added to the data,
+    with the asr and loto_2d settings of matdyn_in_file (the matdyn.x input) if given
+    (unless group_velocities=False is passed, e.g. to add only the thermodynamics,
+    see `convert_matdyn_data`).
+    If eigenvalues_only is True, the eigenvectors are not parsed and the data has no
+    "vectors": the bands are ordered by continuity of the frequencies instead.
+    If qpath_density is given, the phonons are not read from matdyn_file (that can
+    be None) but interpolated from the force constants, along the q-path generated
+    with seekpath with about qpath_density q-points per 1/angstrom (see
+    `get_seekpath_qpath`, only in the 2D plane if the q-point mesh of the force
+    constants is 2D), and highsym_qpts is replaced by its labels.
+    kwargs are passed to PhononWebConverter, and allow to set the name, symprec, etc...
+    """
+    scf_in_data = read_and_process_scf_in(scf_in_file, fileformat=scf_in_format)
+    scf_out_data = read_and_process_scf_out(scf_out_file, scf_in_data)
+    natoms = len(scf_in_data["atom_numbers"])
+    interpolator = None
+    if force_constants_file is not None:
+        interpolator = load_interpolator(force_constants_file, matdyn_in_file)
+
+    if qpath_density is not None:
+        if interpolator is None:
+            raise ValueError(
+                "The force constants are needed to interpolate the phonons along "
+                "the generated q-path"
+            )
+        qpath = get_seekpath_qpath(
+            scf_in_data["cell"],
+            scf_in_data["pos"],
+            scf_in_data["atom_numbers"],
+            qpath_density,
+            kwargs.get("seekpath_symprec", default_symprec),
+            max_points=np.inf,
+            # force constants on a mesh with a single point along the third direction
+            two_dimensional=interpolator.mesh[2] == 1,
+        )
+        matdyn_raw = interpolate_matdyn_data(
+            interpolator,
+            scf_in_data,
+            scf_out_data,
+            qpath,
+            eigenvectors=not eigenvalues_only,
+        )
+        highsym_qpts = qpath["highsym_qpts"]
+    elif isinstance(matdyn_file, (list, tuple)):
+        matdyn_raw = read_matdyn_segments(
+            matdyn_file, natoms, n_workers=n_workers, eigenvectors=not eigenvalues_only
+        )
+    else:
+        matdyn_raw = read_matdyn(
+            matdyn_file, natoms, n_workers=n_workers, eigenvectors=not eigenvalues_only
+        )
+
+    return convert_matdyn_data(
+        scf_in_data,
+        scf_out_data,
+        matdyn_raw,
+        highsym_qpts=highsym_qpts,
+        interpolator=interpolator,
+        **kwargs,
+    )
@@ -0,0 +1,380 @@
+"""Generate q-paths through the high-symmetry points of the crystal, with a given density"""
+
+import argparse
+import io
+import json
+import re
+from pathlib import Path
+
+import numpy as np
+
+from .lattice import rec_lat
+
+# Default number of q-points per 1/angstrom along the path, and maximum per path
+default_density = 50.0
+max_path_points = 5000
+default_symprec = 1e-04
+
+
+def get_path_npoints(vertices, rec, density=None, jumps=(), max_points=None):
+    """
+    Return the number of q-points from each vertex of a path to the next one (the
+    q-point counts of a matdyn.x q-list in band form), for a spacing of about
+    1/density (in 1/angstrom).
+
+    Each segment has at least 2 q-points, so that only the jumps (discontinuities
+    of the path, with a single q-point) join two vertices at consecutive indexes.
+
+    :param vertices: reduced coordinates of the vertices, shape (nvertices, 3)
+    :param rec: reciprocal lattice vectors (1/angstrom, including 2 pi)
+    :param jumps: indexes of the segments that are jumps
+
+    :return: integer array of shape (nvertices - 1,)
+    """
+    density = float(density or default_density)
+    max_points = max_points or max_path_points
+    vertices = np.asarray(vertices, dtype=float)
+    if vertices.ndim != 2 or vertices.shape[1] != 3 or len(vertices) < 2:
+        raise ValueError("The path needs at least 2 vertices with 3 coordinates")
+    if density <= 0:
+        raise ValueError("The density of the q-points must be positive")
+
+    lengths = np.linalg.norm(np.diff(vertices, axis=0) @ rec, axis=1)
+    segments = np.ones(len(lengths), dtype=bool)
+    segments[list(jumps)] = False
+    if np.any(lengths[segments] < 1e-8):
+        raise ValueError("Consecutive vertices of the path must be different")
+    npoints = np.where(segments, np.maximum(2, np.ceil(lengths * density)), 1)
+    npoints = npoints.astype(int)
+    if npoints.sum() + 1 > max_points:
+        raise ValueError(
+            f"Too many q-points ({npoints.sum() + 1}), the maximum is {max_points}"
+        )
+    return npoints
+
+
+def get_path_qpoints(
+    vertices, rec, density=None, labels=None, max_points=None, jumps=(), npoints=None
+):
+    """
+    Return the q-points of a path through the given vertices, with a spacing of
+    about 1/density (in 1/angstrom) along each segment.
+
+    :param vertices: reduced coordinates of the vertices, shape (nvertices, 3)
+    :param rec: reciprocal lattice vectors (1/angstrom, including 2 pi)
+    :param labels: label of each vertex (default: Q_1, Q_2, ...)
+    :param jumps: see `get_path_npoints`
+    :param npoints: q-point counts of the segments, if already computed with
+        `get_path_npoints` (density, max_points and jumps are then ignored)
+
+    :return: (reduced coordinates of the q-points, high-symmetry q-points as a list
+        of (index, label))
+    """
+    if npoints is None:
+        npoints = get_path_npoints(vertices, rec, density, jumps, max_points)
+    vertices = np.asarray(vertices, dtype=float)
+    labels = labels or [f"Q_{i + 1}" for i in range(len(vertices))]
+    if len(labels) != len(vertices):
+        raise ValueError("The number of labels differs from the number of vertices")
+
+    segments = [vertices[:1]]
+    for start, end, n in zip(vertices[:-1], vertices[1:], npoints):
+        fractions = np.arange(1, n + 1)[:, None] / n
+        segments.append(start + fractions * (end - start))
+    indexes = np.concatenate([[0], np.cumsum(npoints)])
+    return np.concatenate(segments), [
+        (int(index), label) for index, label in zip(indexes, labels)
+    ]
+
+
+def chain_segments(segments):
+    """
+    Reorder the segments (pairs of labels) of a path, and reverse some of them, so
+    that each segment starts where the previous one ends whenever possible.
+    """
+    remaining = list(segments)
+    chained = [remaining.pop(0)]
+    while remaining:
+        end = chained[-1][1]
+        for index, (start, stop) in enumerate(remaining):
+            if end in (start, stop):
+                remaining.pop(index)
+                chained.append((start, stop) if start == end else (stop, start))
+                break
+        else:
+            chained.append(remaining.pop(0))
+    return chained
+
+
+def get_seekpath_path(
+    cell, pos, atom_numbers, symprec=default_symprec, two_dimensional=False
+):
+    """
+    Return the path through the high-symmetry points suggested by seekpath.
+
+    seekpath gives the points in its standardized primitive cell, that can be rotated
+    and have other axes than cell: they are converted to the reduced coordinates of
+    the reciprocal lattice of cell.
+
+    :param two_dimensional: keep only the segments in the plane of the first two
+        reciprocal lattice vectors, for 2D materials (with the vacuum along the third
+        lattice vector, as for the 2D cutoff of QE), chained with `chain_segments`
+
+    :return: (reduced coordinates of the vertices, their labels, indexes of the
+        segments that are jumps)
+    """
+    import seekpath
+
+    seekpath_data = seekpath.get_path((cell, pos, atom_numbers), symprec=symprec)
+    # the primitive lattice vectors of seekpath, in the cartesian frame of cell
+    primitive = np.array(seekpath_data["primitive_lattice"]) @ np.array(
+        seekpath_data["rotation_matrix"]
+    )
+    transformation = (np.asarray(cell, dtype=float) @ np.linalg.inv(primitive)).T
+    point_coords = {
+        label: np.array(coords) @ transformation
+        for label, coords in seekpath_data["point_coords"].items()
+    }
+
+    path = seekpath_data["path"]
+    if two_dimensional:
+        path = [
+            (start, end)
+            for start, end in path
+            if abs(point_coords[start][2]) < 1e-8 and abs(point_coords[end][2]) < 1e-8
+        ]
+        if not path:
+            raise ValueError("The q-path of seekpath has no segment in the 2D plane")
+        path = chain_segments(path)
+
+    labels = []
+    jumps = []
+    for start, end in path:
+        if labels and labels[-1] != start:
+            jumps.append(len(labels) - 1)
+        if not labels or labels[-1] != start:
+            labels.append(start)
+        labels.append(end)
+    vertices = np.array([point_coords[label] for label in labels])
+    return vertices, labels, jumps
+
+
+def get_seekpath_qpath(
+    cell,
+    pos,
+    atom_numbers,
+    density=None,
+    symprec=default_symprec,
+    max_points=None,
+    two_dimensional=False,
+):
+    """
+    Generate the q-path through the high-symmetry points suggested by seekpath (see
+    `get_seekpath_path`, also for two_dimensional), with about density q-points per
+    1/angstrom, together with
+    its labels and discontinuities, so that they do not need to be recovered from
+    the q-points (see `get_highsym_qpts_from_seekpath`).
+
+    :return: a dictionary with
+        - "qpoints": reduced coordinates of the q-points, in the reciprocal lattice
+          of cell
+        - "highsym_qpts": list of (index, label), as accepted by `PhononWebConverter`
+          (the two sides of a jump are labelled at consecutive indexes)
+        - "discont_indexes": index of the last q-point before each jump
+        - "vertices" and "npoints": the path in band form, see `write_matdyn_qpath`
+    """
+    cell = np.asarray(cell, dtype=float)
+    rec = rec_lat(cell) * 2 * np.pi
+    vertices, labels, jumps = get_seekpath_path(
+        cell, pos, atom_numbers, symprec, two_dimensional
+    )
+    npoints = get_path_npoints(vertices, rec, density, jumps, max_points)
+    qpoints, highsym_qpts = get_path_qpoints(
+        vertices, rec, labels=labels, npoints=npoints
+    )
+    return {
+        "qpoints": qpoints,
+        "highsym_qpts": highsym_qpts,
+        "discont_indexes": [highsym_qpts[jump][0] for jump in jumps],
+        "vertices": vertices,
+        "npoints": npoints,
+    }
+
+
+def write_matdyn_qpath(file_obj, qpath):
+    """
+    Write the q-list of a matdyn.x input in band form (q_in_band_form = .true.), in
+    reduced coordinates (q_in_cryst_coord = .true.). matdyn.x then computes the
+    q-points of qpath["qpoints"], in the same order.
+
+    :param qpath: as returned by `get_seekpath_qpath`
+    """
+    # the count of the last vertex is not used by matdyn.x
+    npoints = list(qpath["npoints"]) + [1]
+    file_obj.write(f"{len(npoints)}\n")
+    for vertex, count in zip(qpath["vertices"], npoints):
+        file_obj.write("{:18.10f} {:18.10f} {:18.10f} {}\n".format(*vertex, count))
+
+
+def format_namelist_value(value):
+    if isinstance(value, bool):
+        return ".true." if value else ".false."
+    if isinstance(value, str):
+        return f"'{value}'"
+    return str(value)
+
+
+def write_matdyn_input(file_obj, qpath, template=None, **settings):
+    """
+    Write a matdyn.x input computing the phonons along the q-path.
+
+    :param qpath: as returned by `get_seekpath_qpath`
+    :param template: text of an existing matdyn.x input, whose &INPUT namelist is
+        kept (only its q-list is replaced)
+    :param settings: values of the &INPUT namelist without template, added to or
+        replacing the defaults (e.g. asr="all", loto_2d=True)
+    """
+    q_settings = {"q_in_cryst_coord": True, "q_in_band_form": True}
+    if template is not None:
+        match = re.search(r"&input.*?(?=^\s*/)", template, re.I | re.S | re.M)
+        if not match:
+            raise ValueError("The &INPUT namelist was not found in the matdyn.x input")
+        file_obj.writelines(
+            f"{line}\n"
+            for line in match.group(0).splitlines()
+            if not re.match(r"\s*q_in_(cryst_coord|band_form)\b", line, re.I)
+        )
+        namelist = q_settings
+    else:
+        file_obj.write("&INPUT\n")
+        namelist = {
+            "asr": "simple",
+            "flfrc": "real_space_force_constants.dat",
+            "flfrq": "matdyn.frq",
+            "flvec": "matdyn.modes",
+            **settings,
+            **q_settings,
+        }
+    for key, value in namelist.items():
+        file_obj.write(f"{key} = {format_namelist_value(value)}\n")
+    file_obj.write("/\n")
+    write_matdyn_qpath(file_obj, qpath)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=(
+            "Write the matdyn.x input computing the phonons along the q-path through "
+            "the high-symmetry points of the crystal, and its labels (highsym_qpts.json)."
+        )
+    )
+    parser.add_argument("folder", help="Folder with the SCF input file (scf.in).")
+    parser.add_argument(
+        "--density",
+        type=float,
+        default=default_density,
+        help=f"Number of q-points per 1/angstrom (default: {default_density:g}).",
+    )
+    parser.add_argument(
+        "--symprec",
+        type=float,
+        default=default_symprec,
+        help=f"Tolerance of the symmetry detection (default: {default_symprec:g}).",
+    )
+    parser.add_argument(
+        "--fname_scf_in",
+        default="scf.in",
+        help="Name of the SCF input file (default: scf.in).",
+    )
+    parser.add_argument(
+        "--scf_in_format",
+        choices=["qeinp-qetools", "qeinp-fast"],
+        default="qeinp-qetools",
+        help="Parser of the SCF input file (default: qeinp-qetools).",
+    )
+    parser.add_argument(
+        "--fname_matdyn_in",
+        default="matdyn.in",
+        help=(
+            "Name of the matdyn.x input file (default: matdyn.in, or its compressed "
+            "version). The &INPUT namelist of an existing file is kept, only the "
+            "q-list is replaced."
+        ),
+    )
+    parser.add_argument(
+        "--out_file",
+        help=(
+            "Path of the matdyn.x input to write (default: the existing matdyn.x "
+            "input, with the same compression, otherwise FOLDER/FNAME_MATDYN_IN). "
+            "The file is compressed if its name ends with .gz, .xz or .zst."
+        ),
+    )
+    parser.add_argument(
+        "--fname_highsym_qpts",
+        default="highsym_qpts.json",
+        help="Name of the labels file to write (default: highsym_qpts.json).",
+    )
+    parser.add_argument(
+        "--two_dimensional",
+        action="store_true",
+        help=(
+            "Keep only the segments in the plane of the first two reciprocal lattice "
+            "vectors (default: if loto_2d is set in the existing matdyn.x input)."
+        ),
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Overwrite the matdyn.x input and the labels file if they exist.",
+    )
+    args = parser.parse_args()
+
+    # imported here, so that the qpath module does not depend on the QE parsers
+    from .force_constants import read_matdyn_settings
+    from .qe_phonon_tools import read_and_process_scf_in
+    from .utils import get_compressed_path, open_output, open_text
+
+    folder = Path(args.folder)
+    template = None
+    settings = {}
+    matdyn_in_file = get_compressed_path(folder / args.fname_matdyn_in)
+    if matdyn_in_file.exists():
+        with open_text(matdyn_in_file) as f:
+            template = f.read()
+        settings = read_matdyn_settings(io.StringIO(template))
+
+    out_file = Path(args.out_file) if args.out_file else matdyn_in_file
+    highsym_file = folder / args.fname_highsym_qpts
+    if not args.force:
+        for path in (out_file, highsym_file):
+            if path.exists():
+                parser.error(f"{path} exists, use --force to overwrite it")
+
+    with open_text(folder / args.fname_scf_in) as f:
+        scf_in_data = read_and_process_scf_in(f, fileformat=args.scf_in_format)
+    qpath = get_seekpath_qpath(
+        scf_in_data["cell"],
+        scf_in_data["pos"],
+        scf_in_data["atom_numbers"],
+        args.density,
+        args.symprec,
+        max_points=np.inf,
+        two_dimensional=args.two_dimensional or settings.get("loto_2d", False),
+    )
+
+    with open_output(out_file) as f:
+        write_matdyn_input(f, qpath, template)
+    print(f"Saved {out_file} ({len(qpath['qpoints'])} q-points)")
+    highsym_file.write_text(
+        "[\n"
+        + ",\n".join(
+            f"  {json.dumps(list(entry), ensure_ascii=False)}"
+            for entry in qpath["highsym_qpts"]
+        )
+        + "\n]\n"
+    )
+    print(f"Saved {highsym_file}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,540 @@
+"""Scan many materials for dynamical instabilities (imaginary frequencies)"""
+
+import argparse
+import csv
+import io
+import json
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack
+from functools import partial
+from pathlib import Path
+
+import numpy as np
+
+from . import get_modes_paths
+from .force_constants import PhononInterpolator, load_interpolator, read_force_constants
+from .lattice import rec_lat
+from .qe_phonon_tools import (
+    merge_matdyn_segments,
+    read_and_process_scf_in,
+    read_and_process_scf_out,
+    read_matdyn,
+    read_matdyn_segments,
+)
+from .thermodynamics import get_default_mesh, get_mesh_qpoints
+from .utils import (
+    get_compressed_path,
+    open_output,
+    open_text,
+    strip_compression_suffix,
+)
+
+# Negative frequencies (cm^-1) above -tolerance are numerical noise
+default_tolerance = 1.0
+# Near Gamma (|q| < gamma_radius, in 1/angstrom), the three lowest modes with a
+# frequency above -acoustic_tolerance (cm^-1) are acoustic noise, e.g. from an
+# incomplete acoustic sum rule, and not real instabilities
+default_acoustic_tolerance = 20.0
+default_gamma_radius = 0.1
+# With use_mesh="auto", the mesh is scanned only if the interpolated frequencies
+# differ from the ones of the q-path by less than this value (cm^-1)
+default_mesh_agreement = 1.0
+
+report_columns = (
+    "name",
+    "status",
+    "source",
+    "nq",
+    "imaginary_frequency",
+    "worst_qpoint",
+    "worst_mode",
+    "unstable_qpoints",
+    "unstable_fraction",
+    "acoustic_frequency",
+    "min_frequency",
+    "error",
+)
+
+
+def classify_modes(
+    frequencies,
+    qpoints,
+    rec,
+    tolerance=None,
+    acoustic_tolerance=None,
+    gamma_radius=None,
+):
+    """
+    Classify the negative (imaginary) frequencies of all the modes at once.
+
+    :param frequencies: frequencies in cm^-1, negative for imaginary modes, shape
+        (nq, nmodes)
+    :param qpoints: reduced coordinates of the q-points, shape (nq, 3)
+    :param rec: reciprocal lattice vectors (1/angstrom, including 2 pi)
+
+    :return: (unstable, acoustic), boolean arrays with the shape of frequencies of the
+        real instabilities and of the acoustic noise near Gamma
+    """
+    tolerance = default_tolerance if tolerance is None else tolerance
+    if acoustic_tolerance is None:
+        acoustic_tolerance = default_acoustic_tolerance
+    gamma_radius = default_gamma_radius if gamma_radius is None else gamma_radius
+    frequencies = np.atleast_2d(frequencies)
+    qpoints = np.atleast_2d(qpoints)
+
+    negative = frequencies < -tolerance
+    # distance to the closest Gamma point, also in the other Brillouin zones
+    distances = np.linalg.norm((qpoints - np.round(qpoints)) @ rec, axis=1)
+    ranks = np.argsort(np.argsort(frequencies, axis=1), axis=1)
+    acoustic = (
+        negative
+        & (distances < gamma_radius)[:, None]
+        & (ranks < 3)
+        & (frequencies >= -acoustic_tolerance)
+    )
+    return negative & ~acoustic, acoustic
+
+
+def scan_frequencies(frequencies, qpoints, rec, **tolerances):
+    """
+    Find the instabilities of a material, see `classify_modes` for the parameters.
+
+    :return: dictionary with the "status" ("stable", "acoustic" if there is only
+        acoustic noise, or "unstable"), the magnitude of the most imaginary unstable
+        frequency with its q-point and mode, the number and fraction of q-points with
+        unstable modes, the magnitude of the most imaginary acoustic frequency and the
+        lowest frequency (all in cm^-1)
+    """
+    frequencies = np.atleast_2d(frequencies)
+    unstable, acoustic = classify_modes(frequencies, qpoints, rec, **tolerances)
+    report = {
+        "status": "stable",
+        "nq": len(frequencies),
+        "imaginary_frequency": 0.0,
+        "worst_qpoint": None,
+        "worst_mode": None,
+        "unstable_qpoints": int(unstable.any(axis=1).sum()),
+        "unstable_fraction": float(unstable.any(axis=1).mean()),
+        "acoustic_frequency": abs(float(frequencies[acoustic].min(initial=0.0))),
+        "min_frequency": float(frequencies.min()),
+    }
+    if acoustic.any():
+        report["status"] = "acoustic"
+    if unstable.any():
+        iq, mode = np.unravel_index(
+            np.argmin(np.where(unstable, frequencies, np.inf)), frequencies.shape
+        )
+        report["status"] = "unstable"
+        report["imaginary_frequency"] = float(-frequencies[iq, mode])
+        report["worst_qpoint"] = [round(float(x), 6) for x in qpoints[iq]]
+        report["worst_mode"] = int(mode)
+    return report
+
+
+def get_mesh_frequencies(interpolator, mesh=None):
+    """
+    Return the frequencies interpolated on a q-point mesh (reduced with time reversal),
+    with the q-points and the reciprocal lattice vectors.
+    """
+    mesh = mesh or get_default_mesh(interpolator)
+    qpoints, _ = get_mesh_qpoints(mesh)
+    frequencies, _ = interpolator.diagonalize(qpoints, eigenvectors=False)
+    return frequencies, qpoints, interpolator.rec
+
+
+def get_mesh_disagreement(interpolator, frequencies, qpoints, rec):
+    """
+    Return the largest difference (cm^-1) between the frequencies of a q-path and
+    the ones interpolated at the same q-points. Gamma is skipped: there the q-path
+    has the non-analytic term along the path direction, which the mesh does not have.
+
+    :param qpoints: reduced coordinates of the q-points of the path in the
+        reciprocal lattice vectors rec (1/angstrom, including 2 pi)
+    """
+    qpoints_cart = np.atleast_2d(qpoints) @ rec
+    shared = np.linalg.norm(qpoints_cart, axis=1) > 1e-8
+    if not shared.any():
+        return 0.0
+    interpolated, _ = interpolator.diagonalize(
+        qpoints_cart[shared] @ np.linalg.inv(interpolator.rec), eigenvectors=False
+    )
+    difference = np.sort(interpolated, axis=1) - np.sort(frequencies[shared], axis=1)
+    return float(np.abs(difference).max())
+
+
+def select_frequencies(load_path, interpolator, use_mesh, mesh, mesh_agreement):
+    """
+    Choose between the frequencies of the q-path and the ones of a mesh interpolated
+    from the force constants, see `load_folder_frequencies`.
+
+    :param load_path: function returning the frequencies, reduced q-points and
+        reciprocal lattice vectors of the q-path
+    :param interpolator: the `PhononInterpolator` of the material, or None
+    """
+    if interpolator is not None and use_mesh is True:
+        mesh = mesh or get_default_mesh(interpolator)
+        return (*get_mesh_frequencies(interpolator, mesh), get_mesh_source(mesh))
+    path = load_path()
+    if interpolator is not None and use_mesh == "auto":
+        if mesh_agreement is None:
+            mesh_agreement = default_mesh_agreement
+        if get_mesh_disagreement(interpolator, *path) < mesh_agreement:
+            mesh = mesh or get_default_mesh(interpolator)
+            return (*get_mesh_frequencies(interpolator, mesh), get_mesh_source(mesh))
+    return (*path, "path")
+
+
+def load_folder_path(
+    folder,
+    fname_scf_in="scf.in",
+    fname_scf_out="scf.out",
+    fname_modes="matdyn.modes",
+    scf_in_format="qeinp-qetools",
+):
+    """
+    Read the frequencies along the q-path of the matdyn.modes file(s) of a folder.
+
+    :return: (frequencies, reduced q-points, reciprocal lattice vectors)
+    """
+    with open_text(folder / fname_scf_in) as f:
+        scf_in_data = read_and_process_scf_in(f, fileformat=scf_in_format)
+    with open_text(folder / fname_scf_out) as f:
+        scf_out_data = read_and_process_scf_out(f, scf_in_data)
+    natoms = len(scf_in_data["atom_numbers"])
+    modes_paths = get_modes_paths(folder, fname_modes)
+    if isinstance(modes_paths, list):
+        with ExitStack() as stack:
+            files = [stack.enter_context(open_text(path)) for path in modes_paths]
+            (eig, _, qpt), _ = merge_matdyn_segments(
+                read_matdyn_segments(files, natoms, eigenvectors=False)
+            )
+    else:
+        with open_text(modes_paths) as f:
+            eig, _, qpt = read_matdyn(f, natoms, eigenvectors=False)
+
+    # from cartesian coordinates in units of 2pi/alat to reduced coordinates
+    rec = scf_in_data["rec"]
+    qpoints = qpt * 2 * np.pi / scf_out_data["alat"] @ np.linalg.inv(rec)
+    return eig, qpoints, rec
+
+
+def load_folder_frequencies(
+    folder,
+    fname_scf_in="scf.in",
+    fname_scf_out="scf.out",
+    fname_modes="matdyn.modes",
+    fname_force_constants="real_space_force_constants.dat",
+    fname_matdyn_in="matdyn.in",
+    use_mesh="auto",
+    mesh=None,
+    mesh_agreement=None,
+    scf_in_format="qeinp-qetools",
+):
+    """
+    Read the frequencies of a folder of QE files: the frequencies computed by
+    matdyn.x along the q-path of the matdyn.modes file(s), or the ones of a q-point
+    mesh interpolated from the force constants of the folder.
+
+    :param use_mesh: if True and the folder has force constants, scan the mesh
+        instead of the q-path. If "auto" (default), scan the mesh only if the
+        interpolation reproduces the frequencies of the q-path within
+        mesh_agreement (cm^-1, default: `default_mesh_agreement`). If False,
+        always scan the q-path
+    :param mesh: q-point mesh (default: `get_default_mesh`)
+
+    :return: (frequencies, reduced q-points, reciprocal lattice vectors, source),
+        source being "mesh NxNxN" or "path"
+    """
+    load_path = partial(
+        load_folder_path,
+        folder,
+        fname_scf_in,
+        fname_scf_out,
+        fname_modes,
+        scf_in_format,
+    )
+    interpolator = None
+    fc_path = get_compressed_path(folder / fname_force_constants)
+    if use_mesh and fc_path.exists():
+        matdyn_in_path = get_compressed_path(folder / fname_matdyn_in)
+        with ExitStack() as stack:
+            matdyn_in_file = None
+            if matdyn_in_path.exists():
+                matdyn_in_file = stack.enter_context(open_text(matdyn_in_path))
+            interpolator = load_interpolator(
+                stack.enter_context(open_text(fc_path)), matdyn_in_file
+            )
+    return select_frequencies(load_path, interpolator, use_mesh, mesh, mesh_agreement)
+
+
+def load_json_frequencies(json_file):
+    """Read the frequencies along the q-path of a converted JSON file."""
+    with open_text(json_file) as f:
+        phonon_data = json.load(f)
+    rec = rec_lat(np.array(phonon_data["lattice"], dtype=float)) * 2 * np.pi
+    return (
+        np.array(phonon_data["eigenvalues"], dtype=float),
+        np.array(phonon_data["qpoints"], dtype=float),
+        rec,
+        "path",
+    )
+
+
+def load_store_frequencies(
+    store_path, name, use_mesh="auto", mesh=None, mesh_agreement=None
+):
+    """
+    Read the frequencies of a material of a `PhononStore`: along its q-path, or on
+    a mesh interpolated from its force constants if stored (see use_mesh in
+    `load_folder_frequencies`).
+    """
+    # imported here, like in the cli, so that the store is only loaded when needed
+    from .store import PhononStore
+
+    with PhononStore(store_path) as store:
+        interpolator = None
+        if use_mesh and store.get_force_constants_hash(name) is not None:
+            text, settings = store.get_force_constants(name)
+            interpolator = PhononInterpolator(
+                read_force_constants(io.StringIO(text)), **settings
+            )
+        lattice = store.get_metadata(name)["lattice"]
+        frequencies = store.get_array(name, "eigenvalues")
+        qpoints = store.get_array(name, "qpoints")
+    rec = rec_lat(np.array(lattice, dtype=float)) * 2 * np.pi
+    return select_frequencies(
+        lambda: (frequencies, qpoints, rec),
+        interpolator,
+        use_mesh,
+        mesh,
+        mesh_agreement,
+    )
+
+
+def get_mesh_source(mesh):
+    return "mesh " + "x".join(str(n) for n in mesh)
+
+
+def scan_material(
+    source, use_mesh="auto", mesh=None, mesh_agreement=None, tolerances=None, **kwargs
+):
+    """
+    Scan one material for instabilities, see `scan_materials`.
+
+    :return: the report of the material, with status "error" and the error message
+        if its files cannot be read
+    """
+    if isinstance(source, tuple):
+        store_path, name = source
+        load = partial(
+            load_store_frequencies, store_path, name, use_mesh, mesh, mesh_agreement
+        )
+    elif Path(source).is_dir():
+        name = Path(source).name
+        load = partial(
+            load_folder_frequencies,
+            Path(source),
+            use_mesh=use_mesh,
+            mesh=mesh,
+            mesh_agreement=mesh_agreement,
+            **kwargs,
+        )
+    else:
+        name = Path(strip_compression_suffix(source)).stem
+        load = partial(load_json_frequencies, source)
+
+    report = dict.fromkeys(report_columns)
+    report["name"] = name
+    try:
+        frequencies, qpoints, rec, report["source"] = load()
+    except (OSError, EOFError, KeyError, ValueError) as exc:
+        report["status"] = "error"
+        report["error"] = str(exc)
+        return report
+    report.update(scan_frequencies(frequencies, qpoints, rec, **(tolerances or {})))
+    return report
+
+
+def scan_materials(sources, workers=1, **kwargs):
+    """
+    Scan many materials for instabilities, in parallel.
+
+    :param sources: folders of QE files, converted JSON files, or (store path, name)
+        tuples for the materials of a `PhononStore`
+    :param workers: number of processes scanning the materials
+    :param kwargs: passed to `scan_material`: use_mesh, mesh and mesh_agreement
+        (see `load_folder_frequencies`, by default the mesh is scanned when the
+        force constants are available and reproduce the q-path),
+        tolerances (parameters of `classify_modes`), and the file names of
+        `load_folder_frequencies`
+
+    :return: the list of the reports of the materials, in the order of sources
+    """
+    scan = partial(scan_material, **kwargs)
+    if workers > 1 and len(sources) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(sources))) as executor:
+            return list(executor.map(scan, sources))
+    return [scan(source) for source in sources]
+
+
+def sort_report(reports, key="imaginary_frequency", descending=True):
+    """Sort the reports by a column, the missing values last."""
+    if key not in report_columns:
+        raise ValueError(f"Unknown column {key}, choose from {list(report_columns)}")
+    present = [report for report in reports if report[key] is not None]
+    missing = [report for report in reports if report[key] is None]
+    return sorted(present, key=lambda r: r[key], reverse=descending) + missing
+
+
+def format_value(value):
+    if value is None:
+        return ""
+    if isinstance(value, list):
+        return " ".join(f"{x:g}" for x in value)
+    if isinstance(value, float):
+        return f"{value:.4g}"
+    return str(value)
+
+
+def write_report(reports, file_obj, fileformat="csv"):
+    """Write the reports as CSV (one row per material) or JSON."""
+    if fileformat == "json":
+        json.dump(reports, file_obj, indent=2)
+        return
+    writer = csv.writer(file_obj)
+    writer.writerow(report_columns)
+    for report in reports:
+        writer.writerow(format_value(report[column]) for column in report_columns)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=(
+            "Scan many materials for dynamical instabilities (imaginary frequencies, "
+            "written as negative values) and report the worst mode of each material."
+        )
+    )
+    parser.add_argument(
+        "sources",
+        nargs="*",
+        help="Folders with QE files (as for phonon-web-tools) or converted JSON files.",
+    )
+    parser.add_argument("--store", help="Also scan all the materials of this store.")
+    parser.add_argument(
+        "--out_file",
+        help=(
+            "Write the report to this file, CSV or JSON (.json), instead of stdout, "
+            "compressed if it ends with .gz, .xz or .zst."
+        ),
+    )
+    parser.add_argument(
+        "--sort",
+        default="imaginary_frequency",
+        choices=report_columns,
+        help="Column sorting the report, in descending order (default: imaginary_frequency).",
+    )
+    parser.add_argument(
+        "--ascending", action="store_true", help="Sort in ascending order."
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=default_tolerance,
+        help=f"Negative frequencies above -tolerance (cm^-1) are ignored (default: {default_tolerance}).",
+    )
+    parser.add_argument(
+        "--acoustic_tolerance",
+        type=float,
+        default=default_acoustic_tolerance,
+        help=(
+            "Negative frequencies of the acoustic modes near Gamma above "
+            f"-acoustic_tolerance (cm^-1) are acoustic noise (default: {default_acoustic_tolerance})."
+        ),
+    )
+    parser.add_argument(
+        "--gamma_radius",
+        type=float,
+        default=default_gamma_radius,
+        help=f"Radius (1/angstrom) of the region of acoustic noise around Gamma (default: {default_gamma_radius}).",
+    )
+    parser.add_argument(
+        "--use_mesh",
+        choices=("no", "auto", "yes"),
+        default="auto",
+        help=(
+            "Scan a q-point mesh interpolated from the force constants, for the "
+            "materials that have them, instead of the q-path computed by matdyn.x: "
+            "'yes' always, 'auto' only if the interpolation reproduces the "
+            "frequencies of the q-path within --mesh_agreement, 'no' never "
+            "(default: auto)."
+        ),
+    )
+    parser.add_argument(
+        "--mesh_agreement",
+        type=float,
+        default=default_mesh_agreement,
+        help=(
+            "Largest difference (cm^-1) between the q-path and the interpolation at "
+            f"its q-points for --use_mesh auto (default: {default_mesh_agreement})."
+        ),
+    )
+    parser.add_argument(
+        "--mesh",
+        nargs=3,
+        type=int,
+        help="q-point mesh interpolated from the force constants with --use_mesh (default: about 10 points per 1/angstrom).",
+    )
+    parser.add_argument(
+        "--fname_modes",
+        default="matdyn.modes",
+        help="Name (or glob pattern) of the phonon modes file(s) (default: matdyn.modes).",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of processes scanning the materials (default: 1).",
+    )
+    args = parser.parse_args()
+
+    sources = [Path(source) for source in args.sources]
+    if args.store:
+        from .store import PhononStore
+
+        with PhononStore(args.store) as store:
+            materials, _ = store.query()
+        sources += [(args.store, material["name"]) for material in materials]
+    if not sources:
+        parser.error("no folders, JSON files or store to scan")
+
+    reports = scan_materials(
+        sources,
+        workers=args.workers,
+        use_mesh={"no": False, "auto": "auto", "yes": True}[args.use_mesh],
+        mesh=args.mesh,
+        mesh_agreement=args.mesh_agreement,
+        tolerances=dict(
+            tolerance=args.tolerance,
+            acoustic_tolerance=args.acoustic_tolerance,
+            gamma_radius=args.gamma_radius,
+        ),
+        fname_modes=args.fname_modes,
+    )
+    reports = sort_report(reports, args.sort, descending=not args.ascending)
+
+    if args.out_file:
+        suffix = Path(strip_compression_suffix(args.out_file)).suffix
+        fileformat = "json" if suffix == ".json" else "csv"
+        with open_output(args.out_file) as f:
+            write_report(reports, f, fileformat)
+        print(f"Saved {args.out_file}")
+    else:
+        write_report(reports, sys.stdout)
+
+    # a non-zero exit code, e.g. to stop a pipeline, if any material is unstable
+    sys.exit(any(report["status"] in ("unstable", "error") for report in reports))
+
+
+if __name__ == "__main__":
+    main()
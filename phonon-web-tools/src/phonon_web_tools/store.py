@@ -0,0 +1,363 @@
+"""Indexed store of the converted phonon data of many materials, in a single SQLite file"""
+
+import hashlib
+import json
+import sqlite3
+import zlib
+
+import numpy as np
+
+from .phonon_web import decode_phonon_data
+from .utils import JsonEncoder
+
+# Keys of the converted data stored as binary arrays, with their dtype.
+# All the other keys are small and are stored as JSON in the metadata.
+array_keys = {
+    "qpoints": np.float64,
+    "distances": np.float64,
+    "eigenvalues": np.float64,
+    "vectors": np.float64,
+    "group_velocities": np.float64,
+}
+# Arrays that every material has (the others are optional, e.g. there are no
+# vectors in the data converted with the eigenvalues only)
+required_array_keys = ("qpoints", "distances", "eigenvalues")
+
+# Indexed columns of the materials table, that can be used to filter and sort
+index_columns = ("name", "formula", "natoms", "nq", "max_frequency", "min_frequency")
+
+schema = """
+CREATE TABLE IF NOT EXISTS materials (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    formula TEXT NOT NULL,
+    natoms INTEGER NOT NULL,
+    nq INTEGER NOT NULL,
+    max_frequency REAL NOT NULL,
+    min_frequency REAL NOT NULL,
+    hash TEXT NOT NULL,
+    metadata TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS materials_formula ON materials (formula);
+CREATE INDEX IF NOT EXISTS materials_natoms ON materials (natoms);
+CREATE INDEX IF NOT EXISTS materials_nq ON materials (nq);
+CREATE INDEX IF NOT EXISTS materials_max_frequency ON materials (max_frequency);
+CREATE INDEX IF NOT EXISTS materials_min_frequency ON materials (min_frequency);
+CREATE INDEX IF NOT EXISTS materials_hash ON materials (hash);
+CREATE TABLE IF NOT EXISTS arrays (
+    material_id INTEGER NOT NULL REFERENCES materials (id) ON DELETE CASCADE,
+    key TEXT NOT NULL,
+    dtype TEXT NOT NULL,
+    shape TEXT NOT NULL,
+    data BLOB NOT NULL,
+    PRIMARY KEY (material_id, key)
+);
+CREATE TABLE IF NOT EXISTS force_constants (
+    material_id INTEGER PRIMARY KEY REFERENCES materials (id) ON DELETE CASCADE,
+    hash TEXT NOT NULL,
+    settings TEXT NOT NULL,
+    data BLOB NOT NULL
+);
+"""
+
+
+def split_phonon_data(phonon_data):
+    """
+    Split the converted data into the metadata (JSON-serializable) and the
+    contiguous numpy arrays. Delta-encoded eigenvectors are decoded.
+    """
+    phonon_data = decode_phonon_data(phonon_data)
+    metadata = {}
+    arrays = {}
+    for key, value in phonon_data.items():
+        if key in array_keys:
+            arrays[key] = np.ascontiguousarray(value, dtype=array_keys[key])
+        else:
+            metadata[key] = value
+    # Round-trip to get plain lists also if the metadata contains numpy arrays
+    metadata = json.loads(json.dumps(metadata, cls=JsonEncoder))
+    return metadata, arrays
+
+
+def get_data_hash(metadata, arrays):
+    """
+    Return the SHA-256 of the metadata and of the arrays of the converted data.
+    """
+    sha = hashlib.sha256()
+    sha.update(json.dumps(metadata, sort_keys=True).encode())
+    for key in sorted(arrays):
+        sha.update(key.encode())
+        sha.update(str(arrays[key].shape).encode())
+        sha.update(arrays[key].tobytes())
+    return sha.hexdigest()
+
+
+class PhononStore:
+    """
+    Store the converted phonon data of many materials in a single SQLite file.
+
+    The metadata (name, formula, number of atoms and q-points, frequency range,
+    hash) is indexed, so that the materials can be listed and searched without
+    loading the data. The arrays (q-points, distances, eigenvalues, eigenvectors)
+    are stored as raw binary blobs, and can be loaded one by one, or only some
+    q-points of them.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("PRAGMA foreign_keys = ON")
+        self.connection.executescript(schema)
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __len__(self):
+        return self.connection.execute("SELECT COUNT(*) FROM materials").fetchone()[0]
+
+    def __contains__(self, name):
+        return self._get_id(name, raise_missing=False) is not None
+
+    def _get_id(self, name, raise_missing=True):
+        row = self.connection.execute(
+            "SELECT id FROM materials WHERE name = ?", (name,)
+        ).fetchone()
+        if row is None and raise_missing:
+            raise KeyError(f"Material {name} not found")
+        return row[0] if row else None
+
+    def put(self, name, phonon_data):
+        """
+        Add (or replace) the converted data of a material.
+
+        :param name: unique name of the material in the store
+        :param phonon_data: the converted data (see `PhononWebConverter.get_dict`)
+
+        :return: True if the data was written, False if the same data (same hash)
+            was already stored under this name
+        """
+        metadata, arrays = split_phonon_data(phonon_data)
+        missing = set(required_array_keys) - set(arrays)
+        if missing:
+            raise ValueError(f"Missing arrays in the phonon data: {sorted(missing)}")
+        data_hash = get_data_hash(metadata, arrays)
+        row = self.connection.execute(
+            "SELECT hash FROM materials WHERE name = ?", (name,)
+        ).fetchone()
+        if row is not None and row[0] == data_hash:
+            return False
+
+        eigenvalues = arrays["eigenvalues"]
+        with self.connection:
+            self.connection.execute("DELETE FROM materials WHERE name = ?", (name,))
+            cursor = self.connection.execute(
+                "INSERT INTO materials (name, formula, natoms, nq, max_frequency, "
+                "min_frequency, hash, metadata) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    name,
+                    metadata["formula"],
+                    metadata["natoms"],
+                    len(arrays["qpoints"]),
+                    float(eigenvalues.max()),
+                    float(eigenvalues.min()),
+                    data_hash,
+                    json.dumps(metadata, separators=(",", ":")),
+                ),
+            )
+            self.connection.executemany(
+                "INSERT INTO arrays (material_id, key, dtype, shape, data) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [
+                    (
+                        cursor.lastrowid,
+                        key,
+                        array.dtype.str,
+                        json.dumps(array.shape),
+                        array.tobytes(),
+                    )
+                    for key, array in arrays.items()
+                ],
+            )
+        return True
+
+    def delete(self, name):
+        with self.connection:
+            self.connection.execute("DELETE FROM materials WHERE name = ?", (name,))
+
+    def query(
+        self,
+        name=None,
+        formula=None,
+        ranges=None,
+        order_by="name",
+        descending=False,
+        limit=None,
+        offset=0,
+    ):
+        """
+        Search the materials, using only the indexed metadata.
+
+        :param name: SQL LIKE pattern on the name (e.g. "Mo%")
+        :param formula: exact chemical formula (as in the converted data, e.g. "BaO3Ti")
+        :param ranges: dictionary {column: (min, max)} of inclusive ranges on the
+            numeric columns (natoms, nq, max_frequency, min_frequency), None for no bound
+        :param order_by: column used to sort the results
+        :param limit: maximum number of results (None for all)
+
+        :return: (list of dictionaries with the indexed columns and the hash,
+            total number of matches)
+        """
+        if order_by not in index_columns:
+            raise ValueError(f"Cannot sort by {order_by}, choose from {index_columns}")
+        conditions = []
+        params = []
+        if name is not None:
+            conditions.append("name LIKE ?")
+            params.append(name)
+        if formula is not None:
+            conditions.append("formula = ?")
+            params.append(formula)
+        for column, (min_value, max_value) in (ranges or {}).items():
+            if column not in index_columns[2:]:
+                raise ValueError(f"Cannot filter on {column}")
+            if min_value is not None:
+                conditions.append(f"{column} >= ?")
+                params.append(min_value)
+            if max_value is not None:
+                conditions.append(f"{column} <= ?")
+                params.append(max_value)
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        total = self.connection.execute(
+            f"SELECT COUNT(*) FROM materials{where}", params
+        ).fetchone()[0]
+        columns = index_columns + ("hash",)
+        rows = self.connection.execute(
+            f"SELECT {', '.join(columns)} FROM materials{where} "
+            f"ORDER BY {order_by} {'DESC' if descending else 'ASC'}, name "
+            "LIMIT ? OFFSET ?",
+            params + [-1 if limit is None else limit, offset],
+        ).fetchall()
+        return [dict(zip(columns, row)) for row in rows], total
+
+    def get_metadata(self, name):
+        """
+        Return the metadata of a material (all the keys of the converted data,
+        except the arrays).
+        """
+        row = self.connection.execute(
+            "SELECT metadata FROM materials WHERE name = ?", (name,)
+        ).fetchone()
+        if row is None:
+            raise KeyError(f"Material {name} not found")
+        return json.loads(row[0])
+
+    def get_array(self, name, key, start=None, stop=None):
+        """
+        Load an array of a material, or only the slice [start:stop] along the first
+        axis (the q-points), reading only that part of the blob.
+        """
+        if key not in array_keys:
+            raise ValueError(f"Unknown array {key}, choose from {list(array_keys)}")
+        material_id = self._get_id(name)
+        row = self.connection.execute(
+            "SELECT dtype, shape FROM arrays WHERE material_id = ? AND key = ?",
+            (material_id, key),
+        ).fetchone()
+        if row is None:
+            raise KeyError(f"Material {name} has no array {key}")
+        dtype, shape = row
+        dtype = np.dtype(dtype)
+        shape = json.loads(shape)
+        start, stop, _ = slice(start, stop).indices(shape[0])
+        stop = max(start, stop)
+        row_bytes = dtype.itemsize * int(np.prod(shape[1:], dtype=int))
+        # substr() on a blob counts bytes, starting from 1
+        (data,) = self.connection.execute(
+            "SELECT substr(data, ?, ?) FROM arrays WHERE material_id = ? AND key = ?",
+            (start * row_bytes + 1, (stop - start) * row_bytes, material_id, key),
+        ).fetchone()
+        return np.frombuffer(data, dtype=dtype).reshape([stop - start] + shape[1:])
+
+    def get_array_keys(self, name):
+        "Return the keys of the arrays stored for a material."
+        rows = self.connection.execute(
+            "SELECT key FROM arrays WHERE material_id = ?", (self._get_id(name),)
+        ).fetchall()
+        return [key for key in array_keys if (key,) in rows]
+
+    def put_force_constants(self, name, text, settings=None):
+        """
+        Add (or replace) the real-space force constants of a material, that must
+        already be in the store (they are deleted with it).
+
+        :param text: content of the force constants file of q2r.x
+        :param settings: interpolation settings, e.g. {"asr": "simple"} (see
+            `force_constants.read_matdyn_settings`)
+
+        :return: True if the force constants were written, False if the same
+            ones were already stored
+        """
+        material_id = self._get_id(name)
+        fc_hash = hashlib.sha256(text.encode()).hexdigest()
+        settings = json.dumps(settings or {}, sort_keys=True)
+        row = self.connection.execute(
+            "SELECT hash, settings FROM force_constants WHERE material_id = ?",
+            (material_id,),
+        ).fetchone()
+        if row == (fc_hash, settings):
+            return False
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO force_constants (material_id, hash, settings, "
+                "data) VALUES (?, ?, ?, ?)",
+                (material_id, fc_hash, settings, zlib.compress(text.encode())),
+            )
+        return True
+
+    def get_force_constants_hash(self, name):
+        """
+        Return the hash of the force constants of a material and of their
+        interpolation settings (SHA-256 of the hash of the file content and of the
+        settings), or None if it has no force constants.
+
+        The hash changes when only the settings change, so that it can be used as
+        the key of the interpolators built from them.
+        """
+        row = self.connection.execute(
+            "SELECT hash, settings FROM force_constants WHERE material_id = ?",
+            (self._get_id(name),),
+        ).fetchone()
+        if row is None:
+            return None
+        return hashlib.sha256("\n".join(row).encode()).hexdigest()
+
+    def get_force_constants(self, name):
+        """
+        Return the force constants of a material.
+
+        :return: (content of the force constants file, settings)
+        """
+        row = self.connection.execute(
+            "SELECT data, settings FROM force_constants WHERE material_id = ?",
+            (self._get_id(name),),
+        ).fetchone()
+        if row is None:
+            raise KeyError(f"Material {name} has no force constants")
+        return zlib.decompress(row[0]).decode(), json.loads(row[1])
+
+    def get(self, name, keys=None):
+        """
+        Load the converted data of a material, as returned by the converter but with
+        numpy arrays. If keys is given, load only these arrays (and all the metadata).
+        """
+        phonon_data = self.get_metadata(name)
+        for key in self.get_array_keys(name) if keys is None else keys:
+            phonon_data[key] = self.get_array(name, key)
+        return phonon_data
@@ -0,0 +1,221 @@
+"""Harmonic thermodynamic properties from the phonon frequencies on a q-point mesh"""
+
+import hashlib
+import json
+import os
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+# Physical constants, to convert cm^-1 to eV and eV to kJ/mol
+cm1_to_ev = 1.2398419843320026e-4
+kb_ev = 8.617333262e-5
+ev_to_kj_mol = 96.48533212331002
+
+# Modes with a frequency below this value (cm^-1) are excluded: the acoustic modes
+# at Gamma and imaginary (negative) frequencies
+default_cutoff = 1.0
+# Default number of q-points per 1/angstrom of the reciprocal lattice vectors
+mesh_density = 10.0
+default_temperatures = np.arange(0.0, 1001.0, 10.0)
+
+# Upper bound of the size of the (T, q, band) arrays computed at once (in bytes)
+chunk_max_bytes = 64 * 1024**2
+
+property_keys = (
+    "free_energy",
+    "internal_energy",
+    "entropy",
+    "heat_capacity",
+)
+
+
+def get_default_mesh(interpolator, density=None):
+    """
+    Return a q-point mesh with about density points per 1/angstrom along each
+    reciprocal lattice vector, and a single point along the third one for 2D
+    materials.
+    """
+    density = density or mesh_density
+    lengths = np.linalg.norm(interpolator.rec, axis=1)
+    mesh = [max(1, int(np.ceil(density * length))) for length in lengths]
+    if interpolator.loto_2d:
+        mesh[2] = 1
+    return mesh
+
+
+def get_mesh_qpoints(mesh, structure=None, symprec=1e-5):
+    """
+    Return the q-points of a Gamma-centered mesh, with their weights.
+
+    Without structure, only the time-reversal symmetry (q and -q) is used to reduce
+    the mesh. With structure, a (cell, positions, types) tuple, the irreducible
+    q-points are found with spglib.
+
+    :return: (reduced coordinates of shape (nq, 3), weights of shape (nq,) with
+        sum 1)
+    """
+    mesh = np.array(mesh, dtype=int)
+    if structure is not None:
+        import spglib
+
+        mapping, grid = spglib.get_ir_reciprocal_mesh(
+            mesh, structure, is_shift=[0, 0, 0], symprec=symprec
+        )
+        irreducible, counts = np.unique(mapping, return_counts=True)
+        return grid[irreducible] / mesh, counts / len(mapping)
+
+    grid = np.indices(mesh).reshape(3, -1).T
+    grid = np.where(grid > mesh // 2, grid - mesh, grid)
+    # index of -q in the mesh, keep the smallest of the two indexes
+    opposite = np.ravel_multi_index((-grid % mesh).T, mesh)
+    first = np.minimum(np.arange(len(grid)), opposite)
+    irreducible, counts = np.unique(first, return_counts=True)
+    return grid[irreducible] / mesh, counts / len(grid)
+
+
+def get_thermal_properties(frequencies, temperatures, weights=None, cutoff=None):
+    """
+    Compute the harmonic thermodynamic properties of the crystal, per unit cell,
+    for all the temperatures at once.
+
+    The functions of x = hbar omega / kT are evaluated on the whole (T, q, band)
+    grid, written with exp(-x) only so that they are stable for all x (including
+    T = 0). Modes below the cutoff (acoustic modes at Gamma, imaginary modes, given
+    as negative frequencies) are excluded from all the quantities, and their weight
+    is reported as "excluded_fraction".
+
+    :param frequencies: frequencies in cm^-1, shape (nq, nbands)
+    :param temperatures: temperatures in K, shape (nT,)
+    :param weights: weights of the q-points (e.g. from symmetry), normalized here
+    :param cutoff: frequency in cm^-1 below which the modes are excluded
+
+    :return: dictionary with "temperatures", "free_energy" and "internal_energy"
+        (kJ/mol), "entropy" and "heat_capacity" (J/K/mol), with shape (nT,),
+        "zero_point_energy" (kJ/mol) and "excluded_fraction"
+    """
+    frequencies = np.atleast_2d(frequencies)
+    temperatures = np.asarray(temperatures, dtype=float)
+    cutoff = default_cutoff if cutoff is None else cutoff
+    weights = np.ones(len(frequencies)) if weights is None else np.asarray(weights)
+    weights = weights / weights.sum()
+
+    included = frequencies > cutoff
+    energies = np.where(included, frequencies, 0.0) * cm1_to_ev  # (nq, nbands)
+    mode_weights = included * weights[:, None]
+    kt = kb_ev * temperatures
+
+    sums = {key: np.zeros(len(temperatures)) for key in property_keys}
+    chunk_size = max(1, int(chunk_max_bytes // (8 * 4 * energies.size or 1)))
+    for start in range(0, len(temperatures), chunk_size):
+        chunk = slice(start, start + chunk_size)
+        # x = E / kT on the (T, q, band) grid, infinite at T = 0
+        with np.errstate(divide="ignore", invalid="ignore"):
+            x = energies[None] / kt[chunk, None, None]
+        x = np.where(included[None], x, np.inf)
+        exp_x = np.exp(-x)  # 0 at T = 0 and for the excluded modes
+        one_minus = -np.expm1(-x)  # 1 - exp(-x), accurate for small x
+        occupation = exp_x / one_minus  # Bose-Einstein occupation
+        log_term = np.log(one_minus)
+        x = np.where(np.isfinite(x), x, 0.0)
+
+        terms = {
+            "free_energy": energies / 2 + kt[chunk, None, None] * log_term,
+            "internal_energy": energies * (0.5 + occupation),
+            "entropy": x * occupation - log_term,
+            "heat_capacity": x**2 * exp_x / one_minus**2,
+        }
+        for key, values in terms.items():
+            sums[key][chunk] = np.einsum("tqb,qb->t", values, mode_weights)
+
+    return {
+        "temperatures": temperatures,
+        "free_energy": sums["free_energy"] * ev_to_kj_mol,
+        "internal_energy": sums["internal_energy"] * ev_to_kj_mol,
+        "entropy": sums["entropy"] * kb_ev * ev_to_kj_mol * 1000,
+        "heat_capacity": sums["heat_capacity"] * kb_ev * ev_to_kj_mol * 1000,
+        "zero_point_energy": float(np.sum(energies * mode_weights) / 2 * ev_to_kj_mol),
+        "excluded_fraction": float(1 - mode_weights.sum() / frequencies.shape[1]),
+    }
+
+
+def get_cache_key(interpolator, mesh, temperatures, **settings):
+    """
+    Return the key of the cached thermodynamic properties, from the hash of the force
+    constants, the mesh, the temperatures and the other settings of the calculation.
+    """
+    key = {
+        "force_constants": interpolator.hash,
+        "asr": interpolator.asr,
+        "loto_2d": bool(interpolator.loto_2d),
+        "mesh": [int(n) for n in mesh],
+        "temperatures": np.asarray(temperatures, dtype=float).tolist(),
+        **settings,
+    }
+    return hashlib.sha256(json.dumps(key, sort_keys=True).encode()).hexdigest()
+
+
+def get_mesh_thermodynamics(
+    interpolator,
+    mesh=None,
+    temperatures=None,
+    symmetry=True,
+    cutoff=None,
+    cache_dir=None,
+):
+    """
+    Compute the thermodynamic properties from the frequencies interpolated on a
+    q-point mesh.
+
+    :param interpolator: a `PhononInterpolator`
+    :param mesh: the q-point mesh (default: `get_default_mesh`)
+    :param temperatures: temperatures in K (default: 0 to 1000 K, every 10 K)
+    :param symmetry: reduce the mesh with the symmetries of the crystal (spglib),
+        otherwise only with time reversal
+    :param cutoff: see `get_thermal_properties`
+    :param cache_dir: folder where the results are cached, with a key computed from
+        the hash of the force constants, the mesh, the temperatures and the settings
+
+    :return: the dictionary of `get_thermal_properties`, with the "mesh"
+    """
+    mesh = list(mesh or get_default_mesh(interpolator))
+    temperatures = default_temperatures if temperatures is None else temperatures
+    temperatures = np.asarray(temperatures, dtype=float)
+    cutoff = default_cutoff if cutoff is None else cutoff
+
+    cache_file = None
+    if cache_dir is not None and interpolator.hash is not None:
+        key = get_cache_key(
+            interpolator, mesh, temperatures, symmetry=symmetry, cutoff=cutoff
+        )
+        cache_file = Path(cache_dir) / f"thermodynamics-{key}.npz"
+        if cache_file.exists():
+            with np.load(cache_file) as cached:
+                return {
+                    name: value.item() if value.ndim == 0 else value
+                    for name, value in cached.items()
+                } | {"mesh": mesh}
+
+    structure = None
+    if symmetry:
+        types = np.unique(interpolator.species, return_inverse=True)[1]
+        structure = (interpolator.cell, interpolator.positions, types)
+    qpoints, weights = get_mesh_qpoints(mesh, structure)
+    frequencies, _ = interpolator.diagonalize(qpoints, eigenvectors=False)
+    properties = get_thermal_properties(frequencies, temperatures, weights, cutoff)
+
+    if cache_file is not None:
+        cache_file.parent.mkdir(parents=True, exist_ok=True)
+        # Replace the file atomically, so that concurrent runs never read a partial file
+        fd, tmp_name = tempfile.mkstemp(
+            dir=cache_file.parent, prefix=".tmp_", suffix=".npz"
+        )
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.savez(f, **properties)
+            os.replace(tmp_name, cache_file)
+        except BaseException:
+            os.unlink(tmp_name)
+            raise
+    return properties | {"mesh": mesh}
@@ -0,0 +1,207 @@
+"""Export the animation of phonon modes in a supercell as trajectory files"""
+
+import argparse
+import json
+
+import numpy as np
+
+from .phonon_web import decode_vectors
+from .utils import open_output, open_text
+
+# Upper bound of the size of the displacements computed at once (in bytes),
+# the frames are streamed to the file in chunks of this size
+chunk_max_bytes = 64 * 1024**2
+
+
+def get_supercell(cell, pos, supercell):
+    """
+    Build the supercell, with the same order of the atoms as the visualizer
+    (loop over the repetitions along a1, a2, a3, then over the atoms of the cell).
+
+    :param cell: 3x3 lattice vectors (angstrom)
+    :param pos: reduced coordinates of the atoms of the cell
+    :param supercell: number of repetitions along each lattice vector
+
+    :return: (supercell lattice vectors, integer translations of shape (ncells, 3),
+        cartesian positions of shape (ncells, natoms, 3))
+    """
+    cell = np.asarray(cell, dtype=float)
+    translations = np.indices(supercell).reshape(3, -1).T
+    red_pos = translations[:, None, :] + np.asarray(pos, dtype=float)[None, :, :]
+    return np.diag(supercell) @ cell, translations, red_pos @ cell
+
+
+def get_mode_displacements(phonon_data, modes, supercell=None, amplitude=1.0):
+    """
+    Compute the complex displacements of the atoms of the supercell for each mode.
+
+    The convention is the one of the visualizer: the eigenvectors are used as they
+    are stored (matdyn.modes eigenvectors, already scaled with the atomic masses), with
+    the phase exp(2 pi i q.(R + tau)), R the translation of the cell and tau the reduced
+    position of the atom. The displacement at the phase angle theta of the
+    oscillation is Re(exp(i theta) * u).
+
+    :param phonon_data: the dictionary of the converted data (as returned by
+        `PhononWebConverter.get_dict` or loaded from the JSON file)
+    :param modes: list of (q-point index, band index) pairs
+    :param supercell: repetitions (default: the "repetitions" of the data)
+    :param amplitude: scale of the displacements (angstrom per unit of eigenvector)
+
+    :return: complex array of shape (nmodes, ncells, natoms, 3)
+    """
+    supercell = supercell or phonon_data["repetitions"]
+    _, translations, _ = get_supercell(
+        phonon_data["lattice"], phonon_data["atom_pos_red"], supercell
+    )
+    iq, iband = np.asarray(modes, dtype=int).reshape(-1, 2).T
+    qpoints = np.asarray(phonon_data["qpoints"], dtype=float)[iq]
+    vectors = decode_vectors(phonon_data)[iq, iband]
+    vectors = vectors[..., 0] + 1j * vectors[..., 1]  # (nmodes, natoms, 3)
+
+    red_pos = translations[:, None, :] + np.asarray(phonon_data["atom_pos_red"])
+    # (nmodes, ncells, natoms)
+    phases = np.exp(2j * np.pi * np.einsum("mk,tak->mta", qpoints, red_pos))
+    return amplitude * phases[..., None] * vectors[:, None, :, :]
+
+
+def iter_frames(displacements, nframes, max_bytes=None):
+    """
+    Iterate over the displacements of the frames of one oscillation period, in chunks
+    of frames, so that the memory does not grow with the number of frames.
+
+    :param displacements: complex displacements of one mode, as returned
+        (for each mode) by `get_mode_displacements`
+    :param nframes: number of frames of the period
+
+    :return: iterator of (index of the first frame, real array of shape
+        (nchunk, ncells, natoms, 3))
+    """
+    max_bytes = max_bytes or chunk_max_bytes
+    chunk_size = max(1, int(max_bytes // (displacements.real.nbytes or 1)))
+    angles = 2 * np.pi * np.arange(nframes) / nframes
+    for start in range(0, nframes, chunk_size):
+        theta = angles[start : start + chunk_size, None, None, None]
+        yield start, np.cos(theta) * displacements.real - np.sin(
+            theta
+        ) * displacements.imag
+
+
+def write_extxyz(file_obj, phonon_data, modes, supercell=None, nframes=20, **kwargs):
+    """
+    Write the frames of the animation of each mode to an extended XYZ file, with the
+    displacement of each atom as an additional property.
+
+    kwargs are passed to `get_mode_displacements`.
+    """
+    supercell = supercell or phonon_data["repetitions"]
+    super_lattice, _, positions = get_supercell(
+        phonon_data["lattice"], phonon_data["atom_pos_red"], supercell
+    )
+    symbols = np.tile(phonon_data["atom_types"], len(positions))
+    natoms_super = len(symbols)
+    lattice_str = " ".join(f"{x:.10f}" for x in super_lattice.flat)
+    # Rows of the frames (species, position, displacement), filled for each frame
+    rows = np.empty((natoms_super, 7), dtype=object)
+    rows[:, 0] = symbols
+    displacements = get_mode_displacements(phonon_data, modes, supercell, **kwargs)
+
+    for (iq, iband), mode_displacements in zip(modes, displacements):
+        for start, frames in iter_frames(mode_displacements, nframes):
+            for iframe, disp in enumerate(frames, start=start):
+                file_obj.write(
+                    f"{natoms_super}\n"
+                    f'Lattice="{lattice_str}" '
+                    "Properties=species:S:1:pos:R:3:displacement:R:3 "
+                    f'pbc="T T T" q_index={iq} band={iband} frame={iframe}\n'
+                )
+                rows[:, 1:4] = (positions + disp).reshape(-1, 3)
+                rows[:, 4:] = disp.reshape(-1, 3)
+                np.savetxt(file_obj, rows, fmt="%-2s" + " %.8f" * 6)
+
+
+def write_npy(filename, phonon_data, modes, supercell=None, nframes=20, **kwargs):
+    """
+    Write the cartesian positions of the frames of the animation of each mode to a
+    binary .npy file, with shape (nmodes, nframes, natoms in the supercell, 3).
+
+    The file is memory-mapped, so that the frames are written to disk as they are
+    computed. kwargs are passed to `get_mode_displacements`.
+    """
+    supercell = supercell or phonon_data["repetitions"]
+    _, _, positions = get_supercell(
+        phonon_data["lattice"], phonon_data["atom_pos_red"], supercell
+    )
+    displacements = get_mode_displacements(phonon_data, modes, supercell, **kwargs)
+    out = np.lib.format.open_memmap(
+        filename,
+        mode="w+",
+        dtype=np.float64,
+        shape=(len(modes), nframes, positions.size // 3, 3),
+    )
+    for imode, mode_displacements in enumerate(displacements):
+        for start, frames in iter_frames(mode_displacements, nframes):
+            out[imode, start : start + len(frames)] = (positions + frames).reshape(
+                len(frames), -1, 3
+            )
+    out.flush()
+    del out
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Export the animation of phonon modes in a supercell as a trajectory."
+    )
+    parser.add_argument(
+        "json_file", help="Converted phonon data (JSON file, possibly compressed)."
+    )
+    parser.add_argument(
+        "out_file",
+        help=(
+            "Output file, extended XYZ (.xyz, or compressed .xyz.gz, .xyz.xz, "
+            ".xyz.zst) or binary numpy (.npy)."
+        ),
+    )
+    parser.add_argument(
+        "--mode",
+        nargs=2,
+        type=int,
+        action="append",
+        required=True,
+        metavar=("Q_INDEX", "BAND"),
+        help="Mode to export, can be given multiple times.",
+    )
+    parser.add_argument(
+        "--supercell",
+        nargs=3,
+        type=int,
+        help="Repetitions of the cell (default: the repetitions of the data).",
+    )
+    parser.add_argument(
+        "--nframes",
+        type=int,
+        default=20,
+        help="Number of frames per oscillation period (default: 20).",
+    )
+    parser.add_argument(
+        "--amplitude",
+        type=float,
+        default=1.0,
+        help="Scale of the displacements, in angstrom (default: 1.0).",
+    )
+    args = parser.parse_args()
+
+    with open_text(args.json_file) as f:
+        phonon_data = json.load(f)
+    kwargs = dict(
+        supercell=args.supercell, nframes=args.nframes, amplitude=args.amplitude
+    )
+    if args.out_file.endswith(".npy"):
+        write_npy(args.out_file, phonon_data, args.mode, **kwargs)
+    else:
+        with open_output(args.out_file) as f:
+            write_extxyz(f, phonon_data, args.mode, **kwargs)
+    print(f"Saved {args.out_file}")
+
+
+if __name__ == "__main__":
+    main()
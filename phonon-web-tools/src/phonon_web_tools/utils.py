@@ -1,8 +1,27 @@
+import io
 import json
 import math
+import os
+import tempfile
+from pathlib import Path
 
 import numpy as np
-from ase.data import chemical_symbols
+
+# Element symbols indexed by atomic number (same table as `ase.data`), bundled
+# so that importing this module does not require ASE.
+# fmt: off
+chemical_symbols = [
+    "X", "H", "He", "Li", "Be", "B", "C", "N", "O", "F", "Ne", "Na", "Mg", "Al", "Si",
+    "P", "S", "Cl", "Ar", "K", "Ca", "Sc", "Ti", "V", "Cr", "Mn", "Fe", "Co", "Ni",
+    "Cu", "Zn", "Ga", "Ge", "As", "Se", "Br", "Kr", "Rb", "Sr", "Y", "Zr", "Nb", "Mo",
+    "Tc", "Ru", "Rh", "Pd", "Ag", "Cd", "In", "Sn", "Sb", "Te", "I", "Xe", "Cs", "Ba",
+    "La", "Ce", "Pr", "Nd", "Pm", "Sm", "Eu", "Gd", "Tb", "Dy", "Ho", "Er", "Tm", "Yb",
+    "Lu", "Hf", "Ta", "W", "Re", "Os", "Ir", "Pt", "Au", "Hg", "Tl", "Pb", "Bi", "Po",
+    "At", "Rn", "Fr", "Ra", "Ac", "Th", "Pa", "U", "Np", "Pu", "Am", "Cm", "Bk", "Cf",
+    "Es", "Fm", "Md", "No", "Lr", "Rf", "Db", "Sg", "Bh", "Hs", "Mt", "Ds", "Rg", "Cn",
+    "Nh", "Fl", "Mc", "Lv", "Ts", "Og"
+]
+# fmt: on
 
 chem_symbol_to_number = {s: i for i, s in enumerate(chemical_symbols) if s != "X"}
 
@@ -19,6 +38,193 @@ class JsonEncoder(json.JSONEncoder):
         return json.JSONEncoder.default(self, obj)
 
 
+# Compressed formats, detected from their first bytes when reading, and from the
+# suffix of the file name when writing
+compression_magic = {
+    "gz": b"\x1f\x8b",
+    "xz": b"\xfd7zXZ\x00",
+    "zst": b"\x28\xb5\x2f\xfd",
+}
+
+
+def get_compression(head):
+    """
+    Return the compression ("gz", "xz" or "zst") of a file from its first bytes,
+    or None if it is not compressed.
+    """
+    for compression, magic in compression_magic.items():
+        if head.startswith(magic):
+            return compression
+    return None
+
+
+def get_suffix_compression(path):
+    "Return the compression of a file to write from its suffix (e.g. .json.gz), or None."
+    suffix = Path(path).suffix[1:]
+    return suffix if suffix in compression_magic else None
+
+
+def get_compressed_path(path):
+    """
+    Return path if it exists, otherwise its compressed version (path.gz, .xz or .zst)
+    if there is one, otherwise path.
+    """
+    path = Path(path)
+    if path.exists():
+        return path
+    for compression in compression_magic:
+        compressed = path.with_name(f"{path.name}.{compression}")
+        if compressed.exists():
+            return compressed
+    return path
+
+
+def strip_compression_suffix(path):
+    "Return the name of the file without the compression suffix, if any."
+    path = Path(path)
+    return path.stem if get_suffix_compression(path) else path.name
+
+
+def _zstandard():
+    try:
+        import zstandard
+    except ImportError as exc:
+        raise ImportError("The zstandard package is needed for .zst files") from exc
+    return zstandard
+
+
+class DecompressedTextIO(io.TextIOWrapper):
+    """
+    Text stream decompressing a binary file object incrementally, while it is read.
+    Closing it also closes the binary file object if close_source is True.
+    """
+
+    def __init__(self, source, compression, close_source=False):
+        if compression == "gz":
+            import gzip
+
+            decompressor = gzip.GzipFile(fileobj=source, mode="rb")
+        elif compression == "xz":
+            import lzma
+
+            decompressor = lzma.LZMAFile(source, mode="rb")
+        elif compression == "zst":
+            decompressor = _zstandard().ZstdDecompressor().stream_reader(source)
+        else:
+            raise ValueError(f"Unknown compression {compression}")
+        super().__init__(decompressor)
+        self.compression = compression
+        self.source = source
+        self.close_source = close_source
+
+    def close(self):
+        super().close()
+        if self.close_source:
+            self.source.close()
+
+
+def open_decompressed(file_obj):
+    """
+    Return a text stream decompressing file_obj on the fly if it is a compressed
+    file (gzip, xz or zstd, detected from its first bytes), or file_obj as it is.
+
+    Only files that were not read yet (opened from disk, in text or binary mode)
+    can be detected, other file-like objects (e.g. StringIO) are returned as they are.
+    """
+    if isinstance(file_obj, DecompressedTextIO):
+        return file_obj
+    source = getattr(file_obj, "buffer", file_obj)
+    if not hasattr(source, "peek"):
+        return file_obj
+    compression = get_compression(source.peek(8)[:8])
+    if compression is None:
+        return file_obj
+    return DecompressedTextIO(source, compression)
+
+
+def open_text(path):
+    """
+    Open a file to read as text, decompressing it on the fly if it is compressed
+    (see `open_decompressed`). If path does not exist, its compressed version
+    path.gz, .xz or .zst is opened.
+    """
+    path = get_compressed_path(path)
+    with open(path, "rb") as f:
+        compression = get_compression(f.read(8))
+    if compression is None:
+        return open(path)
+    return DecompressedTextIO(open(path, "rb"), compression, close_source=True)
+
+
+class CompressedTextIO(io.TextIOWrapper):
+    """
+    Text stream compressing what is written to a binary file object. Closing it
+    also closes the binary file object if close_target is True.
+    """
+
+    def __init__(self, target, compression, close_target=False):
+        if compression == "gz":
+            import gzip
+
+            # mtime=0 gives the same file for the same data
+            compressor = gzip.GzipFile(fileobj=target, mode="wb", mtime=0)
+        elif compression == "xz":
+            import lzma
+
+            compressor = lzma.LZMAFile(target, mode="wb")
+        elif compression == "zst":
+            compressor = (
+                _zstandard().ZstdCompressor().stream_writer(target, closefd=False)
+            )
+        else:
+            raise ValueError(f"Unknown compression {compression}")
+        super().__init__(compressor)
+        self.compression = compression
+        self.target = target
+        self.close_target = close_target
+
+    def close(self):
+        super().close()
+        if self.close_target:
+            self.target.close()
+
+
+def open_output(path):
+    """
+    Open a file to write as text, compressed if its name ends with .gz, .xz or .zst.
+    """
+    compression = get_suffix_compression(path)
+    if compression is None:
+        return open(path, "w", newline="")
+    return CompressedTextIO(open(path, "wb"), compression, close_target=True)
+
+
+def write_json_atomic(data, out_file):
+    """
+    Write the data as compact JSON, replacing out_file atomically: readers
+    see either the old or the new file, never a partially written one.
+    The file is compressed if its name ends with .gz, .xz or .zst.
+    """
+    out_dir = os.path.dirname(os.path.abspath(out_file))
+    fd, tmp_name = tempfile.mkstemp(dir=out_dir, prefix=".tmp_", suffix=".json")
+    compression = get_suffix_compression(out_file)
+    try:
+        if compression is None:
+            with os.fdopen(fd, "w") as f:
+                json.dump(data, f, separators=(",", ":"))
+        else:
+            with os.fdopen(fd, "wb") as raw, CompressedTextIO(raw, compression) as f:
+                json.dump(data, f, separators=(",", ":"))
+        # mkstemp creates the file readable only by the owner, use the usual permissions
+        umask = os.umask(0)
+        os.umask(umask)
+        os.chmod(tmp_name, 0o666 & ~umask)
+        os.replace(tmp_name, out_file)
+    except BaseException:
+        os.unlink(tmp_name)
+        raise
+
+
 # helper function to safely reduce file size.
 def normalize_numbers(obj, eps=1e-8):
     if isinstance(obj, list):
@@ -0,0 +1,199 @@
+"""Watch QE phonon folders and convert them again, incrementally, when their files change"""
+
+import importlib
+import json
+import os
+import time
+from pathlib import Path
+
+from . import get_modes_paths
+from .qe_phonon_tools import (
+    convert_matdyn_data,
+    read_and_process_scf_in,
+    read_and_process_scf_out,
+    read_matdyn,
+)
+from .utils import get_compressed_path, open_text, write_json_atomic
+
+
+def get_file_stamp(path):
+    """
+    Return a stamp that changes when the file (or its compressed version, see
+    `get_compressed_path`) is modified, or None if it does not exist.
+    """
+    path = get_compressed_path(path)
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (path.name, stat.st_mtime_ns, stat.st_size)
+
+
+class FolderWatcher:
+    """
+    Keep the parsed data of a QE phonon folder in memory, and redo only the stages
+    affected by the files that changed since the last update:
+
+    - scf.in: everything (the structure and number of atoms are used by all stages)
+    - scf.out: the check of the cell and alat, and the conversion
+    - each modes file: the parsing of that file, and the conversion
+    - highsym_qpts.json: only the conversion (labels and discontinuities)
+    """
+
+    def __init__(
+        self,
+        folder: Path,
+        fname_scf_in="scf.in",
+        fname_scf_out="scf.out",
+        fname_modes="matdyn.modes",
+        fname_highsym_qpts="highsym_qpts.json",
+        out_file: Path | None = None,
+        n_workers=1,
+        scf_in_format="qeinp-qetools",
+        eigenvalues_only=False,
+        compression=None,
+        **kwargs,
+    ):
+        """
+        The parameters are the same as `convert_qe_phonon_folder`.
+        """
+        self.folder = Path(folder)
+        self.scf_in_path = self.folder / fname_scf_in
+        self.scf_out_path = self.folder / fname_scf_out
+        self.fname_modes = fname_modes
+        self.highsym_qpts_path = self.folder / fname_highsym_qpts
+        if out_file:
+            self.out_file = Path(out_file)
+        else:
+            self.out_file = self.folder / "phonon_vis.json"
+            if compression:
+                self.out_file = self.out_file.with_name(
+                    f"phonon_vis.json.{compression}"
+                )
+        self.n_workers = n_workers
+        self.scf_in_format = scf_in_format
+        self.eigenvalues_only = eigenvalues_only
+        self.kwargs = kwargs
+
+        self.stamps = {}
+        self.scf_in_data = None
+        self.scf_out_data = None
+        self.highsym_qpts = None
+        self.highsym_qpts_loaded = False
+        self.modes_data = {}  # path: (eig, vec, qpt)
+
+    def update(self):
+        """
+        Check the files of the folder, and if any changed redo the affected stages and
+        write the output file.
+
+        :return: True if the output file was written
+        """
+        # A glob pattern is resolved again at each update, to pick up new segments
+        missing_modes = None
+        try:
+            modes_paths = get_modes_paths(self.folder, self.fname_modes)
+        except FileNotFoundError as exc:
+            modes_paths = []
+            missing_modes = exc
+        segmented = isinstance(modes_paths, list)
+        if not segmented:
+            modes_paths = [modes_paths]
+
+        paths = [self.scf_in_path, self.scf_out_path, self.highsym_qpts_path]
+        stamps = {path: get_file_stamp(path) for path in paths + modes_paths}
+        changed = {path for path in stamps if stamps[path] != self.stamps.get(path)}
+        # Removed modes files also change the merged path
+        removed = set(self.modes_data) - set(modes_paths)
+        if not changed and not removed:
+            return False
+        self.stamps = stamps
+
+        if self.scf_in_path in changed:
+            self.scf_in_data = None
+            self.scf_out_data = None
+            self.modes_data = {}
+        if self.scf_out_path in changed:
+            self.scf_out_data = None
+        if self.highsym_qpts_path in changed:
+            self.highsym_qpts_loaded = False
+        for path in changed.union(removed):
+            self.modes_data.pop(path, None)
+
+        try:
+            if missing_modes is not None:
+                raise missing_modes
+            for path in [self.scf_in_path, self.scf_out_path] + modes_paths:
+                if stamps[path] is None:
+                    raise FileNotFoundError(f"Missing file {path}")
+
+            if self.scf_in_data is None:
+                print(f"Parsing {self.scf_in_path}")
+                with open_text(self.scf_in_path) as f:
+                    self.scf_in_data = read_and_process_scf_in(
+                        f, fileformat=self.scf_in_format
+                    )
+            if self.scf_out_data is None:
+                print(f"Parsing {self.scf_out_path}")
+                with open_text(self.scf_out_path) as f:
+                    self.scf_out_data = read_and_process_scf_out(f, self.scf_in_data)
+            natoms = len(self.scf_in_data["atom_numbers"])
+            for path in modes_paths:
+                if path not in self.modes_data:
+                    print(f"Parsing {path}")
+                    with open_text(path) as f:
+                        self.modes_data[path] = read_matdyn(
+                            f,
+                            natoms,
+                            n_workers=self.n_workers,
+                            eigenvectors=not self.eigenvalues_only,
+                        )
+            if not self.highsym_qpts_loaded:
+                self.highsym_qpts = None
+                if stamps[self.highsym_qpts_path] is not None:
+                    print(f"Parsing {self.highsym_qpts_path}")
+                    self.highsym_qpts = json.loads(self.highsym_qpts_path.read_text())
+                self.highsym_qpts_loaded = True
+
+            matdyn_raw = [self.modes_data[path] for path in modes_paths]
+            if not segmented:
+                matdyn_raw = matdyn_raw[0]
+            phonon_data = convert_matdyn_data(
+                self.scf_in_data,
+                self.scf_out_data,
+                matdyn_raw,
+                highsym_qpts=self.highsym_qpts,
+                **self.kwargs,
+            )
+        except Exception as exc:  # pylint: disable=broad-except
+            # Keep watching: the stages that failed are redone at the next change
+            print(f"Error while converting {self.folder}: {exc}")
+            return False
+
+        write_json_atomic(phonon_data, self.out_file)
+        print(f"Saved {self.out_file}")
+        return True
+
+
+def watch_folders(folders, interval=1.0, **kwargs):
+    """
+    Convert the folders, then keep polling their files every `interval` seconds and
+    convert again incrementally (see `FolderWatcher`) when they change.
+    Runs until interrupted (Ctrl+C).
+
+    kwargs are passed to `FolderWatcher`.
+    """
+    # Load the backends once, so that the updates do not pay the import time
+    importlib.import_module("seekpath")
+    if kwargs.get("scf_in_format", "qeinp-qetools") == "qeinp-qetools":
+        importlib.import_module("qe_tools")
+
+    watchers = [FolderWatcher(folder, **kwargs) for folder in folders]
+    print(f"Watching {len(watchers)} folder(s), press Ctrl+C to stop")
+    try:
+        while True:
+            for watcher in watchers:
+                watcher.update()
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        pass
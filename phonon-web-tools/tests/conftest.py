@@ -0,0 +1,29 @@
+import shutil
+from pathlib import Path
+
+import pytest
+
+data_folder = Path(__file__).parent.parent.parent / "data"
+
+
+@pytest.fixture
+def data_dir():
+    "Folder with the example materials"
+    return data_folder
+
+
+@pytest.fixture
+def copy_example(tmp_path):
+    "Copy an example folder to a temporary folder, where it can be modified"
+
+    def copy(name, files=None):
+        folder = tmp_path / name
+        if files is None:
+            shutil.copytree(data_folder / name, folder)
+        else:
+            folder.mkdir()
+            for fname in files:
+                shutil.copy(data_folder / name / fname, folder / fname)
+        return folder
+
+    return copy
@@ -0,0 +1,182 @@
+import threading
+
+import numpy as np
+import pytest
+
+from phonon_web_tools import convert_qe_phonon_folder
+from phonon_web_tools.band_service import (
+    BandService,
+    DiagonalizationBatcher,
+    InterpolatorCache,
+)
+from phonon_web_tools.qe_phonon_tools import read_matdyn
+from phonon_web_tools.store import PhononStore
+
+
+@pytest.fixture
+def store_path(copy_example, tmp_path):
+    store_path = tmp_path / "phonons.sqlite"
+    with PhononStore(store_path) as store:
+        for name in ["graphene", "BN"]:
+            convert_qe_phonon_folder(copy_example(name), store=store)
+        convert_qe_phonon_folder(
+            copy_example("diamond", ["scf.in", "scf.out", "matdyn.modes"]),
+            store=store,
+        )
+    return store_path
+
+
+def test_bands_at_the_vertices_match_matdyn(store_path, data_dir):
+    service = BandService(store_path, batch_window=0)
+    # Γ, M, K, Γ, as in the matdyn.x path of the example
+    vertices = [[0, 0, 0], [0.5, 0, 0], [1 / 3, 1 / 3, 0], [0, 0, 0]]
+    bands = service.get_bands("graphene", vertices, ["Γ", "M", "K", "Γ"], density=30)
+
+    indexes = [index for index, _ in bands["highsym_qpts"]]
+    assert [label for _, label in bands["highsym_qpts"]] == ["Γ", "M", "K", "Γ"]
+    assert indexes[-1] == len(bands["qpoints"]) - 1
+    assert np.allclose(np.array(bands["qpoints"])[indexes], vertices)
+    assert np.array(bands["vectors"]).shape == (len(bands["qpoints"]), 6, 2, 3, 2)
+
+    with open(data_dir / "graphene" / "matdyn.modes") as f:
+        eig, _, _ = read_matdyn(f, 2, eigenvectors=False)
+    expected = np.sort(eig[[0, 20, 40, 60]])
+    computed = np.sort(np.array(bands["eigenvalues"])[indexes])
+    assert np.allclose(computed, expected, atol=1e-2)
+
+
+def test_seekpath_path(store_path):
+    service = BandService(store_path, batch_window=0)
+    bands = service.get_bands("BN", density=10)
+    labels = [label for _, label in bands["highsym_qpts"]]
+    assert labels[0] == "G"
+    # 2D: only the segments in the plane
+    assert np.allclose(np.array(bands["qpoints"])[:, 2], 0)
+
+
+def test_interpolators_are_cached(store_path, monkeypatch):
+    service = BandService(store_path, batch_window=0)
+    first = service.get_bands("graphene", [[0, 0, 0], [0.5, 0, 0]])
+    assert len(service.cache) == 1
+
+    def fail(*args, **kwargs):
+        raise AssertionError("The force constants should not be parsed again")
+
+    monkeypatch.setattr("phonon_web_tools.band_service.read_force_constants", fail)
+    second = service.get_bands("graphene", [[0, 0, 0], [0.5, 0, 0]])
+    assert second == first
+
+
+def test_new_settings_are_used(store_path):
+    service = BandService(store_path, batch_window=0)
+    gamma = [[0, 0, 0], [0.5, 0, 0]]
+    with_asr = service.get_bands("BN", gamma)
+    assert np.allclose(with_asr["eigenvalues"][0][:3], 0, atol=1e-3)
+
+    with PhononStore(store_path) as store:
+        text, settings = store.get_force_constants("BN")
+        assert store.put_force_constants("BN", text, dict(settings, asr="no"))
+    without_asr = service.get_bands("BN", gamma)
+    fresh = BandService(store_path, batch_window=0).get_bands("BN", gamma)
+    assert without_asr == fresh
+    assert np.abs(without_asr["eigenvalues"][0][:3]).max() > 1
+
+
+def test_missing_force_constants(store_path):
+    service = BandService(store_path)
+    with pytest.raises(KeyError, match="no force constants"):
+        service.get_bands("diamond")
+    with pytest.raises(KeyError):
+        service.get_bands("missing")
+
+
+class FakeInterpolator:
+    def __init__(self, nbytes=1):
+        self.nbytes = nbytes
+        self.calls = []
+
+    def diagonalize(self, qpoints, directions=None):
+        self.calls.append((qpoints, directions))
+        return qpoints.sum(axis=1, keepdims=True), directions[:, None, :]
+
+
+def test_cache_memory_bound():
+    cache = InterpolatorCache(max_bytes=10)
+    cache.get("a", lambda: FakeInterpolator(4))
+    cache.get("b", lambda: FakeInterpolator(4))
+    cache.get("a", lambda: FakeInterpolator(4))  # a is now the most recent
+    cache.get("c", lambda: FakeInterpolator(4))
+    assert list(cache.interpolators) == ["a", "c"]
+    assert cache.nbytes == 8
+    # the most recent one is kept even if it exceeds the bound
+    cache.get("d", lambda: FakeInterpolator(20))
+    assert list(cache.interpolators) == ["d"]
+
+
+def test_cache_builds_once_concurrently():
+    cache = InterpolatorCache()
+    built = []
+
+    def factory():
+        built.append(1)
+        return FakeInterpolator()
+
+    threads = [
+        threading.Thread(target=cache.get, args=("a", factory)) for _ in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(built) == 1
+
+
+def test_batcher_shares_one_diagonalization():
+    batcher = DiagonalizationBatcher(batch_window=0.2)
+    interpolator = FakeInterpolator()
+    rng = np.random.default_rng(0)
+    requests = [
+        (rng.uniform(size=(n, 3)), rng.uniform(size=(n, 3))) for n in [3, 1, 5, 2]
+    ]
+    results = [None] * len(requests)
+
+    def request(i):
+        qpoints, directions = requests[i]
+        results[i] = batcher.diagonalize("key", interpolator, qpoints, directions)
+
+    threads = [threading.Thread(target=request, args=(i,)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(interpolator.calls) == 1
+    for (qpoints, directions), (frequencies, displacements) in zip(requests, results):
+        assert np.array_equal(frequencies[:, 0], qpoints.sum(axis=1))
+        assert np.array_equal(displacements[:, 0], directions)
+
+    # without directions, the q-points have no direction
+    _, displacements = batcher.diagonalize("key", interpolator, np.ones((2, 3)))
+    assert np.array_equal(displacements[:, 0], np.zeros((2, 3)))
+
+
+def test_batcher_errors_reach_all_requests():
+    class Broken:
+        def diagonalize(self, qpoints, directions=None):
+            raise RuntimeError("broken")
+
+    batcher = DiagonalizationBatcher(batch_window=0.1)
+    errors = []
+
+    def request():
+        try:
+            batcher.diagonalize("key", Broken(), np.zeros((1, 3)))
+        except RuntimeError as exc:
+            errors.append(exc)
+
+    threads = [threading.Thread(target=request) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(errors) == 3
@@ -0,0 +1,160 @@
+import io
+import json
+
+import numpy as np
+import pytest
+
+from phonon_web_tools import convert_qe_phonon_folder
+from phonon_web_tools.force_constants import (
+    get_path_directions,
+    impose_asr_all,
+    load_interpolator,
+    read_force_constants,
+    read_matdyn_settings,
+)
+from phonon_web_tools.qe_phonon_tools import read_matdyn
+
+fc_examples = ["AgNO2", "BN", "Bi", "MoS2", "P", "PbI2", "PbTe", "graphene"]
+
+
+def load_example(folder, **kwargs):
+    with open(folder / "real_space_force_constants.dat") as f1, open(
+        folder / "matdyn.in"
+    ) as f2:
+        return load_interpolator(f1, f2, **kwargs)
+
+
+def read_band_qpoints(matdyn_in):
+    """
+    Return the q-points computed by matdyn.x for a q-list in band form (crystal
+    coordinates): the modes file only has them with 4 decimals.
+    """
+    lines = [line for line in matdyn_in.split("/", 1)[1].splitlines() if line.strip()]
+    rows = [line.split() for line in lines[1 : int(lines[0]) + 1]]
+    vertices = np.array([row[:3] for row in rows], dtype=float)
+    qpoints = [
+        start + (end - start) * i / int(row[3])
+        for start, end, row in zip(vertices[:-1], vertices[1:], rows)
+        for i in range(int(row[3]))
+    ]
+    return np.array(qpoints + [vertices[-1]])
+
+
+@pytest.mark.parametrize("name", fc_examples)
+def test_frequencies_match_matdyn(data_dir, name):
+    folder = data_dir / name
+    interpolator = load_example(folder)
+    with open(folder / "matdyn.modes") as f:
+        eig, _, qpt = read_matdyn(f, interpolator.nat, eigenvectors=False)
+    qpoints = read_band_qpoints((folder / "matdyn.in").read_text())
+    assert np.allclose(qpoints @ interpolator.bg, qpt, rtol=0, atol=1e-4)
+
+    frequencies, _ = interpolator.diagonalize(qpoints, eigenvectors=False)
+    assert np.allclose(np.sort(frequencies), np.sort(eig), rtol=0, atol=1e-2)
+
+
+@pytest.mark.parametrize("name", ["BN", "PbTe", "graphene"])
+def test_asr_all_on_total_force_constants(data_dir, name):
+    folder = data_dir / name
+    interpolator = load_example(folder)
+    assert interpolator.asr == "all"
+    with open(folder / "real_space_force_constants.dat") as f:
+        fc_data = read_force_constants(f)
+    long_range = None
+    if interpolator.zeu is not None:
+        long_range = interpolator.get_long_range_force_constants()
+    total = impose_asr_all(
+        fc_data["frc"], interpolator.at, interpolator.mesh, interpolator.tau, long_range
+    )
+    if long_range is not None:
+        total += long_range
+    # translational invariance: sum over the cells and the second atom
+    assert np.allclose(total.sum(axis=(0, 1, 2, 6)), 0, atol=1e-10)
+    # symmetry of the indexes: C(R, i, j, a, b) = C(-R, j, i, b, a)
+    exchanged = np.roll(total[::-1, ::-1, ::-1], 1, axis=(0, 1, 2))
+    assert np.allclose(total, exchanged.transpose(0, 1, 2, 4, 3, 6, 5), atol=1e-10)
+
+    frequencies, _ = interpolator.diagonalize([[0, 0, 0]], eigenvectors=False)
+    assert np.allclose(frequencies[0, :3], 0, atol=1e-3)
+
+
+@pytest.mark.parametrize("name", ["BN", "PbTe"])
+def test_asr_crystal(data_dir, name):
+    folder = data_dir / name
+    with open(folder / "real_space_force_constants.dat") as f:
+        fc_data = read_force_constants(f)
+    interpolator = load_example(folder, asr="crystal")
+    frc = impose_asr_all(
+        fc_data["frc"],
+        interpolator.at,
+        interpolator.mesh,
+        interpolator.tau,
+        rotational=False,
+    )
+    assert np.allclose(frc.sum(axis=(0, 1, 2, 6)), 0, atol=1e-10)
+    exchanged = np.roll(frc[::-1, ::-1, ::-1], 1, axis=(0, 1, 2))
+    assert np.allclose(frc, exchanged.transpose(0, 1, 2, 4, 3, 6, 5), atol=1e-10)
+
+    frequencies, _ = interpolator.diagonalize([[0, 0, 0]], eigenvectors=False)
+    assert np.allclose(frequencies[0, :3], 0, atol=1e-3)
+    # away from Gamma, it is close to the other sum rules
+    qpoints = [[0.5, 0, 0], [1 / 3, 1 / 3, 0]]
+    frequencies, _ = interpolator.diagonalize(qpoints, eigenvectors=False)
+    reference, _ = load_example(folder).diagonalize(qpoints, eigenvectors=False)
+    assert np.allclose(frequencies, reference, atol=1)
+
+
+@pytest.mark.parametrize(
+    "name, settings", [("BN", {}), ("MoS2", {}), ("BN", {"loto_2d": False})]
+)
+def test_group_velocities_match_finite_differences(data_dir, name, settings):
+    interpolator = load_example(data_dir / name, **settings)
+    rng = np.random.default_rng(0)
+    qpoints = rng.uniform(-0.5, 0.5, (5, 3))
+    qpoints[:, 2] = 0
+    frequencies, velocities, _ = interpolator.get_group_velocities(qpoints)
+
+    step = 1e-5  # 1/angstrom
+    qcart = qpoints @ interpolator.rec
+    inv_rec = np.linalg.inv(interpolator.rec)
+    derivatives = []
+    for direction in np.eye(3):
+        plus, _ = interpolator.diagonalize((qcart + step * direction) @ inv_rec)
+        minus, _ = interpolator.diagonalize((qcart - step * direction) @ inv_rec)
+        derivatives.append((plus - minus) / (2 * step))
+    # cm^-1 angstrom to km/s
+    expected = np.stack(derivatives, axis=-1) * 2 * np.pi * 299792.458 * 1e-8
+    assert np.allclose(velocities, expected, rtol=1e-4, atol=1e-5)
+
+
+def test_path_directions():
+    qpoints = np.array([[0, 0, 0], [1, 0, 0], [2, 0, 0], [2, 1, 0], [2, 3, 0]])
+    directions = get_path_directions(qpoints, discont_indexes=[2])
+    assert np.allclose(directions[:3], [[1, 0, 0]] * 3)
+    assert np.allclose(directions[3:], [[0, 1, 0]] * 2)
+    assert np.allclose(get_path_directions(qpoints[:1]), 0)
+
+
+def test_matdyn_settings():
+    text = "&input\n  asr='ALL', ! comment\n  loto_2d = .true.\n  flfrc='x'\n/\n"
+    assert read_matdyn_settings(io.StringIO(text)) == {"asr": "all", "loto_2d": True}
+    # no acoustic sum rule by default, as in matdyn.x
+    assert read_matdyn_settings(io.StringIO("&INPUT\n/\n")) == {"asr": "no"}
+    with pytest.raises(ValueError):
+        read_matdyn_settings(io.StringIO("asr = 'all'"))
+
+
+def test_unsupported_asr(data_dir):
+    with pytest.raises(ValueError, match="asr"):
+        load_example(data_dir / "graphene", asr="one-dim")
+
+
+def test_converted_group_velocities(copy_example):
+    folder = copy_example("graphene")
+    out_file = folder / "phonon_vis.json"
+    convert_qe_phonon_folder(folder, group_velocities=True, out_file=out_file)
+    phonon_data = json.loads(out_file.read_text())
+    velocities = np.array(phonon_data["group_velocities"])
+    assert velocities.shape == (len(phonon_data["qpoints"]), 6, 3)
+    # speed of sound of the longitudinal acoustic mode of graphene, about 21 km/s
+    assert 15 < np.linalg.norm(velocities[1], axis=1).max() < 25
@@ -0,0 +1,41 @@
+import json
+import subprocess
+import sys
+
+import pytest
+
+heavy_modules = ["ase", "pymatgen", "qe_tools", "seekpath"]
+
+
+def get_loaded_modules(snippet):
+    "Return the modules loaded by running the snippet in a fresh interpreter."
+    result = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            snippet + "\nimport sys, json\nprint(json.dumps(list(sys.modules)))",
+        ],
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    return {name.split(".")[0] for name in json.loads(result.stdout.splitlines()[-1])}
+
+
+@pytest.mark.parametrize(
+    "module",
+    ["phonon_web_tools", "phonon_web_tools.cli", "phonon_web_tools.qe_phonon_tools"],
+)
+def test_import_does_not_load_backends(module):
+    loaded = get_loaded_modules(f"import {module}")
+    assert not loaded & set(heavy_modules)
+
+
+def test_backend_loaded_when_needed(data_dir):
+    snippet = (
+        "from phonon_web_tools.qe_phonon_tools import read_and_process_scf_in\n"
+        f"read_and_process_scf_in(open({str(data_dir / 'graphene' / 'scf.in')!r}))"
+    )
+    loaded = get_loaded_modules(snippet)
+    assert "qe_tools" in loaded
+    assert not loaded & {"ase", "pymatgen"}
@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+
+from phonon_web_tools import qe_phonon_tools
+from phonon_web_tools.qe_phonon_tools import (
+    read_matdyn,
+    read_matdyn_parallel,
+    read_matdyn_serial,
+)
+
+# (folder, number of atoms)
+examples = [("graphene", 2), ("AgNO2", 4), ("CdNNi3", 5)]
+
+
+@pytest.fixture(autouse=True)
+def parallel_small_files(monkeypatch):
+    "Parse even the small example files in parallel"
+    monkeypatch.setattr(qe_phonon_tools, "matdyn_parallel_min_lines", 10)
+
+
+@pytest.mark.parametrize("folder, natoms", examples)
+@pytest.mark.parametrize("eigenvectors", [True, False])
+def test_parallel_matches_serial(data_dir, folder, natoms, eigenvectors):
+    path = data_dir / folder / "matdyn.modes"
+    with open(path) as f:
+        serial = read_matdyn_serial(f, natoms, eigenvectors=eigenvectors)
+    with open(path) as f:
+        parallel = read_matdyn_parallel(f, natoms, 3, eigenvectors=eigenvectors)
+
+    assert parallel is not None
+    for serial_array, parallel_array in zip(serial, parallel):
+        if not eigenvectors and serial_array is None:
+            assert parallel_array is None
+            continue
+        assert serial_array.shape == parallel_array.shape
+        assert np.array_equal(serial_array, parallel_array)
+
+
+def test_more_workers_than_qpoints(data_dir):
+    path = data_dir / "graphene" / "matdyn.modes"
+    with open(path) as f:
+        serial = read_matdyn(f, 2)
+    with open(path) as f:
+        parallel = read_matdyn(f, 2, n_workers=1000)
+    for serial_array, parallel_array in zip(serial, parallel):
+        assert np.array_equal(serial_array, parallel_array)
+
+
+def test_parallel_falls_back_to_serial(data_dir):
+    path = data_dir / "graphene" / "matdyn.modes"
+    with open(path) as f:
+        # Not a file on disk
+        assert read_matdyn_parallel(iter(f.readlines()), 2, 4) is None
+    with open(path) as f:
+        # Wrong number of atoms: the layout does not match, the serial path reports it
+        assert read_matdyn_parallel(f, 3, 4) is None
+    with open(path) as f, pytest.raises(ValueError, match="number of atoms"):
+        read_matdyn(f, 3, n_workers=4)
@@ -0,0 +1,119 @@
+import json
+
+import numpy as np
+import pytest
+
+from phonon_web_tools import convert_qe_phonon_folder, get_modes_paths
+from phonon_web_tools.qe_phonon_tools import (
+    get_matdyn_block_length,
+    merge_matdyn_segments,
+)
+
+natoms = 2  # graphene
+
+
+def write_segments(folder, ranges):
+    """
+    Split the matdyn.modes file of the folder into one file per range of q-points
+    (start, stop), as written by separate matdyn.x runs.
+    """
+    lines = (folder / "matdyn.modes").read_text().splitlines(keepends=True)
+    stride = get_matdyn_block_length(natoms)
+    for i, (start, stop) in enumerate(ranges):
+        # the last block of a file has no lines after its final separator
+        blocks = lines[2 + start * stride : 2 + stop * stride - 2]
+        (folder / f"matdyn.modes.{i + 1}").write_text("".join(lines[:2] + blocks))
+
+
+def convert(folder, **kwargs):
+    out_file = folder / "out.json"
+    convert_qe_phonon_folder(folder, out_file=out_file, **kwargs)
+    return json.loads(out_file.read_text())
+
+
+@pytest.mark.parametrize("n_workers", [1, 2])
+def test_shared_endpoints_match_single_file(copy_example, n_workers):
+    folder = copy_example("graphene")
+    single = convert(folder)
+
+    # Γ-M, M-K and K-Γ, each segment starting where the previous one ends
+    write_segments(folder, [(0, 21), (20, 41), (40, 61)])
+    (folder / "highsym_qpts.json").write_text(
+        json.dumps(
+            [[[0, "Γ"], [20, "M"]], [[0, "M"], [20, "K"]], [[0, "K"], [20, "Γ"]]]
+        )
+    )
+    merged = convert(folder, fname_modes="matdyn.modes.*", n_workers=n_workers)
+
+    assert merged == single
+
+
+def test_labels_of_the_merged_path(copy_example):
+    folder = copy_example("graphene")
+    single = convert(folder)
+
+    # labels given for the merged path instead of per segment
+    write_segments(folder, [(0, 21), (20, 61)])
+    merged = convert(folder, fname_modes=["matdyn.modes.1", "matdyn.modes.2"])
+
+    assert merged == single
+
+
+def test_natural_order_of_the_segments(tmp_path):
+    for i in [1, 2, 10]:
+        (tmp_path / f"matdyn.modes.{i}").touch()
+    paths = get_modes_paths(tmp_path, "matdyn.modes.*")
+    assert [path.name for path in paths] == [
+        "matdyn.modes.1",
+        "matdyn.modes.2",
+        "matdyn.modes.10",
+    ]
+    with pytest.raises(FileNotFoundError):
+        get_modes_paths(tmp_path, "missing.*")
+
+
+def get_segment(qpoints, nphons=3):
+    qpt = np.array(qpoints, dtype=float)
+    eig = np.arange(len(qpt) * nphons, dtype=float).reshape(len(qpt), nphons)
+    vec = np.ones((len(qpt), nphons, 1, 3), dtype=complex)
+    return eig, vec, qpt
+
+
+def test_discontinuous_segments_are_kept_whole():
+    first = get_segment([[0, 0, 0], [0.5, 0, 0]])
+    second = get_segment([[0, 0.5, 0], [0, 0, 0]])
+    (eig, vec, qpt), highsym_qpts = merge_matdyn_segments(
+        [first, second], [[(0, "G"), (1, "X")], [(0, "Y"), (1, "G")]]
+    )
+    assert len(qpt) == 4
+    assert np.array_equal(eig, np.concatenate([first[0], second[0]]))
+    assert vec.shape == (4, 3, 1, 3)
+    assert highsym_qpts == [(0, "G"), (1, "X"), (2, "Y"), (3, "G")]
+
+
+def test_shared_endpoint_is_kept_once():
+    first = get_segment([[0, 0, 0], [0.5, 0, 0]])
+    second = get_segment([[0.5, 0, 0], [0.5, 0.5, 0]])
+    (eig, vec, qpt), highsym_qpts = merge_matdyn_segments(
+        [first, second], [[(0, "G"), (1, "X")], [(0, "X"), (1, "M")]]
+    )
+    assert np.array_equal(qpt, [[0, 0, 0], [0.5, 0, 0], [0.5, 0.5, 0]])
+    assert np.array_equal(eig[1], first[0][1])
+    assert highsym_qpts == [(0, "G"), (1, "X"), (2, "M")]
+
+
+def test_merge_without_eigenvectors():
+    first = get_segment([[0, 0, 0], [0.5, 0, 0]])
+    second = get_segment([[0.5, 0, 0], [0.5, 0.5, 0]])
+    (eig, vec, qpt), highsym_qpts = merge_matdyn_segments(
+        [(first[0], None, first[2]), (second[0], None, second[2])]
+    )
+    assert vec is None
+    assert highsym_qpts is None
+    assert len(eig) == 3
+
+
+def test_wrong_number_of_label_lists():
+    segment = get_segment([[0, 0, 0], [0.5, 0, 0]])
+    with pytest.raises(ValueError, match="lists of high-symmetry"):
+        merge_matdyn_segments([segment, segment], [[(0, "G")]])
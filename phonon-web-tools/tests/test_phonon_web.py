@@ -0,0 +1,124 @@
+import json
+
+import numpy as np
+import pytest
+
+from phonon_web_tools import convert_qe_phonon_folder
+from phonon_web_tools.phonon_web import (
+    PhononWebConverter,
+    decode_phonon_data,
+    decode_vectors,
+    encode_vectors,
+    get_delta_step,
+)
+
+
+def convert(folder, name, **kwargs):
+    out_file = folder / f"{name}.json"
+    convert_qe_phonon_folder(folder, out_file=out_file, **kwargs)
+    return json.loads(out_file.read_text())
+
+
+def get_complex_vectors(phonon_data):
+    vectors = decode_vectors(phonon_data)
+    nq, nmodes = vectors.shape[:2]
+    return (vectors[..., 0] + 1j * vectors[..., 1]).reshape(nq, nmodes, -1)
+
+
+@pytest.mark.parametrize("precision", [1e-2, 1e-4, 1e-6])
+def test_encoding_error_bound(precision):
+    rng = np.random.default_rng(0)
+    vectors = np.cumsum(rng.normal(scale=0.05, size=(50, 6, 2, 3, 2)), axis=0)
+    segment_starts = [0, 17, 18, 40]
+    deltas = encode_vectors(vectors, segment_starts, precision)
+    assert deltas.dtype == np.int64
+    decoded = decode_vectors(
+        {
+            "vectors_delta": deltas.tolist(),
+            "vectors_encoding": {
+                "type": "delta",
+                "step": get_delta_step(precision),
+                "segment_starts": segment_starts,
+            },
+        }
+    )
+    assert decoded.shape == vectors.shape
+    assert np.abs(decoded - vectors).max() <= precision * (1 + 1e-9)
+    # the deltas restart from zero at the start of each segment
+    assert np.array_equal(deltas[17], np.rint(vectors[17] / get_delta_step(precision)))
+
+
+def test_gauge_fixing_and_encoding(copy_example):
+    folder = copy_example("graphene")
+    original = convert(folder, "original")
+    fixed = convert(folder, "fixed", fix_gauge=True)
+    encoded = convert(folder, "encoded", vectors_precision=1e-4)
+
+    assert "vectors" not in encoded
+    assert encoded["vectors_encoding"]["segment_starts"] == [0]
+    assert np.abs(decode_vectors(encoded) - decode_vectors(fixed)).max() <= 1e-4
+    assert decode_phonon_data(encoded).keys() == original.keys()
+    assert decode_phonon_data(original) is original
+    assert len(json.dumps(encoded["vectors_delta"])) < len(
+        json.dumps(original["vectors"])
+    )
+
+    # Only the global phase of each mode changes
+    vectors, fixed_vectors = get_complex_vectors(original), get_complex_vectors(fixed)
+    overlaps = np.einsum("kni,kni->kn", vectors.conj(), fixed_vectors)
+    assert np.allclose(np.abs(overlaps), 1)
+    assert np.array_equal(fixed["eigenvalues"], original["eigenvalues"])
+
+    # The overlaps with the previous q-point are real and positive, except within
+    # degenerate subspaces
+    overlaps = np.einsum("kni,kni->kn", fixed_vectors[:-1].conj(), fixed_vectors[1:])
+    large = np.abs(overlaps) > 0.5
+    assert large.mean() > 0.9
+    assert np.allclose(overlaps[large].imag, 0, atol=1e-6)
+    assert np.all(overlaps[large].real > 0)
+
+
+def test_decode_errors():
+    with pytest.raises(ValueError, match="no eigenvectors"):
+        decode_vectors({"eigenvalues": [[0.0]]})
+    with pytest.raises(ValueError, match="Unknown encoding"):
+        decode_vectors({"vectors_delta": [], "vectors_encoding": {"type": "zip"}})
+
+
+def test_eigenvalues_only(copy_example):
+    folder = copy_example("BN")
+    full = convert(folder, "full")
+    fast = convert(folder, "fast", eigenvalues_only=True)
+    assert "vectors" not in fast
+    assert fast.keys() == full.keys() - {"vectors"}
+    assert np.allclose(np.sort(fast["eigenvalues"]), np.sort(full["eigenvalues"]))
+    # the same branches as with the eigenvectors (the order of the bands degenerate
+    # at the first q-point can differ)
+    full_bands = np.array(full["eigenvalues"]).T
+    for band in np.array(fast["eigenvalues"]).T:
+        assert np.isclose(full_bands, band, atol=1e-3).all(axis=1).any()
+    with pytest.raises(ValueError, match="no eigenvectors"):
+        decode_vectors(fast)
+    with pytest.raises(ValueError, match="need the eigenvectors"):
+        convert(folder, "gauge", eigenvalues_only=True, fix_gauge=True)
+
+
+def test_crossings_from_the_frequencies():
+    # non-uniform spacing of the q-points, the first two bands cross at d = 10/9
+    distances = np.array([0, 0.1, 0.2, 0.5, 0.55, 0.6, 1.0, 1.05, 1.1, 1.3, 2.0, 2.1])
+    bands = np.stack(
+        [100 + 50 * distances, 200 - 40 * distances, np.full_like(distances, 500)],
+        axis=1,
+    )
+    converter = PhononWebConverter(
+        cell=np.eye(3),
+        pos=[[0, 0, 0]],
+        atom_numbers=[6],
+        eigenvalues=np.sort(bands, axis=1),
+        eigenvectors=None,
+        qpoints=distances[:, None] * [1, 0, 0],
+        highsym_qpts=[(0, "G"), (len(distances) - 1, "X")],
+    )
+    assert np.allclose(converter.distances, distances)
+    assert np.allclose(converter.eigenvalues, bands)
+    assert list(converter.band_order[-1]) == [1, 0, 2]
@@ -0,0 +1,139 @@
+import io
+
+import numpy as np
+import pytest
+
+from phonon_web_tools.pw_input import parse_pw_input
+from phonon_web_tools.qe_phonon_tools import get_structure_tuple
+
+supported_ibrav = [1, 2, 3, -3, 4, 5, -5, 6, 7, 8, 9, -9, 10, 11]
+
+template = """&CONTROL
+  calculation = 'scf'
+/
+&SYSTEM
+  ibrav = {ibrav}
+  {lattice}
+  nat = 2
+  ntyp = 2
+  ecutwfc = 30
+/
+&ELECTRONS
+/
+ATOMIC_SPECIES
+Ga 69.723 Ga.UPF
+As 74.922 As.UPF
+{cell}ATOMIC_POSITIONS {units}
+Ga 0.00 0.00 0.00
+As 0.21 0.37 0.43
+K_POINTS automatic
+2 2 2 0 0 0
+"""
+
+celldm = "celldm(1) = 7.3, celldm(2) = 1.3\n  celldm(3) = 1.7\n  celldm(4) = 0.3"
+abc = "A = 3.9\n  B = 5.1\n  C = 6.7\n  cosAB = 0.3"
+
+
+def assert_same_structure(text, swapped=False):
+    cell1, pos1, numbers1 = get_structure_tuple(io.StringIO(text), "qeinp-qetools")
+    cell2, pos2, numbers2 = get_structure_tuple(io.StringIO(text), "qeinp-fast")
+    if swapped:
+        # qe-tools swaps the first two lattice vectors with respect to pw.x
+        cell1 = np.array(cell1)[[1, 0, 2]]
+    assert np.allclose(cell1, cell2, rtol=0, atol=1e-10)
+    assert np.allclose(pos1, pos2, rtol=0, atol=1e-10)
+    assert list(numbers1) == list(numbers2)
+
+
+def test_examples(data_dir):
+    for scf_in in sorted(data_dir.glob("*/scf.in")):
+        assert_same_structure(scf_in.read_text())
+
+
+@pytest.mark.parametrize("ibrav", supported_ibrav)
+@pytest.mark.parametrize("lattice", [celldm, abc], ids=["celldm", "A"])
+def test_ibrav(ibrav, lattice):
+    assert_same_structure(
+        template.format(ibrav=ibrav, lattice=lattice, cell="", units="crystal"),
+        swapped=ibrav == -9,
+    )
+
+
+@pytest.mark.parametrize("units", ["crystal", "alat", "bohr", "angstrom"])
+def test_position_units(units):
+    assert_same_structure(
+        template.format(ibrav=4, lattice=celldm, cell="", units=units)
+    )
+
+
+@pytest.mark.parametrize(
+    "lattice, units",
+    [("", "bohr"), ("", "angstrom"), ("celldm(1) = 7.3", "alat"), ("A = 3.9", "")],
+)
+def test_cell_parameters(lattice, units):
+    cell = f"CELL_PARAMETERS {units}\n1.0 0.1 0.0\n-0.5 0.9 0.0\n0.0 0.0 2.5d0\n"
+    assert_same_structure(
+        template.format(ibrav=0, lattice=lattice, cell=cell, units="crystal")
+    )
+
+
+def get_latgen_cell(ibrav, a, b, c, cos):
+    "Lattice vectors of pw.x (latgen.f90 and the INPUT_PW documentation)"
+    tx, ty, tz = np.sqrt([(1 - cos) / 2, (1 - cos) / 6, (1 + 2 * cos) / 3])
+    u, v = tz - 2 * np.sqrt(2) * ty, tz + np.sqrt(2) * ty
+    cells = {
+        1: [[a, 0, 0], [0, a, 0], [0, 0, a]],
+        2: [[-a / 2, 0, a / 2], [0, a / 2, a / 2], [-a / 2, a / 2, 0]],
+        3: [[a / 2, a / 2, a / 2], [-a / 2, a / 2, a / 2], [-a / 2, -a / 2, a / 2]],
+        -3: [[-a / 2, a / 2, a / 2], [a / 2, -a / 2, a / 2], [a / 2, a / 2, -a / 2]],
+        4: [[a, 0, 0], [-a / 2, a * np.sqrt(3) / 2, 0], [0, 0, c]],
+        5: [
+            [a * tx, -a * ty, a * tz],
+            [0, 2 * a * ty, a * tz],
+            [-a * tx, -a * ty, a * tz],
+        ],
+        -5: np.array([[u, v, v], [v, u, v], [v, v, u]]) * a / np.sqrt(3),
+        6: [[a, 0, 0], [0, a, 0], [0, 0, c]],
+        7: [[a / 2, -a / 2, c / 2], [a / 2, a / 2, c / 2], [-a / 2, -a / 2, c / 2]],
+        8: [[a, 0, 0], [0, b, 0], [0, 0, c]],
+        9: [[a / 2, b / 2, 0], [-a / 2, b / 2, 0], [0, 0, c]],
+        -9: [[a / 2, -b / 2, 0], [a / 2, b / 2, 0], [0, 0, c]],
+        10: [[a / 2, 0, c / 2], [a / 2, b / 2, 0], [0, b / 2, c / 2]],
+        11: [[a / 2, b / 2, c / 2], [-a / 2, b / 2, c / 2], [-a / 2, -b / 2, c / 2]],
+    }
+    return np.array(cells[ibrav], dtype=float)
+
+
+@pytest.mark.parametrize("ibrav", supported_ibrav)
+def test_ibrav_matches_pw(ibrav):
+    text = template.format(ibrav=ibrav, lattice=abc, cell="", units="crystal")
+    expected = get_latgen_cell(ibrav, 3.9, 5.1, 6.7, 0.3)
+    assert np.allclose(parse_pw_input(text)["cell"], expected, rtol=0, atol=1e-12)
+
+
+def test_comments_and_fortran_exponents():
+    text = template.format(
+        ibrav=1, lattice="celldm(1) = 0.73d1 ! bohr", cell="", units="crystal"
+    ).replace("As 0.21 0.37 0.43", "As 0.21 0.37 0.43 # last atom")
+    reference = template.format(
+        ibrav=1, lattice="celldm(1) = 7.3", cell="", units="crystal"
+    )
+    parsed, expected = parse_pw_input(text), parse_pw_input(reference)
+    assert np.array_equal(parsed["cell"], expected["cell"])
+    assert np.array_equal(parsed["positions"], expected["positions"])
+    assert parsed["atom_names"] == ["Ga", "As"]
+
+
+@pytest.mark.parametrize(
+    "ibrav, lattice, cell, match",
+    [
+        (12, celldm, "", "not supported"),
+        (1, "", "", "celldm"),
+        (1, "celldm(1) = 7.3\n  A = 3.9", "", "Both"),
+        (0, "", "", "CELL_PARAMETERS"),
+    ],
+)
+def test_errors(ibrav, lattice, cell, match):
+    text = template.format(ibrav=ibrav, lattice=lattice, cell=cell, units="crystal")
+    with pytest.raises(ValueError, match=match):
+        parse_pw_input(text)
@@ -0,0 +1,173 @@
+import gzip
+import io
+import json
+import sys
+
+import numpy as np
+import pytest
+
+from phonon_web_tools import convert_qe_phonon_folder
+from phonon_web_tools.lattice import rec_lat
+from phonon_web_tools.qe_phonon_tools import read_and_process_scf_in
+from phonon_web_tools.qpath import (
+    get_path_npoints,
+    get_path_qpoints,
+    get_seekpath_qpath,
+    main,
+    write_matdyn_input,
+)
+from phonon_web_tools.utils import open_text
+
+rec = np.eye(3) * 2 * np.pi / 3  # cubic cell of 3 angstrom
+
+
+def read_band_qpoints(text):
+    "Return the q-points that matdyn.x computes for a q-list in band form"
+    lines = [line for line in text.split("/", 1)[1].splitlines() if line.strip()]
+    rows = [line.split() for line in lines[1 : int(lines[0]) + 1]]
+    vertices = np.array([row[:3] for row in rows], dtype=float)
+    qpoints = [
+        start + (end - start) * i / int(row[3])
+        for start, end, row in zip(vertices[:-1], vertices[1:], rows)
+        for i in range(int(row[3]))
+    ]
+    return np.array(qpoints + [vertices[-1]])
+
+
+def test_path_npoints():
+    vertices = [[0, 0, 0], [0.5, 0, 0], [0.5, 0.5, 0], [0, 0.01, 0]]
+    npoints = get_path_npoints(vertices, rec, density=20)
+    # segments of length pi/3, and pi/3 * sqrt(0.5**2 + 0.49**2) / 0.5
+    assert list(npoints) == [21, 21, 30]
+    assert list(get_path_npoints(vertices, rec, density=20, jumps=[1])) == [21, 1, 30]
+    # at least 2 q-points per segment
+    assert list(get_path_npoints(vertices, rec, density=0.01)) == [2, 2, 2]
+
+    with pytest.raises(ValueError, match="Too many"):
+        get_path_npoints(vertices, rec, density=20, max_points=50)
+    with pytest.raises(ValueError, match="different"):
+        get_path_npoints([[0, 0, 0], [0, 0, 0]], rec)
+    with pytest.raises(ValueError, match="positive"):
+        get_path_npoints(vertices, rec, density=-1)
+    with pytest.raises(ValueError, match="2 vertices"):
+        get_path_npoints([[0, 0, 0]], rec)
+
+
+def test_path_qpoints():
+    vertices = [[0, 0, 0], [0.5, 0, 0], [0.5, 0.5, 0]]
+    qpoints, highsym_qpts = get_path_qpoints(vertices, rec, 20, ["G", "X", "M"])
+    assert highsym_qpts == [(0, "G"), (21, "X"), (42, "M")]
+    assert np.allclose(qpoints[[0, 21, 42]], vertices)
+    steps = np.linalg.norm(np.diff(qpoints, axis=0) @ rec, axis=1)
+    assert np.all(steps <= 1 / 20) and np.allclose(steps, steps[0])
+
+    npoints = get_path_npoints(vertices, rec, 20)
+    same, _ = get_path_qpoints(vertices, rec, labels=["G", "X", "M"], npoints=npoints)
+    assert np.array_equal(same, qpoints)
+    _, highsym_qpts = get_path_qpoints(vertices, rec, 5)
+    assert [label for _, label in highsym_qpts] == ["Q_1", "Q_2", "Q_3"]
+    with pytest.raises(ValueError, match="labels"):
+        get_path_qpoints(vertices, rec, labels=["G"])
+
+
+@pytest.mark.parametrize("name", ["graphene", "diamond", "P"])
+def test_seekpath_qpath(data_dir, name):
+    with open(data_dir / name / "scf.in") as f:
+        scf_in_data = read_and_process_scf_in(f)
+    two_dimensional = name != "diamond"
+    qpath = get_seekpath_qpath(
+        scf_in_data["cell"],
+        scf_in_data["pos"],
+        scf_in_data["atom_numbers"],
+        density=30,
+        two_dimensional=two_dimensional,
+    )
+    qpoints = qpath["qpoints"]
+    assert len(qpoints) == sum(qpath["npoints"]) + 1
+    assert np.allclose(
+        qpoints[[index for index, _ in qpath["highsym_qpts"]]], qpath["vertices"]
+    )
+    assert qpath["highsym_qpts"][0][1] == "GAMMA"
+    if two_dimensional:
+        assert np.allclose(qpoints[:, 2], 0)
+    cell_rec = rec_lat(scf_in_data["cell"]) * 2 * np.pi
+    steps = np.linalg.norm(np.diff(qpoints, axis=0) @ cell_rec, axis=1)
+    jumps = np.zeros(len(steps), dtype=bool)
+    jumps[qpath["discont_indexes"]] = True
+    assert np.all(steps[~jumps] <= 1 / 30 + 1e-12)
+
+    # matdyn.x computes the same q-points from the written input
+    f = io.StringIO()
+    write_matdyn_input(f, qpath, asr="all", loto_2d=two_dimensional)
+    text = f.getvalue()
+    assert "asr = 'all'" in text
+    assert np.allclose(read_band_qpoints(text), qpoints, rtol=0, atol=1e-9)
+
+
+def test_template_namelist_is_kept(data_dir):
+    template = (data_dir / "graphene" / "matdyn.in").read_text()
+    qpath = {"vertices": np.eye(3)[:2], "npoints": [10]}
+    f = io.StringIO()
+    write_matdyn_input(f, qpath, template)
+    text = f.getvalue()
+    namelist = text.split("/", 1)[0]
+    assert namelist.lower().count("q_in_band_form") == 1
+    assert "flfrc = 'real_space_force_constants.dat'" in namelist
+    assert len(read_band_qpoints(text)) == 11
+    with pytest.raises(ValueError):
+        write_matdyn_input(io.StringIO(), qpath, "no namelist")
+
+
+def run_main(monkeypatch, *args):
+    monkeypatch.setattr(sys, "argv", ["phonon-web-qpath", *map(str, args)])
+    main()
+
+
+def test_main(copy_example, monkeypatch, capsys):
+    folder = copy_example("graphene", ["scf.in", "matdyn.in", "highsym_qpts.json"])
+    template = (folder / "matdyn.in").read_text()
+    with pytest.raises(SystemExit):
+        run_main(monkeypatch, folder, "--density", 20)
+    assert "--force" in capsys.readouterr().err
+    assert (folder / "matdyn.in").read_text() == template
+
+    run_main(monkeypatch, folder, "--density", 20, "--force")
+    text = (folder / "matdyn.in").read_text()
+    assert text.split("/", 1)[0] == template.split("/", 1)[0]
+    highsym_qpts = json.loads((folder / "highsym_qpts.json").read_text())
+    assert [label for _, label in highsym_qpts] == ["GAMMA", "M", "K", "GAMMA"]
+    assert highsym_qpts[-1][0] == len(read_band_qpoints(text)) - 1
+
+
+def test_main_out_file(copy_example, monkeypatch, tmp_path):
+    folder = copy_example("graphene", ["scf.in", "matdyn.in"])
+    template = (folder / "matdyn.in").read_text()
+    out_file = tmp_path / "new" / "matdyn.in"
+    out_file.parent.mkdir()
+    run_main(monkeypatch, folder, "--out_file", out_file)
+    assert (folder / "matdyn.in").read_text() == template
+    assert out_file.read_text().split("/", 1)[0] == template.split("/", 1)[0]
+    assert (folder / "highsym_qpts.json").exists()
+
+
+def test_main_keeps_compression(copy_example, monkeypatch):
+    folder = copy_example("graphene", ["scf.in", "matdyn.in"])
+    template = (folder / "matdyn.in").read_bytes()
+    (folder / "matdyn.in.gz").write_bytes(gzip.compress(template))
+    (folder / "matdyn.in").unlink()
+
+    run_main(monkeypatch, folder, "--force")
+    assert not (folder / "matdyn.in").exists()
+    with open_text(folder / "matdyn.in.gz") as f:
+        text = f.read()
+    assert text.split("/", 1)[0] == template.decode().split("/", 1)[0]
+
+
+def test_converted_generated_path(copy_example):
+    folder = copy_example("graphene")
+    out_file = folder / "generated.json"
+    convert_qe_phonon_folder(folder, out_file=out_file, qpath_density=20)
+    phonon_data = json.loads(out_file.read_text())
+    labels = [label for _, label in phonon_data["highsym_qpts"]]
+    assert labels == ["G", "M", "K", "G"]
+    assert np.allclose(np.array(phonon_data["qpoints"])[:, 2], 0)
@@ -0,0 +1,148 @@
+import csv
+import io
+
+import numpy as np
+import pytest
+
+from phonon_web_tools import convert_qe_phonon_folder
+from phonon_web_tools.stability import (
+    classify_modes,
+    report_columns,
+    scan_frequencies,
+    scan_material,
+    scan_materials,
+    sort_report,
+    write_report,
+)
+from phonon_web_tools.store import PhononStore
+
+rec = np.eye(3) * 2 * np.pi / 3  # cubic cell of 3 angstrom
+
+
+def test_classify_modes():
+    qpoints = np.array([[0.001, 0, 0], [0.25, 0, 0], [0.999, 0, 0]])
+    frequencies = np.array(
+        [
+            [-15.0, -0.5, 2.0, 100.0],  # acoustic noise near Gamma, and noise
+            [-15.0, -0.5, 2.0, 100.0],  # far from Gamma: unstable
+            [-25.0, 1.0, 2.0, 100.0],  # near Gamma (other zone) but too imaginary
+        ]
+    )
+    unstable, acoustic = classify_modes(frequencies, qpoints, rec)
+    assert np.array_equal(np.argwhere(acoustic), [[0, 0]])
+    assert np.array_equal(np.argwhere(unstable), [[1, 0], [2, 0]])
+
+    unstable, acoustic = classify_modes(
+        frequencies, qpoints, rec, tolerance=20, acoustic_tolerance=30
+    )
+    assert np.array_equal(np.argwhere(acoustic), [[2, 0]])
+    assert not unstable.any()
+
+
+def test_scan_frequencies():
+    qpoints = np.array([[0, 0, 0], [0.25, 0, 0], [0.5, 0, 0], [0.5, 0.5, 0]])
+    frequencies = np.array(
+        [[-3.0, 0, 0, 10], [1, 2, 3, 4], [-40.0, -5, 3, 4], [-2.0, 2, 3, 4]]
+    )
+    report = scan_frequencies(frequencies, qpoints, rec)
+    assert report["status"] == "unstable"
+    assert report["imaginary_frequency"] == 40
+    assert report["worst_qpoint"] == [0.5, 0, 0]
+    assert report["worst_mode"] == 0
+    assert report["unstable_qpoints"] == 2
+    assert report["unstable_fraction"] == 0.5
+    assert report["acoustic_frequency"] == 3
+    assert report["min_frequency"] == -40
+
+    report = scan_frequencies(frequencies[:2], qpoints[:2], rec)
+    assert report["status"] == "acoustic"
+    assert report["worst_qpoint"] is None
+    report = scan_frequencies(frequencies[1:2], qpoints[1:2], rec)
+    assert report["status"] == "stable"
+
+
+def test_scan_folders(data_dir):
+    reports = scan_materials([data_dir / "graphene", data_dir / "AgNO2"])
+    graphene, silver_nitrite = reports
+    assert graphene["name"] == "graphene"
+    # the force constants of graphene reproduce its q-path: its mesh is scanned
+    assert graphene["source"] == "mesh 30x30x1"
+    assert graphene["nq"] == 452
+    assert graphene["status"] in ("stable", "acoustic")
+    assert silver_nitrite["status"] == "unstable"
+    assert silver_nitrite["imaginary_frequency"] > 10
+
+    assert (
+        scan_materials([data_dir / "graphene", data_dir / "AgNO2"], workers=2)
+        == reports
+    )
+
+
+@pytest.mark.parametrize(
+    "use_mesh, mesh_agreement, source",
+    [
+        (False, None, "path"),
+        (True, None, "mesh 4x4x1"),
+        ("auto", None, "mesh 4x4x1"),
+        ("auto", 1e-8, "path"),
+    ],
+)
+def test_mesh_selection(data_dir, use_mesh, mesh_agreement, source):
+    report = scan_material(
+        data_dir / "graphene",
+        use_mesh=use_mesh,
+        mesh=[4, 4, 1],
+        mesh_agreement=mesh_agreement,
+    )
+    assert report["source"] == source
+    assert report["status"] in ("stable", "acoustic")
+
+
+@pytest.mark.parametrize("use_mesh", ["auto", True])
+def test_mesh_without_force_constants(data_dir, use_mesh):
+    report = scan_material(data_dir / "diamond", use_mesh=use_mesh)
+    assert report["source"] == "path"
+    assert report["status"] == "stable"
+
+
+def test_json_and_store(data_dir, copy_example, tmp_path):
+    from_json = scan_material(data_dir / "graphene.json")
+    assert from_json["name"] == "graphene"
+    assert from_json["source"] == "path"
+
+    store_path = tmp_path / "phonons.sqlite"
+    with PhononStore(store_path) as store:
+        convert_qe_phonon_folder(copy_example("graphene"), store=store)
+    from_store = scan_material((store_path, "graphene"), use_mesh=False)
+    assert from_store == from_json
+    assert scan_material((store_path, "graphene"))["source"] == "mesh 30x30x1"
+    from_mesh = scan_material((store_path, "graphene"), use_mesh=True, mesh=[3, 3, 1])
+    assert from_mesh["source"] == "mesh 3x3x1"
+
+
+def test_errors(tmp_path):
+    report = scan_material(tmp_path)
+    assert report["status"] == "error"
+    assert report["name"] == tmp_path.name
+    assert "scf.in" in report["error"]
+
+
+def test_sort_and_write_report():
+    reports = [
+        dict.fromkeys(report_columns) | report
+        for report in [
+            {"name": "a", "imaginary_frequency": 3.0, "worst_qpoint": [0.5, 0, 0]},
+            {"name": "b", "imaginary_frequency": None},
+            {"name": "c", "imaginary_frequency": 30.0},
+        ]
+    ]
+    reports = sort_report(reports)
+    assert [report["name"] for report in reports] == ["c", "a", "b"]
+    with pytest.raises(ValueError):
+        sort_report(reports, "unknown")
+
+    f = io.StringIO()
+    write_report(reports, f)
+    rows = list(csv.DictReader(io.StringIO(f.getvalue())))
+    assert rows[1]["worst_qpoint"] == "0.5 0 0"
+    assert rows[2]["imaginary_frequency"] == ""
@@ -0,0 +1,137 @@
+import json
+
+import numpy as np
+import pytest
+
+from phonon_web_tools import convert_qe_phonon_folder
+from phonon_web_tools.store import PhononStore, array_keys
+
+
+@pytest.fixture
+def json_data(data_dir):
+    return {
+        path.stem: json.loads(path.read_text())
+        for path in sorted(data_dir.glob("*.json"))
+    }
+
+
+@pytest.fixture
+def store(tmp_path, json_data):
+    with PhononStore(tmp_path / "phonons.sqlite") as store:
+        for name, phonon_data in json_data.items():
+            assert store.put(name, phonon_data)
+        yield store
+
+
+def test_round_trip(store, json_data):
+    assert len(store) == len(json_data)
+    for name, phonon_data in json_data.items():
+        assert name in store
+        stored = store.get(name)
+        assert set(stored) == set(phonon_data)
+        for key, value in phonon_data.items():
+            if key in array_keys:
+                assert np.array_equal(stored[key], value)
+            else:
+                assert stored[key] == value
+
+
+def test_slice_of_array(store, json_data):
+    vectors = np.array(json_data["graphene"]["vectors"])
+    assert np.array_equal(
+        store.get_array("graphene", "vectors", 10, 13), vectors[10:13]
+    )
+    assert np.array_equal(store.get_array("graphene", "vectors", -2), vectors[-2:])
+    assert store.get_array("graphene", "eigenvalues", 5, 2).shape == (0, 6)
+    assert store.get("graphene", keys=["qpoints"]).keys() == (
+        set(store.get_metadata("graphene")) | {"qpoints"}
+    )
+    with pytest.raises(ValueError):
+        store.get_array("graphene", "unknown")
+    with pytest.raises(KeyError):
+        store.get_array("graphene", "group_velocities")
+
+
+def test_query(store, json_data):
+    rows, total = store.query(ranges={"natoms": (2, 2)}, order_by="max_frequency")
+    expected = [name for name, data in json_data.items() if data["natoms"] == 2]
+    assert total == len(expected)
+    assert sorted(row["name"] for row in rows) == sorted(expected)
+    frequencies = [row["max_frequency"] for row in rows]
+    assert frequencies == sorted(frequencies)
+
+    rows, total = store.query(name="Pb%", order_by="natoms", descending=True, limit=1)
+    assert total == 2
+    assert rows[0]["name"] == "PbI2"
+
+    rows, total = store.query(formula=json_data["MoS2"]["formula"])
+    assert [row["name"] for row in rows] == ["MoS2"]
+    assert rows[0]["nq"] == len(json_data["MoS2"]["qpoints"])
+    assert rows[0]["min_frequency"] == np.min(json_data["MoS2"]["eigenvalues"])
+
+    with pytest.raises(ValueError):
+        store.query(order_by="hash")
+    with pytest.raises(ValueError):
+        store.query(ranges={"name": (None, None)})
+
+
+def test_put_unchanged_and_replace(store, json_data):
+    phonon_data = json_data["graphene"]
+    assert not store.put("graphene", phonon_data)
+    hash_before = store.query(name="graphene")[0][0]["hash"]
+
+    phonon_data = dict(phonon_data, name="graphene (new)")
+    assert store.put("graphene", phonon_data)
+    assert store.get_metadata("graphene")["name"] == "graphene (new)"
+    assert store.query(name="graphene")[0][0]["hash"] != hash_before
+    assert len(store) == len(json_data)
+
+
+def test_delete(store):
+    store.put_force_constants("graphene", "force constants", {"asr": "simple"})
+    store.delete("graphene")
+    assert "graphene" not in store
+    with pytest.raises(KeyError):
+        store.get_metadata("graphene")
+    count = store.connection.execute("SELECT COUNT(*) FROM force_constants")
+    assert count.fetchone()[0] == 0
+
+
+def test_missing_arrays(store, json_data):
+    phonon_data = dict(json_data["graphene"])
+    del phonon_data["distances"]
+    with pytest.raises(ValueError, match="distances"):
+        store.put("broken", phonon_data)
+    assert "broken" not in store
+
+
+def test_force_constants(store):
+    assert store.get_force_constants_hash("BN") is None
+    assert store.put_force_constants("BN", "text", {"asr": "all"})
+    assert not store.put_force_constants("BN", "text", {"asr": "all"})
+    fc_hash = store.get_force_constants_hash("BN")
+    assert store.put_force_constants("BN", "text", {"asr": "simple"})
+    # the hash covers the settings too
+    assert store.get_force_constants_hash("BN") != fc_hash
+    assert store.get_force_constants("BN") == ("text", {"asr": "simple"})
+    with pytest.raises(KeyError):
+        store.get_force_constants("graphene")
+    with pytest.raises(KeyError):
+        store.put_force_constants("missing", "text")
+
+
+def test_convert_folder_to_store(copy_example, tmp_path, data_dir):
+    folder = copy_example("graphene")
+    with PhononStore(tmp_path / "converted.sqlite") as store:
+        convert_qe_phonon_folder(folder, store=store)
+        text, settings = store.get_force_constants("graphene")
+        assert (
+            text
+            == (data_dir / "graphene" / "real_space_force_constants.dat").read_text()
+        )
+        assert settings["asr"] == "all"
+        assert settings["loto_2d"]
+
+        convert_qe_phonon_folder(folder, out_file=tmp_path / "graphene.json")
+        phonon_data = json.loads((tmp_path / "graphene.json").read_text())
+        assert not store.put("graphene", phonon_data)
@@ -0,0 +1,139 @@
+import numpy as np
+import pytest
+
+from phonon_web_tools import thermodynamics
+from phonon_web_tools.force_constants import load_interpolator
+from phonon_web_tools.thermodynamics import (
+    cm1_to_ev,
+    ev_to_kj_mol,
+    get_mesh_qpoints,
+    get_mesh_thermodynamics,
+    get_thermal_properties,
+    kb_ev,
+)
+
+gas_constant = kb_ev * ev_to_kj_mol * 1000  # J/K/mol
+temperatures = np.array([0.0, 1.0, 50.0, 300.0, 2000.0])
+
+
+def get_reference(frequencies, weights, temperature):
+    "Properties summed one mode at a time"
+    totals = np.zeros(4)
+    for q_frequencies, weight in zip(frequencies, weights / np.sum(weights)):
+        for frequency in q_frequencies:
+            energy = frequency * cm1_to_ev
+            if temperature == 0:
+                values = [energy / 2, energy / 2, 0.0, 0.0]
+            else:
+                kt = kb_ev * temperature
+                x = energy / kt
+                occupation = np.exp(-x) / (1 - np.exp(-x))
+                values = [
+                    energy / 2 + kt * np.log(1 - np.exp(-x)),
+                    energy * (0.5 + occupation),
+                    x * occupation - np.log(1 - np.exp(-x)),
+                    x**2 * np.exp(-x) / (1 - np.exp(-x)) ** 2,
+                ]
+            totals += weight * np.array(values)
+    return totals * [ev_to_kj_mol, ev_to_kj_mol, gas_constant, gas_constant]
+
+
+def test_matches_sum_over_modes():
+    rng = np.random.default_rng(0)
+    frequencies = rng.uniform(10, 1500, (7, 6))
+    weights = rng.uniform(1, 3, 7)
+    properties = get_thermal_properties(frequencies, temperatures, weights)
+    for i, temperature in enumerate(temperatures):
+        reference = get_reference(frequencies, weights, temperature)
+        computed = [properties[key][i] for key in thermodynamics.property_keys]
+        assert np.allclose(computed, reference, rtol=1e-10, atol=1e-12)
+    assert properties["zero_point_energy"] == pytest.approx(
+        properties["free_energy"][0]
+    )
+    assert properties["excluded_fraction"] == 0
+
+
+def test_limits_and_consistency():
+    frequencies = np.array([[100.0, 200.0, 300.0]])
+    properties = get_thermal_properties(frequencies, np.arange(0, 1e5, 500.0))
+    free_energy, internal_energy, entropy, heat_capacity = (
+        properties[key] for key in thermodynamics.property_keys
+    )
+    assert np.all(np.isfinite(free_energy))
+    assert entropy[0] == 0 and heat_capacity[0] == 0
+    # Dulong-Petit: kB per mode at high temperature
+    assert heat_capacity[-1] == pytest.approx(3 * gas_constant, rel=1e-4)
+    # F = U - TS
+    assert np.allclose(
+        free_energy, internal_energy - properties["temperatures"] * entropy / 1000
+    )
+
+
+def test_excluded_modes():
+    frequencies = np.array([[0.0, 0.5, 100.0], [-30.0, 50.0, 100.0]])
+    properties = get_thermal_properties(frequencies, temperatures)
+    assert properties["excluded_fraction"] == pytest.approx(0.5)
+    reference = get_thermal_properties([[100.0], [50.0], [100.0]], temperatures)
+    assert np.allclose(properties["heat_capacity"], reference["heat_capacity"] * 3 / 2)
+
+
+def test_chunks_of_temperatures(monkeypatch):
+    frequencies = np.random.default_rng(1).uniform(10, 500, (20, 9))
+    expected = get_thermal_properties(frequencies, temperatures)
+    monkeypatch.setattr(thermodynamics, "chunk_max_bytes", 1)
+    chunked = get_thermal_properties(frequencies, temperatures)
+    for key in thermodynamics.property_keys:
+        assert np.array_equal(chunked[key], expected[key])
+
+
+@pytest.mark.parametrize("mesh", [[4, 4, 1], [3, 5, 2]])
+def test_time_reversal_mesh(mesh):
+    qpoints, weights = get_mesh_qpoints(mesh)
+    assert weights.sum() == pytest.approx(1)
+    full = {tuple(np.round(q * mesh).astype(int) % mesh) for q in qpoints}
+    full |= {tuple(np.round(-q * mesh).astype(int) % mesh) for q in qpoints}
+    assert len(full) == np.prod(mesh)
+    assert len(qpoints) < np.prod(mesh)
+
+
+@pytest.fixture
+def interpolator(data_dir):
+    folder = data_dir / "BN"
+    with open(folder / "real_space_force_constants.dat") as f1, open(
+        folder / "matdyn.in"
+    ) as f2:
+        return load_interpolator(f1, f2)
+
+
+def test_symmetry_reduction(interpolator):
+    mesh = [6, 6, 1]
+    reduced = get_mesh_thermodynamics(interpolator, mesh, temperatures)
+    full = get_mesh_thermodynamics(interpolator, mesh, temperatures, symmetry=False)
+    for key in thermodynamics.property_keys:
+        assert np.allclose(reduced[key], full[key], rtol=1e-6, atol=1e-10)
+    assert reduced["mesh"] == mesh
+
+
+def test_cache(interpolator, tmp_path, monkeypatch):
+    mesh = [4, 4, 1]
+    computed = get_mesh_thermodynamics(
+        interpolator, mesh, temperatures, cache_dir=tmp_path
+    )
+    assert len(list(tmp_path.glob("thermodynamics-*.npz"))) == 1
+
+    def fail(*args, **kwargs):
+        raise AssertionError("The cached results should be used")
+
+    monkeypatch.setattr(interpolator, "diagonalize", fail)
+    cached = get_mesh_thermodynamics(
+        interpolator, mesh, temperatures, cache_dir=tmp_path
+    )
+    assert cached.keys() == computed.keys()
+    for key, value in computed.items():
+        assert np.array_equal(cached[key], value)
+
+    # Other settings are not read from the cache
+    with pytest.raises(AssertionError):
+        get_mesh_thermodynamics(
+            interpolator, mesh, temperatures, cutoff=5.0, cache_dir=tmp_path
+        )
@@ -0,0 +1,94 @@
+import io
+import json
+
+import numpy as np
+import pytest
+
+from phonon_web_tools.trajectory import (
+    get_mode_displacements,
+    get_supercell,
+    iter_frames,
+    write_extxyz,
+    write_npy,
+)
+
+modes = [(0, 5), (20, 3), (45, 1)]
+supercell = [3, 2, 1]
+
+
+@pytest.fixture
+def phonon_data(data_dir):
+    return json.loads((data_dir / "graphene.json").read_text())
+
+
+def get_reference_displacements(phonon_data, iq, iband):
+    "Displacements of one mode, one atom of the supercell at a time"
+    qpoint = np.array(phonon_data["qpoints"][iq])
+    vectors = np.array(phonon_data["vectors"][iq][iband])
+    displacements = []
+    for i in range(supercell[0]):
+        for j in range(supercell[1]):
+            for k in range(supercell[2]):
+                for tau, vector in zip(phonon_data["atom_pos_red"], vectors):
+                    phase = np.exp(2j * np.pi * qpoint @ (np.array([i, j, k]) + tau))
+                    displacements.append(phase * (vector[:, 0] + 1j * vector[:, 1]))
+    return np.array(displacements)
+
+
+def test_supercell(phonon_data):
+    lattice, translations, positions = get_supercell(
+        phonon_data["lattice"], phonon_data["atom_pos_red"], supercell
+    )
+    assert np.allclose(lattice, np.diag(supercell) @ phonon_data["lattice"])
+    assert positions.shape == (6, 2, 3)
+    assert np.allclose(positions[0], phonon_data["atom_pos_car"])
+    assert list(translations[1]) == [0, 1, 0]
+    assert np.allclose(positions[1] - positions[0], phonon_data["lattice"][1])
+
+
+def test_displacements_match_loop(phonon_data):
+    displacements = get_mode_displacements(phonon_data, modes, supercell, 0.5)
+    assert displacements.shape == (len(modes), 6, 2, 3)
+    for (iq, iband), mode_displacements in zip(modes, displacements):
+        reference = get_reference_displacements(phonon_data, iq, iband)
+        assert np.allclose(mode_displacements.reshape(-1, 3), 0.5 * reference)
+
+
+@pytest.mark.parametrize("max_bytes", [1, 500, 10**9])
+def test_chunks_of_frames(phonon_data, max_bytes):
+    displacements = get_mode_displacements(phonon_data, modes, supercell)[1]
+    chunks = list(iter_frames(displacements, 7, max_bytes))
+    frames = np.concatenate([frames for _, frames in chunks])
+    assert [start for start, _ in chunks] == list(
+        np.cumsum([0] + [len(frames) for _, frames in chunks[:-1]])
+    )
+
+    angles = 2 * np.pi * np.arange(7) / 7
+    expected = [np.real(np.exp(1j * theta) * displacements) for theta in angles]
+    assert np.allclose(frames, expected)
+
+
+def test_extxyz_matches_npy(phonon_data, tmp_path):
+    write_npy(tmp_path / "frames.npy", phonon_data, modes, supercell, nframes=4)
+    frames = np.load(tmp_path / "frames.npy")
+    assert frames.shape == (len(modes), 4, 12, 3)
+
+    f = io.StringIO()
+    write_extxyz(f, phonon_data, modes, supercell, nframes=4)
+    lines = f.getvalue().splitlines()
+    assert len(lines) == len(modes) * 4 * (12 + 2)
+    assert lines[0] == "12"
+    assert "q_index=20 band=3 frame=0" in lines[4 * 14 + 1]
+    rows = [line.split() for i, line in enumerate(lines) if i % 14 >= 2]
+    assert {row[0] for row in rows} == {"C"}
+    values = np.array([row[1:] for row in rows], dtype=float).reshape(
+        len(modes), 4, 12, 6
+    )
+    assert np.allclose(values[..., :3], frames, atol=1e-7)
+
+    _, _, positions = get_supercell(
+        phonon_data["lattice"], phonon_data["atom_pos_red"], supercell
+    )
+    assert np.allclose(
+        values[..., :3] - values[..., 3:], positions.reshape(-1, 3), atol=1e-7
+    )
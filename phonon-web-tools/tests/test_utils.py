@@ -0,0 +1,139 @@
+import gzip
+import io
+import json
+import lzma
+import os
+
+import numpy as np
+import pytest
+
+from phonon_web_tools import convert_qe_phonon_folder, qe_phonon_tools
+from phonon_web_tools.qe_phonon_tools import read_matdyn
+from phonon_web_tools.utils import (
+    get_compressed_path,
+    get_compression,
+    get_suffix_compression,
+    open_decompressed,
+    open_output,
+    open_text,
+    strip_compression_suffix,
+    write_json_atomic,
+)
+
+
+def compress(data, compression):
+    if compression == "gz":
+        return gzip.compress(data)
+    if compression == "xz":
+        return lzma.compress(data)
+    zstandard = pytest.importorskip("zstandard")
+    return zstandard.ZstdCompressor().compress(data)
+
+
+@pytest.mark.parametrize("compression", ["gz", "xz", "zst"])
+def test_output_round_trip(tmp_path, compression):
+    path = tmp_path / f"data.txt.{compression}"
+    if compression == "zst":
+        pytest.importorskip("zstandard")
+    text = "".join(f"line {i} é\n" for i in range(10000))
+    with open_output(path) as f:
+        f.write(text)
+    assert get_compression(path.read_bytes()[:8]) == compression
+    assert get_suffix_compression(path) == compression
+    with open_text(path) as f:
+        assert f.read() == text
+    # the compressed file is found from the name without suffix
+    with open_text(tmp_path / "data.txt") as f:
+        assert f.read() == text
+
+
+def test_compressed_paths(tmp_path):
+    path = tmp_path / "matdyn.modes"
+    assert get_compressed_path(path) == path
+    (tmp_path / "matdyn.modes.xz").touch()
+    assert get_compressed_path(path) == tmp_path / "matdyn.modes.xz"
+    path.touch()
+    assert get_compressed_path(path) == path
+    assert strip_compression_suffix("a/phonon_vis.json.gz") == "phonon_vis.json"
+    assert strip_compression_suffix("a/phonon_vis.json") == "phonon_vis.json"
+    assert get_suffix_compression("phonon_vis.json") is None
+
+
+def test_detection_from_content(tmp_path):
+    text = "plain text\n"
+    # compressed content without the suffix
+    (tmp_path / "file").write_bytes(gzip.compress(text.encode()))
+    with open(tmp_path / "file") as f, open_decompressed(f) as decompressed:
+        assert decompressed.read() == text
+    with open(tmp_path / "file", "rb") as f, open_decompressed(f) as decompressed:
+        assert decompressed.read() == text
+    string_io = io.StringIO(text)
+    assert open_decompressed(string_io) is string_io
+    (tmp_path / "plain").write_text(text)
+    with open(tmp_path / "plain") as f:
+        assert open_decompressed(f) is f
+
+
+@pytest.mark.parametrize("compression", ["gz", "xz"])
+def test_streamed_matdyn(data_dir, tmp_path, monkeypatch, compression):
+    path = data_dir / "AgNO2" / "matdyn.modes"
+    with open(path) as f:
+        expected = read_matdyn(f, 4)
+    (tmp_path / "matdyn.modes").write_bytes(compress(path.read_bytes(), compression))
+    # several chunks, the last one incomplete
+    monkeypatch.setattr(qe_phonon_tools, "matdyn_stream_chunk_lines", 1000)
+    for eigenvectors in [True, False]:
+        with open_text(tmp_path / "matdyn.modes") as f:
+            streamed = read_matdyn(f, 4, eigenvectors=eigenvectors)
+        assert np.array_equal(streamed[0], expected[0])
+        assert np.array_equal(streamed[2], expected[2])
+        if eigenvectors:
+            assert np.array_equal(streamed[1], expected[1])
+        else:
+            assert streamed[1] is None
+    with open_text(tmp_path / "matdyn.modes") as f, pytest.raises(ValueError):
+        read_matdyn(f, 3)
+
+
+@pytest.mark.parametrize("rename", [True, False])
+@pytest.mark.parametrize("compression", ["gz", "xz"])
+def test_compressed_folder(copy_example, tmp_path, compression, rename):
+    folder = copy_example("graphene")
+    convert_qe_phonon_folder(
+        folder, out_file=tmp_path / "plain.json", group_velocities=True
+    )
+    for fname in [
+        "scf.in",
+        "scf.out",
+        "matdyn.modes",
+        "matdyn.in",
+        "real_space_force_constants.dat",
+    ]:
+        path = folder / fname
+        data = compress(path.read_bytes(), compression)
+        path.unlink()
+        if rename:
+            path = path.with_name(f"{fname}.{compression}")
+        path.write_bytes(data)
+
+    convert_qe_phonon_folder(folder, compression=compression, group_velocities=True)
+    out_file = folder / f"phonon_vis.json.{compression}"
+    with open_text(out_file) as f:
+        compressed = json.load(f)
+    assert compressed == json.loads((tmp_path / "plain.json").read_text())
+
+
+def test_write_json_atomic(tmp_path):
+    out_file = tmp_path / "data.json.gz"
+    out_file.write_text("old")
+    write_json_atomic({"a": [1, 2]}, out_file)
+    with open_text(out_file) as f:
+        assert json.load(f) == {"a": [1, 2]}
+    assert os.listdir(tmp_path) == ["data.json.gz"]
+    umask = os.umask(0)
+    os.umask(umask)
+    assert out_file.stat().st_mode & 0o777 == 0o666 & ~umask
+
+    with pytest.raises(TypeError):
+        write_json_atomic({"a": object()}, out_file)
+    assert os.listdir(tmp_path) == ["data.json.gz"]
@@ -0,0 +1,127 @@
+import json
+import os
+
+import pytest
+
+from phonon_web_tools import convert_qe_phonon_folder, watch
+from phonon_web_tools.watch import FolderWatcher, get_file_stamp
+
+
+@pytest.fixture
+def parse_counts(monkeypatch):
+    "Count the calls of the parsers used by the watcher"
+    counts = {}
+
+    def counting(name, function):
+        def wrapper(*args, **kwargs):
+            counts[name] = counts.get(name, 0) + 1
+            return function(*args, **kwargs)
+
+        monkeypatch.setattr(watch, name, wrapper)
+
+    for name in ["read_and_process_scf_in", "read_and_process_scf_out", "read_matdyn"]:
+        counting(name, getattr(watch, name))
+    return counts
+
+
+def touch(path, text=None):
+    "Modify the file, with a modification time later than the previous one"
+    if text is not None:
+        path.write_text(text)
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+
+def test_output_matches_conversion(copy_example, tmp_path):
+    folder = copy_example("graphene")
+    watcher = FolderWatcher(folder, out_file=tmp_path / "watched.json")
+    assert watcher.update()
+    convert_qe_phonon_folder(folder, out_file=tmp_path / "converted.json")
+    assert json.loads((tmp_path / "watched.json").read_text()) == json.loads(
+        (tmp_path / "converted.json").read_text()
+    )
+
+
+def test_only_affected_stages_are_redone(copy_example, parse_counts):
+    folder = copy_example("graphene")
+    out_file = folder / "phonon_vis.json"
+    watcher = FolderWatcher(folder)
+    assert watcher.update()
+    assert parse_counts == {
+        "read_and_process_scf_in": 1,
+        "read_and_process_scf_out": 1,
+        "read_matdyn": 1,
+    }
+
+    # Nothing changed
+    assert not watcher.update()
+
+    # New labels: only the conversion is redone
+    highsym_qpts = json.loads((folder / "highsym_qpts.json").read_text())
+    highsym_qpts[1][1] = "X"
+    touch(folder / "highsym_qpts.json", json.dumps(highsym_qpts))
+    assert watcher.update()
+    assert parse_counts["read_matdyn"] == 1
+    assert parse_counts["read_and_process_scf_in"] == 1
+    assert "X" in json.loads(out_file.read_text())["highsym_qpts"][1]
+
+    touch(folder / "matdyn.modes")
+    assert watcher.update()
+    assert parse_counts["read_matdyn"] == 2
+    assert parse_counts["read_and_process_scf_out"] == 1
+
+    # The structure is used by all the stages
+    touch(folder / "scf.in")
+    assert watcher.update()
+    assert parse_counts == {
+        "read_and_process_scf_in": 2,
+        "read_and_process_scf_out": 2,
+        "read_matdyn": 3,
+    }
+
+
+def test_errors_keep_watching(copy_example, parse_counts):
+    folder = copy_example("graphene")
+    out_file = folder / "phonon_vis.json"
+    watcher = FolderWatcher(folder)
+    modes = (folder / "matdyn.modes").read_text()
+
+    (folder / "matdyn.modes").unlink()
+    assert not watcher.update()
+    assert not out_file.exists()
+
+    # A broken file is reported, and parsed again when it is fixed
+    (folder / "matdyn.modes").write_text("broken\n")
+    assert not watcher.update()
+    touch(folder / "matdyn.modes", modes)
+    assert watcher.update()
+    assert out_file.exists()
+    assert parse_counts["read_and_process_scf_in"] == 1
+
+
+def test_new_segments_are_picked_up(copy_example, parse_counts):
+    folder = copy_example("graphene")
+    (folder / "matdyn.modes").rename(folder / "matdyn.modes.1")
+    (folder / "highsym_qpts.json").unlink()
+    watcher = FolderWatcher(folder, fname_modes="matdyn.modes.*")
+    assert watcher.update()
+    nqpoints = len(json.loads((folder / "phonon_vis.json").read_text())["qpoints"])
+
+    # A second segment starting at the end of the first one (Γ)
+    (folder / "matdyn.modes.2").write_text((folder / "matdyn.modes.1").read_text())
+    assert watcher.update()
+    assert parse_counts["read_matdyn"] == 2
+    data = json.loads((folder / "phonon_vis.json").read_text())
+    assert len(data["qpoints"]) == 2 * nqpoints - 1
+
+    (folder / "matdyn.modes.2").unlink()
+    assert watcher.update()
+    data = json.loads((folder / "phonon_vis.json").read_text())
+    assert len(data["qpoints"]) == nqpoints
+
+
+def test_file_stamp_of_compressed_file(tmp_path):
+    path = tmp_path / "matdyn.modes"
+    assert get_file_stamp(path) is None
+    (tmp_path / "matdyn.modes.gz").write_bytes(b"")
+    assert get_file_stamp(path)[0] == "matdyn.modes.gz"
@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+"""
+Check that the fast pw.x input parser ("qeinp-fast") gives the same structure
+as qe-tools ("qeinp-qetools") for all the examples in `../data/`, and for
+synthetic inputs with every ibrav supported by the fast parser (with celldm and
+with A, B, C, cosAB).
+"""
+
+import io
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+from phonon_web_tools.qe_phonon_tools import get_structure_tuple
+
+base_folder = Path(__file__).parent.parent / "./data"
+
+# ibrav values supported by the fast parser
+supported_ibrav = [1, 2, 3, -3, 4, 5, -5, 6, 7, 8, 9, -9, 10, 11]
+# ibrav values for which qe-tools swaps the first two lattice vectors with respect
+# to pw.x (latgen.f90): the fast parser follows pw.x
+qetools_swapped_ibrav = [-9]
+
+synthetic_template = """&CONTROL
+  calculation = 'scf'
+/
+&SYSTEM
+  ibrav = {ibrav}
+  {lattice}
+  nat = 2
+  ntyp = 2
+  ecutwfc = 30
+/
+&ELECTRONS
+/
+ATOMIC_SPECIES
+Ga 69.723 Ga.UPF
+As 74.922 As.UPF
+ATOMIC_POSITIONS crystal
+Ga 0.00 0.00 0.00
+As 0.21 0.37 0.43
+K_POINTS automatic
+2 2 2 0 0 0
+"""
+
+
+def get_synthetic_inputs():
+    """Yield (name, ibrav, text) of pw.x inputs for all the supported ibrav values."""
+    for ibrav in supported_ibrav:
+        celldm = [
+            "celldm(1) = 7.3",
+            "celldm(2) = 1.3",
+            "celldm(3) = 1.7",
+            "celldm(4) = 0.3",
+        ]
+        abc = ["A = 3.9", "B = 5.1", "C = 6.7", "cosAB = 0.3"]
+        for label, lattice in [("celldm", celldm), ("A", abc)]:
+            text = synthetic_template.format(ibrav=ibrav, lattice="\n  ".join(lattice))
+            yield f"ibrav={ibrav} ({label})", ibrav, text
+
+
+def compare_parsers(name, get_file, swapped=False):
+    """
+    Parse a pw.x input with both parsers, print their timings and return True if
+    they give the same structure.
+
+    :param swapped: the first two lattice vectors of qe-tools are swapped with
+        respect to pw.x (see `qetools_swapped_ibrav`)
+    """
+    results = {}
+    for fileformat in ["qeinp-qetools", "qeinp-fast"]:
+        with get_file() as f:
+            start = time.perf_counter()
+            results[fileformat] = get_structure_tuple(f, fileformat)
+            elapsed = time.perf_counter() - start
+        print(f"{name:>20} {fileformat:>14}: {elapsed * 1000:8.2f} ms")
+
+    (cell1, pos1, numbers1), (cell2, pos2, numbers2) = results.values()
+    if swapped:
+        cell1 = np.array(cell1)[[1, 0, 2]]
+    return (
+        np.allclose(cell1, cell2, rtol=0, atol=1e-10)
+        and np.allclose(pos1, pos2, rtol=0, atol=1e-10)
+        and list(numbers1) == list(numbers2)
+    )
+
+
+n_failed = 0
+for scf_in in sorted(base_folder.glob("*/scf.in")):
+    if not compare_parsers(scf_in.parent.name, lambda: open(scf_in)):
+        print(f"ERROR: the parsers disagree for {scf_in}")
+        n_failed += 1
+
+for name, ibrav, text in get_synthetic_inputs():
+    swapped = ibrav in qetools_swapped_ibrav
+    if not compare_parsers(name, lambda: io.StringIO(text), swapped):
+        print(f"ERROR: the parsers disagree for {name}")
+        n_failed += 1
+
+sys.exit(1 if n_failed else 0)